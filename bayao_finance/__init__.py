@@ -1,4 +1,40 @@
-from bayao_finance.stockseries import StockSeries as StockSeries
-from bayao_finance.stockframe import StockFrame as StockFrame
-from bayao_finance.persistence import StockManipulator as StockManipulator
-import bayao_finance.indicators as indicators
+import importlib
+from typing import TYPE_CHECKING
+
+# Public names are imported on first access: importing StockFrame or indicators does not
+# load persistence, the storage backends or the data providers.
+_LAZY = {
+    'StockSeries': 'bayao_finance.stockseries',
+    'StockFrame': 'bayao_finance.stockframe',
+    'StockPanel': 'bayao_finance.stockpanel',
+    'StockManipulator': 'bayao_finance.persistence',
+    'indicators': 'bayao_finance.indicators',
+}
+
+__all__ = list(_LAZY)
+
+if TYPE_CHECKING:
+    from bayao_finance.stockseries import StockSeries as StockSeries
+    from bayao_finance.stockframe import StockFrame as StockFrame
+    from bayao_finance.stockpanel import StockPanel as StockPanel
+    from bayao_finance.persistence import StockManipulator as StockManipulator
+    import bayao_finance.indicators as indicators
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        # submodules, e.g. bayao_finance.persistence, were available after a plain import
+        try:
+            return importlib.import_module(f'{__name__}.{name}')
+        except ModuleNotFoundError as e:
+            if e.name != f'{__name__}.{name}':
+                raise
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = importlib.import_module(_LAZY[name])
+    value = module if module.__name__.endswith(f'.{name}') else getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
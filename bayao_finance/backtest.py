@@ -0,0 +1,293 @@
+"""
+Vectorized backtests.
+
+Positions of every bar are turned into returns, equity curves and summary statistics
+with array operations, so there is no loop over rows. A position decided with the
+close of bar t is filled at the close of bar t + lag and earns the returns of the bars
+after the fill. With the default lag=1 a signal is filled at the close of the next bar,
+so it never trades on the bar that produced it.
+"""
+import numpy as np
+from pandas import DataFrame, Series, MultiIndex
+from bayao_finance import kernels
+from bayao_finance.sweeps import sweep_sma, sweep_ema
+
+SIZINGS = ['equal', 'fixed', 'inverse_volatility']
+
+# rows x tickers x combinations of one sweep chunk
+SWEEP_CHUNK_CELLS = 2 ** 24
+
+
+def _close_frame(data):
+    # closes as a DataFrame indexed by date with one column per ticker
+    token = getattr(data, 'stock_token', None)
+    if hasattr(data, '_indicator_data'):
+        data = data._indicator_data()
+    if isinstance(data, Series):
+        data = data.to_frame(name=token if token and token != 'Unknown' else data.name)
+    return DataFrame(data).ffill()
+
+
+def _align(signal, close, close_col_name=None):
+    if callable(signal):
+        signal = signal(close)
+    if len(close.columns) == 1 and isinstance(signal, DataFrame) and close.columns[0] not in signal.columns:
+        # signal computed on a whole StockFrame, keep its close column
+        if close_col_name in signal.columns:
+            signal = signal[close_col_name]
+    if isinstance(signal, Series):
+        if len(close.columns) == 1:
+            signal = signal.to_frame(name=close.columns[0])
+        else:
+            raise AttributeError('A Series signal needs data with a single ticker')
+    signal = DataFrame(signal).reindex(index=close.index, columns=close.columns)
+    return signal.to_numpy(dtype=np.float64)
+
+
+def _asset_returns(close):
+    returns = np.zeros_like(close)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[1:] = close[1:] / close[:-1] - 1
+    returns[~np.isfinite(returns)] = 0
+    return returns
+
+
+def _sizing_weights(close, returns, sizing, vol_window):
+    # (rows, tickers) weight of a full position in each ticker, known at the close of each bar
+    n_tickers = close.shape[1]
+    if sizing == 'fixed':
+        return np.ones_like(close)
+    if sizing == 'equal':
+        return np.full_like(close, 1 / n_tickers)
+    if sizing == 'inverse_volatility':
+        returns = np.where(np.isnan(close), np.nan, returns)
+        _, std = kernels.rolling_mean_std(returns, vol_window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            inverse = np.where(std > 0, 1 / std, np.nan)
+            weights = inverse / np.nansum(inverse, axis=1, keepdims=True)
+        return np.nan_to_num(weights)
+    raise AttributeError(f'sizing must be one of {SIZINGS}')
+
+
+def _simulate(positions, returns, weights, cost, lag):
+    """
+    Parameters
+    ----------
+    positions: ndarray (rows, tickers, strategies)
+        Target positions, NaN is flat
+    returns, weights: ndarray (rows, tickers)
+
+    Returns
+    -------
+    tuple
+        (net returns (rows, tickers, strategies), held weights (rows, tickers, strategies))
+    """
+    target = np.nan_to_num(positions) * weights[:, :, None]
+    # filled at the close of bar t + lag, then held over the next bar's return
+    filled = np.zeros_like(target)
+    if lag:
+        filled[lag:] = target[:-lag]
+    else:
+        filled[:] = target
+    held = np.zeros_like(target)
+    held[1:] = filled[:-1]
+    # costs are paid on the bar of the fill
+    turnover = np.abs(np.diff(filled, axis=0, prepend=0))
+    return held * returns[:, :, None] - cost * turnover, held
+
+
+def summary_stats(returns, held=None, periods_per_year=252):
+    """
+    Parameters
+    ----------
+    returns: ndarray (rows, strategies) or DataFrame
+        Portfolio returns per bar
+    held: ndarray (rows, tickers, strategies), default None
+        Held weights, used for exposure and trades
+    periods_per_year: int, default 252
+
+    Returns
+    -------
+    DataFrame
+        One row per strategy: total_return, annual_return, annual_volatility, sharpe,
+        max_drawdown, and exposure and trades when held is given
+    """
+    columns = returns.columns if isinstance(returns, DataFrame) else None
+    returns = np.asarray(returns, dtype=np.float64).reshape(len(returns), -1)
+    equity = np.cumprod(1 + returns, axis=0)
+    n_rows = max(len(returns), 1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = equity[-1] - 1 if len(equity) else np.zeros(returns.shape[1])
+        annual = np.where(total > -1, (1 + total) ** (periods_per_year / n_rows) - 1, -1)
+        volatility = returns.std(axis=0, ddof=1) * np.sqrt(periods_per_year)
+        sharpe = returns.mean(axis=0) / returns.std(axis=0, ddof=1) * np.sqrt(periods_per_year)
+        peak = np.maximum.accumulate(np.maximum(equity, 1), axis=0)
+        drawdown = (equity / peak - 1).min(axis=0) if len(equity) else np.zeros(returns.shape[1])
+
+    stats = {'total_return': total,
+             'annual_return': annual,
+             'annual_volatility': volatility,
+             'sharpe': sharpe,
+             'max_drawdown': drawdown}
+    if held is not None:
+        active = np.abs(held).sum(axis=1) > 0
+        stats['exposure'] = active.mean(axis=0)
+        stats['trades'] = (np.diff(held, axis=0, prepend=0) != 0).sum(axis=(0, 1))
+    return DataFrame(stats, index=columns)
+
+
+class BacktestResult:
+    """
+    Output of backtest.
+
+    Attributes
+    ----------
+    returns : Series
+        Portfolio net returns per bar
+    equity : Series
+        Portfolio value starting at 1
+    ticker_returns : DataFrame
+        Net return contribution of each ticker
+    positions : DataFrame
+        Weights held over each bar, after lag and sizing
+    stats : Series
+        See summary_stats
+    """
+
+    def __init__(self, returns, ticker_returns, positions, stats):
+        self.returns = returns
+        self.equity = (1 + returns).cumprod()
+        self.ticker_returns = ticker_returns
+        self.positions = positions
+        self.stats = stats
+
+    def __repr__(self):
+        return f'BacktestResult(\n{self.stats.to_string()}\n)'
+
+
+def backtest(data, signal, cost=0.0, lag=1, sizing='equal', vol_window=20, periods_per_year=252):
+    """
+    Backtests target positions over one or many tickers.
+
+    Parameters
+    ----------
+    data: StockFrame, StockSeries, StockPanel or DataFrame
+        Prices. StockFrames use their close, DataFrames have one column per ticker.
+    signal: Series, DataFrame or callable
+        Target position of each bar, e.g. 1 long, -1 short, 0 or NaN flat, built from
+        get_* outputs (see crossover and band_reversion). A callable receives the close
+        DataFrame and returns the positions.
+    cost: float, default 0
+        Cost per unit of traded weight, e.g. 0.001 for 10 bps
+    lag: int, default 1
+        Bars between the signal and the fill, done at the close. 1 fills at the close of
+        the next bar, 0 at the close of the signal bar.
+    sizing: str, default "equal"
+        "equal" splits the capital among tickers, "fixed" uses the positions as weights,
+        "inverse_volatility" weights tickers by the inverse of their rolling volatility
+    vol_window: int, default 20
+        Window of the volatility used by inverse_volatility
+    periods_per_year: int, default 252
+
+    Returns
+    -------
+    BacktestResult
+    """
+    close = _close_frame(data)
+    values = close.to_numpy(dtype=np.float64)
+    returns = _asset_returns(values)
+    weights = _sizing_weights(values, returns, sizing, vol_window)
+    positions = _align(signal, close, getattr(data, 'close_col_name', None))[:, :, None]
+
+    net, held = _simulate(positions, returns, weights, cost, lag)
+    net, held = net[:, :, 0], held[:, :, 0]
+    portfolio = Series(net.sum(axis=1), index=close.index, name='portfolio')
+    stats = summary_stats(portfolio.to_numpy()[:, None], held[:, :, None], periods_per_year).iloc[0]
+    stats.name = 'portfolio'
+    return BacktestResult(portfolio,
+                          DataFrame(net, index=close.index, columns=close.columns),
+                          DataFrame(held, index=close.index, columns=close.columns),
+                          stats)
+
+
+def crossover(fast, slow, short=False):
+    """
+    Long while fast is above slow, e.g. crossover(s.get_ema(12), s.get_ema(26)).
+    If short, short while it is below. Flat while either is NaN.
+    """
+    position = (fast > slow).astype(float)
+    if short:
+        position = position * 2 - 1
+    return position.where(fast.notna() & slow.notna(), 0.0)
+
+
+def band_reversion(values, lower, upper, short=False):
+    """
+    Long after values cross below lower until they cross above upper, e.g.
+    band_reversion(s.get_rsi(), 30, 70). If short, short above upper until below lower.
+    lower and upper may be numbers or aligned Series / DataFrames (e.g. Bollinger Bands).
+    """
+    position = values * np.nan
+    position = position.mask(values < lower, 1.0)
+    position = position.mask(values > upper, -1.0 if short else 0.0)
+    return position.ffill().fillna(0.0)
+
+
+def sweep_crossover(data, n_short, n_long, ma='ema', short=False, cost=0.0, lag=1, sizing='equal', vol_window=20,
+                    periods_per_year=252):
+    """
+    Backtests moving average crossovers for every (n_short, n_long) pair with n_short <
+    n_long in one batched computation. Each moving average is computed once and shared
+    by all the pairs using it.
+
+    Parameters
+    ----------
+    data: StockFrame, StockSeries, StockPanel or DataFrame
+        Prices, see backtest
+    n_short, n_long: list
+        Windows of the fast and slow moving averages
+    ma: str, default "ema"
+        "ema" or "sma"
+    Other parameters as in backtest.
+
+    Returns
+    -------
+    tuple
+        (DataFrame of stats indexed by (n_short, n_long),
+         DataFrame of portfolio returns with one column per pair)
+    """
+    close = _close_frame(data)
+    values = close.to_numpy(dtype=np.float64)
+    returns = _asset_returns(values)
+    weights = _sizing_weights(values, returns, sizing, vol_window)
+
+    windows = sorted(set(n_short) | set(n_long))
+    position_of = {n: i for i, n in enumerate(windows)}
+    pairs = [(s, l) for s in n_short for l in n_long if s < l]
+    if not pairs:
+        raise AttributeError('No pair with n_short < n_long')
+    if ma not in ['sma', 'ema']:
+        raise AttributeError('ma must be "sma" or "ema"')
+    averages = (sweep_sma if ma == 'sma' else sweep_ema)(close, windows)
+
+    portfolio = np.empty((len(values), len(pairs)))
+    stats = []
+    chunk = max(SWEEP_CHUNK_CELLS // max(values.size, 1), 1)
+    for start in range(0, len(pairs), chunk):
+        block = pairs[start:start + chunk]
+        fast = averages[:, :, [position_of[s] for s, _ in block]]
+        slow = averages[:, :, [position_of[l] for _, l in block]]
+        with np.errstate(invalid='ignore'):
+            positions = (fast > slow).astype(np.float64)
+        if short:
+            positions = positions * 2 - 1
+        positions[np.isnan(fast) | np.isnan(slow)] = 0
+
+        net, held = _simulate(positions, returns, weights, cost, lag)
+        portfolio[:, start:start + len(block)] = net.sum(axis=1)
+        stats.append(summary_stats(portfolio[:, start:start + len(block)], held, periods_per_year))
+
+    index = MultiIndex.from_tuples(pairs, names=['n_short', 'n_long'])
+    stats = DataFrame(np.concatenate([s.to_numpy() for s in stats]), index=index, columns=stats[0].columns)
+    return stats, DataFrame(portfolio, index=close.index, columns=index)
@@ -0,0 +1,348 @@
+"""
+Streaming aggregation of trades into OHLCV bars.
+
+Trades are read in chunks (csv, parquet or feather/arrow files, or any iterable of
+DataFrames) and every chunk is reduced in a few vectorized passes. The bar still open at
+the end of a chunk is carried to the next one, so memory is bounded by the chunk size
+whatever the file size.
+
+Bars are StockFrames with open, high, low, close and volume columns, plus vwap and
+trades (number of trades):
+
+- "time" bars group trades by clock buckets, e.g. size="1min", labelled by the bucket
+  start. Buckets are aligned on the epoch, same as resample(origin="epoch"): with
+  timezone aware trades the epoch is midnight of 1970-01-01 in their timezone, so 1h
+  bars of Asia/Kolkata trades start on the local hour. Daily sizes ("1D") are calendar
+  days of the local clock, so daylight saving changes do not shift them.
+- "tick" bars close every size trades.
+- "volume" bars close on the trade where the cumulative volume reaches a multiple of
+  size, "dollar" bars on the cumulative traded value (price * size). Trades are not
+  split, so the excess of a bar counts towards the next one.
+
+Tick, volume and dollar bars are labelled by the time of their last trade.
+
+    bars = trades_to_bars('trades.csv', kind='volume', size=50_000, stock_token='PETR4.SA')
+"""
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from pandas.tseries.frequencies import to_offset
+from bayao_finance.stockframe import StockFrame
+
+KINDS = ['time', 'tick', 'volume', 'dollar']
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'vwap', 'trades']
+
+CHUNK_ROWS = 1_000_000
+
+# per bar state: bucket key, last trade time (int64 ns), prices and the sums to merge
+_STATE = ['key', 'last', 'open', 'high', 'low', 'close', 'volume', 'value', 'trades']
+
+
+def _file_format(path):
+    name = str(path).lower()
+    for extension, file_format in (('.parquet', 'parquet'), ('.feather', 'feather'), ('.arrow', 'feather'),
+                                   ('.ipc', 'feather')):
+        if name.endswith(extension):
+            return file_format
+    return 'csv'
+
+
+def read_trades(path, columns=('time', 'price', 'size'), chunk_rows=CHUNK_ROWS, file_format=None, **kwargs):
+    """
+    Reads a trades file in chunks.
+
+    Parameters
+    ----------
+    path : str
+        csv (also compressed), parquet or feather/arrow file
+    columns : tuple, default ("time", "price", "size")
+        Columns read, the other columns of the file are skipped
+    chunk_rows : int, default 1M
+        Rows per chunk
+    file_format : str, default None
+        "csv", "parquet" or "feather". Default is taken from the extension.
+    kwargs:
+        Passed to pandas.read_csv, e.g. sep
+
+    Returns
+    -------
+    iterator of DataFrame
+    """
+    file_format = file_format or _file_format(path)
+    columns = [i for i in columns if i is not None]
+    if file_format == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows, **kwargs)
+    elif file_format == 'parquet':
+        from pyarrow import parquet
+
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif file_format == 'feather':
+        from pyarrow import ipc, memory_map
+
+        # memory mapped, only the record batches being aggregated are loaded
+        with memory_map(str(path)) as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i).select(columns)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(start, chunk_rows).to_pandas()
+    else:
+        raise AttributeError(f'file_format must be csv, parquet or feather, got {file_format}')
+
+
+class BarAggregator:
+    """
+    Builds bars from trades fed in chunks.
+
+    Parameters
+    ----------
+    kind : str, default "time"
+        "time", "tick", "volume" or "dollar"
+    size : str or number, default "1min"
+        pandas offset of time bars, number of trades of tick bars, volume of volume bars
+        or traded value of dollar bars
+    stock_token : str, default None
+        Token of the StockFrames returned
+    time_unit : str, default "ns"
+        Unit of numeric trade times, e.g. "ms" for epoch milliseconds
+
+    update returns the bars completed by a chunk, flush the bar still open.
+    """
+
+    def __init__(self, kind='time', size='1min', stock_token=None, time_unit='ns'):
+        if kind not in KINDS:
+            raise AttributeError(f'kind must be one of {KINDS}')
+        if kind == 'time':
+            self._step = pd.Timedelta(size).value
+            if self._step <= 0:
+                raise AttributeError('size of time bars must be a positive offset, e.g. "1min"')
+            # "1D" counts calendar days, "24h" or Timedelta("1D") fixed durations, as in resample
+            self._days = isinstance(to_offset(size), pd.offsets.Day)
+        elif not size or size <= 0:
+            raise AttributeError(f'size of {kind} bars must be positive')
+        self.kind = kind
+        self.size = size
+        self.stock_token = stock_token
+        self.time_unit = time_unit
+        self._tz = None
+        self._last_time = None
+        # trades and cumulative volume or value seen so far, they define tick, volume and dollar bars
+        self._count = 0
+        self._cumulative = 0.0
+        self._open_bar = None
+
+    def _times(self, times):
+        times = np.asarray(times) if not isinstance(times, (pd.Series, pd.Index)) else times
+        if times.dtype.kind in 'iuf':
+            times = pd.to_datetime(times, unit=self.time_unit)
+        times = pd.DatetimeIndex(times)
+        if times.tz is not None:
+            self._tz = times.tz
+            times = times.tz_convert('UTC').tz_localize(None)
+        return times.as_unit('ns').asi8
+
+    def _origin(self):
+        # UTC nanoseconds of the epoch in the timezone of the trades
+        return 0 if self._tz is None else pd.Timestamp('1970-01-01', tz=self._tz).value
+
+    def _keys(self, times, prices, sizes):
+        if self.kind == 'time':
+            if self._tz is None:
+                return times // self._step
+            if self._days:
+                wall = pd.DatetimeIndex(times, tz='UTC').tz_convert(self._tz).tz_localize(None)
+                return wall.asi8 // self._step
+            return (times - self._origin()) // self._step
+        if self.kind == 'tick':
+            return (self._count + np.arange(len(times))) // self.size
+        amounts = sizes if self.kind == 'volume' else prices * sizes
+        # bar of each trade from the cumulative amount before it
+        before = self._cumulative + np.cumsum(amounts) - amounts
+        return np.floor(before / self.size).astype(np.int64)
+
+    def _complete(self, bar):
+        # whether the last bar of a chunk is already complete
+        if self.kind == 'tick':
+            return bar['trades'] >= self.size
+        if self.kind in ('volume', 'dollar'):
+            return self._cumulative >= (bar['key'] + 1) * self.size
+        return False
+
+    def update(self, times, prices, sizes=None):
+        """
+        Parameters
+        ----------
+        times : array like of datetimes
+            Trade times, sorted
+        prices : array like
+        sizes : array like, default None
+            Traded quantities. If None every trade counts as 1.
+
+        Returns
+        -------
+        StockFrame
+            Bars completed by these trades, possibly empty
+        """
+        times = self._times(times)
+        prices = np.asarray(prices, dtype=np.float64)
+        sizes = np.ones(len(prices)) if sizes is None else np.asarray(sizes, dtype=np.float64)
+        keep = ~(np.isnan(prices) | np.isnan(sizes))
+        if not keep.all():
+            times, prices, sizes = times[keep], prices[keep], sizes[keep]
+        if not len(times):
+            return self._frame(None)
+        if np.any(np.diff(times) < 0) or (self._last_time is not None and times[0] < self._last_time):
+            raise AttributeError('trades must be sorted by time')
+
+        keys = self._keys(times, prices, sizes)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+        stops = np.append(starts[1:], len(keys))
+        bars = {
+            'key': keys[starts], 'last': times[stops - 1],
+            'open': prices[starts], 'high': np.maximum.reduceat(prices, starts),
+            'low': np.minimum.reduceat(prices, starts), 'close': prices[stops - 1],
+            'volume': np.add.reduceat(sizes, starts), 'value': np.add.reduceat(prices * sizes, starts),
+            'trades': stops - starts,
+        }
+
+        self._count += len(times)
+        self._last_time = times[-1]
+        if self.kind == 'volume':
+            self._cumulative += sizes.sum()
+        elif self.kind == 'dollar':
+            self._cumulative += bars['value'].sum()
+
+        if self._open_bar is not None:
+            previous = self._open_bar
+            if previous['key'][0] == bars['key'][0]:
+                # the bar open at the end of the last chunk goes on
+                bars['open'][0] = previous['open'][0]
+                bars['high'][0] = max(bars['high'][0], previous['high'][0])
+                bars['low'][0] = min(bars['low'][0], previous['low'][0])
+                for i in ('volume', 'value', 'trades'):
+                    bars[i][0] += previous[i][0]
+            else:
+                bars = {i: np.concatenate([previous[i], bars[i]]) for i in _STATE}
+
+        last = {i: bars[i][-1] for i in _STATE}
+        if self._complete(last):
+            self._open_bar = None
+            return self._frame(bars)
+        self._open_bar = {i: bars[i][-1:] for i in _STATE}
+        return self._frame({i: bars[i][:-1] for i in _STATE})
+
+    def update_frame(self, trades, time='time', price='price', size='size'):
+        """
+        Same as update with the columns of a DataFrame of trades. size may be None.
+        """
+        return self.update(trades[time], trades[price], None if size is None else trades[size])
+
+    def flush(self):
+        """
+        Returns
+        -------
+        StockFrame
+            The bar still open, empty if there is none. Following trades start a new bar.
+        """
+        bars, self._open_bar = self._open_bar, None
+        return self._frame(bars)
+
+    @property
+    def open_bar(self):
+        """
+        The bar still open as a one row StockFrame, without closing it.
+        """
+        return self._frame(self._open_bar)
+
+    def _frame(self, bars):
+        if bars is None:
+            bars = {i: np.empty(0, dtype=np.int64 if i in ('key', 'last', 'trades') else np.float64)
+                    for i in _STATE}
+        if self.kind != 'time':
+            index = pd.DatetimeIndex(bars['last'].astype('datetime64[ns]'), name='date')
+            if self._tz is not None:
+                index = index.tz_localize('UTC').tz_convert(self._tz)
+        elif self._tz is None:
+            index = pd.DatetimeIndex((bars['key'] * self._step).astype('datetime64[ns]'), name='date')
+        elif self._days:
+            # midnights skipped by a daylight saving change start at the first hour of the day
+            index = pd.DatetimeIndex((bars['key'] * self._step).astype('datetime64[ns]'), name='date')
+            index = index.tz_localize(self._tz, ambiguous=True, nonexistent='shift_forward')
+        else:
+            stamps = bars['key'] * self._step + self._origin()
+            index = pd.DatetimeIndex(stamps.astype('datetime64[ns]'), name='date').tz_localize('UTC')
+            index = index.tz_convert(self._tz)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwap = bars['value'] / bars['volume']
+        data = DataFrame(dict(bars, vwap=vwap), index=index, columns=BAR_COLUMNS)
+        return StockFrame(data, stock_token=self.stock_token)
+
+    def __repr__(self):
+        state = 'open bar' if self._open_bar is not None else 'no open bar'
+        return f'BarAggregator({self.kind} bars of {self.size}, {self._count} trades, {state})'
+
+
+def _chunks(source, columns, chunk_rows, **kwargs):
+    if isinstance(source, DataFrame):
+        return (source.iloc[i:i + chunk_rows] for i in range(0, len(source), chunk_rows))
+    if isinstance(source, str) or hasattr(source, '__fspath__'):
+        return read_trades(source, columns=columns, chunk_rows=chunk_rows, **kwargs)
+    return iter(source)
+
+
+def iter_bars(source, kind='time', size='1min', time='time', price='price', volume='size', stock_token=None,
+              time_unit='ns', chunk_rows=CHUNK_ROWS, include_open_bar=True, **kwargs):
+    """
+    Aggregates trades into bars chunk by chunk.
+
+    Parameters
+    ----------
+    source : str, DataFrame or iterable of DataFrame
+        Trades file (see read_trades), trades or chunks of trades
+    kind, size : see BarAggregator
+    time, price, volume : str
+        Columns of the trade time, price and traded quantity. volume may be None.
+    stock_token : str, default None
+    time_unit : str, default "ns"
+        Unit of numeric trade times
+    chunk_rows : int, default 1M
+        Rows per chunk read from files and DataFrames
+    include_open_bar : bool, default True
+        Also yield the last bar, still open when the trades end
+    kwargs:
+        Passed to read_trades
+
+    Returns
+    -------
+    iterator of StockFrame
+        Bars completed by each chunk, chunks completing no bar are skipped
+    """
+    aggregator = BarAggregator(kind, size, stock_token=stock_token, time_unit=time_unit)
+    for chunk in _chunks(source, (time, price, volume), chunk_rows, **kwargs):
+        bars = aggregator.update_frame(chunk, time=time, price=price, size=volume)
+        if len(bars):
+            yield bars
+    if include_open_bar:
+        bars = aggregator.flush()
+        if len(bars):
+            yield bars
+
+
+def trades_to_bars(source, kind='time', size='1min', time='time', price='price', volume='size', stock_token=None,
+                   time_unit='ns', chunk_rows=CHUNK_ROWS, include_open_bar=True, **kwargs):
+    """
+    Same as iter_bars but returns every bar in one StockFrame. Only the bars are kept in
+    memory, never all the trades.
+
+    Returns
+    -------
+    StockFrame
+    """
+    frames = list(iter_bars(source, kind=kind, size=size, time=time, price=price, volume=volume,
+                            stock_token=stock_token, time_unit=time_unit, chunk_rows=chunk_rows,
+                            include_open_bar=include_open_bar, **kwargs))
+    if not frames:
+        return BarAggregator(kind, size, stock_token=stock_token).flush()
+    return StockFrame(pd.concat([DataFrame(i) for i in frames]), stock_token=stock_token)
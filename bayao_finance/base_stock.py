@@ -1,13 +1,151 @@
 from bayao_finance.indicators import *
+from bayao_finance.fused import compute_indicators
+from bayao_finance.cache import IndicatorCache, cached_indicator, new_owner_token, _InvalidatingIndexer
+from pandas import DatetimeIndex, PeriodIndex, TimedeltaIndex
+
+
+def _is_time_index(index):
+    # only time and numeric indexes are ordered, labels such as a transposed frame are kept
+    if isinstance(index, (DatetimeIndex, PeriodIndex, TimedeltaIndex)):
+        return True
+    if index.dtype.kind in 'iuf':
+        return True
+    return index.dtype.kind == 'O' and index.inferred_type in ('date', 'datetime', 'datetime64')
+
+
+def order_by_index(data, drop_duplicates=False, validate=False):
+    """
+    Returns data sorted by its index. Data already in order is returned as is, without
+    copying. Descending data is reversed and unordered data is sorted (stable, so
+    repeated timestamps keep their order).
+
+    Parameters
+    ----------
+    data: Series or DataFrame
+    drop_duplicates: bool, default False
+        If True keeps only the last row of each repeated timestamp
+    validate: bool, default False
+        If True raises when values are not numeric
+
+    Returns
+    -------
+    Series or DataFrame
+    """
+    index = data.index
+    if len(index) > 1 and _is_time_index(index) and not index.is_monotonic_increasing:
+        if index.is_monotonic_decreasing:
+            data = data.iloc[::-1]
+        else:
+            data = data.sort_index(kind='stable')
+    if drop_duplicates and not data.index.is_unique:
+        data = data[~data.index.duplicated(keep='last')]
+    if validate:
+        dtypes = data.dtypes if isinstance(data, DataFrame) else {data.name: data.dtype}
+        invalid = [col for col, dtype in dict(dtypes).items() if dtype.kind not in 'biuf']
+        if invalid:
+            raise AttributeError(f'Columns {invalid} are not numeric')
+    return data
+
+
+class TracksMutations:
+    """
+    Invalidates the indicator cache when pandas data is modified in place.
+    Must come before the pandas class in the bases of a BaseStock subclass.
+    """
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if self._indicator_cache is not None:
+            self.invalidate_cache()
+
+    def _wrap_indexer(self, indexer):
+        if self._indicator_cache is None:
+            return indexer
+        return _InvalidatingIndexer(indexer, self)
+
+    @property
+    def loc(self):
+        return self._wrap_indexer(super().loc)
+
+    @property
+    def iloc(self):
+        return self._wrap_indexer(super().iloc)
+
+    @property
+    def at(self):
+        return self._wrap_indexer(super().at)
+
+    @property
+    def iat(self):
+        return self._wrap_indexer(super().iat)
 
 
 class BaseStock:
 
+    _indicator_cache = None
+    _cache_token = None
+    _cache_version = 0
+    _cached_mgr = None
+
     def __init__(self, stock_token=None):
         if not stock_token:
             stock_token = 'Unknown'
         self.stock_token = stock_token
 
+    def enable_cache(self, max_bytes=64 * 2 ** 20, cache=None):
+        """
+        Memoizes indicator results keyed by data version, indicator and parameters.
+        Assignments and inplace operations invalidate the cache, writes straight into
+        the underlying arrays (e.g. through .values) need invalidate_cache.
+
+        Parameters
+        ----------
+        max_bytes: int, default 64 MB
+            Memory budget of the cached results, evicted least recently used first
+        cache: IndicatorCache, default None
+            Existing cache to share a budget between stocks
+
+        Returns
+        -------
+        IndicatorCache
+        """
+        if cache is None:
+            cache = IndicatorCache(max_bytes)
+        object.__setattr__(self, '_indicator_cache', cache)
+        object.__setattr__(self, '_cache_token', new_owner_token())
+        return cache
+
+    def disable_cache(self):
+        if self._indicator_cache is not None:
+            self._indicator_cache.invalidate(self._cache_token)
+        object.__setattr__(self, '_indicator_cache', None)
+        object.__setattr__(self, '_cached_mgr', None)
+
+    def invalidate_cache(self):
+        object.__setattr__(self, '_cache_version', self._cache_version + 1)
+        if self._indicator_cache is not None:
+            self._indicator_cache.invalidate(self._cache_token)
+
+    def cache_stats(self):
+        """
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, evictions, entries and bytes, or None without cache
+        """
+        if self._indicator_cache is None:
+            return None
+        return self._indicator_cache.stats()
+
+    def _check_data_version(self):
+        # pandas replaces the block manager on inplace operations and some assignments
+        mgr = getattr(self, '_mgr', None)
+        if mgr is not self._cached_mgr:
+            if self._cached_mgr is not None:
+                self.invalidate_cache()
+            object.__setattr__(self, '_cached_mgr', mgr)
+
+    @cached_indicator
     def get_sma(self, data=None, n=20, min_periods=None, **kwargs):
         """
         Get a Series or DataFrame of Exponential Moving Average
@@ -35,9 +173,10 @@ class BaseStock:
 
         """
         if data is None:
-            data = self
+            data = self._stock_data()
         return get_sma_from_data(data, n, min_periods, **kwargs)
 
+    @cached_indicator
     def get_ema(self, n=20, min_periods=None, **kwargs):
         """
         Get a Series of Exponential Moving Average
@@ -62,8 +201,9 @@ class BaseStock:
         **kwargs: pandas.Series().rolling properties
 
         """
-        return get_ema_from_data(self, n, min_periods, **kwargs)
+        return get_ema_from_data(self._stock_data(), n, min_periods, **kwargs)
 
+    @cached_indicator
     def get_macd(self, n_short=12, n_long=26, n_signal=9):
         """
         Generates a Moving Average Convergence Divergence
@@ -81,8 +221,9 @@ class BaseStock:
         -------
         DataFrame with index and index_signal for StockSeries ticker or StockFrame Columns
         """
-        return get_macd_from_data(self, n_short=n_short, n_long=n_long, n_signal=n_signal, token=self.stock_token)
+        return get_macd_from_data(self._stock_data(), n_short=n_short, n_long=n_long, n_signal=n_signal, token=self.stock_token)
 
+    @cached_indicator
     def get_bollinger_bands(self, n=20, k=2):
         """
         Creates Dataframe with SMA and Bollinger Bands
@@ -98,10 +239,45 @@ class BaseStock:
         Dataframe with bb_inf (SMA - k * std), bb (SMA), bb_sup (SMA + k * std)
 
         """
-        return get_bollinger_bands_from_data(self, n, k, token=self.stock_token)
+        return get_bollinger_bands_from_data(self._stock_data(), n, k, token=self.stock_token)
 
+    @cached_indicator
     def get_rsi(self, n=14, min_periods=None, **kwargs):
-        return get_rsi(self, n, min_periods, **kwargs)
+        return get_rsi(self._stock_data(), n, min_periods, **kwargs)
 
+    @cached_indicator
     def get_returns(self):
-        return get_returns_from_data(self)
+        return get_returns_from_data(self._stock_data())
+
+    def _stock_data(self):
+        # data the get_* methods run on
+        return self
+
+    def _indicator_data(self):
+        # data compute_indicators runs on by default
+        return self._stock_data()
+
+    @cached_indicator
+    def compute_indicators(self, spec, data=None):
+        """
+        Computes several indicators at once, sharing intermediate results such as
+        rolling windows and EMAs between them.
+
+        Parameters
+        ----------
+        spec: list
+            Indicators and parameters, e.g.
+            ["rsi", ("sma", {"n": 50}), ("macd", {"n_short": 12, "n_long": 26}), ("bb", {"n": 20, "k": 2})]
+            Available indicators: sma, ema, macd, bb, rsi, returns
+        data: Series or DataFrame, default None
+            if None it is used self, or the close column for a StockFrame.
+
+        Returns
+        -------
+        DataFrame
+            One column per indicator output. Columns are a MultiIndex of
+            (output, column) when data has several columns.
+        """
+        if data is None:
+            data = self._indicator_data()
+        return compute_indicators(data, spec)
@@ -0,0 +1,165 @@
+"""
+Opt-in memoization of indicator results, see BaseStock.enable_cache.
+"""
+from collections import OrderedDict
+from functools import wraps
+from itertools import count
+import threading
+import numpy as np
+
+_owner_tokens = count()
+
+
+def _nbytes(result):
+    if isinstance(result, tuple):
+        return sum(_nbytes(i) for i in result)
+    if hasattr(result, 'memory_usage'):
+        usage = result.memory_usage(index=True)
+        return int(np.sum(usage))
+    return int(getattr(result, 'nbytes', 0))
+
+
+def _copy(result):
+    # callers may modify what they get, the cached object must stay untouched
+    if isinstance(result, tuple):
+        return tuple(_copy(i) for i in result)
+    if hasattr(result, 'copy'):
+        return result.copy()
+    return result
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(i) for i in value)
+    hash(value)
+    return value
+
+
+class IndicatorCache:
+    """
+    LRU cache of indicator results, bounded by the memory of the stored results.
+    One cache can be shared by several stocks so they respect a common budget.
+
+    Parameters
+    ----------
+    max_bytes : int, default 64 MB
+        Results are evicted, least recently used first, above this size
+    """
+
+    def __init__(self, max_bytes=64 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, result):
+        size = _nbytes(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, owner):
+        """
+        Drops every result of one owner token.
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == owner]:
+                self.nbytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, evictions, entries and bytes
+        """
+        calls = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / calls if calls else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.nbytes}
+
+
+def cached_indicator(method):
+    """
+    Memoizes a BaseStock indicator method when the stock has a cache enabled.
+    Calls with unhashable arguments, such as explicit data, are not cached.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self._indicator_cache
+        if cache is None:
+            return method(self, *args, **kwargs)
+        try:
+            params = (_freeze(args), _freeze(kwargs))
+        except TypeError:
+            return method(self, *args, **kwargs)
+
+        self._check_data_version()
+        # indicators of a StockFrame run over its close column, which set_close can change
+        close = getattr(self, 'close_col_name', None)
+        key = (self._cache_token, self._cache_version, close, method.__name__, params)
+        result = cache.get(key)
+        if result is None:
+            result = method(self, *args, **kwargs)
+            cache.put(key, result)
+        return _copy(result)
+
+    return wrapper
+
+
+class _InvalidatingIndexer:
+    # wraps loc, iloc, at and iat so assignments through them invalidate the cache
+
+    def __init__(self, indexer, owner):
+        self._indexer = indexer
+        self._owner = owner
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    def __setitem__(self, key, value):
+        self._indexer[key] = value
+        self._owner.invalidate_cache()
+
+    def __call__(self, *args, **kwargs):
+        return _InvalidatingIndexer(self._indexer(*args, **kwargs), self._owner)
+
+    def __getattr__(self, name):
+        return getattr(self._indexer, name)
+
+
+def new_owner_token():
+    return next(_owner_tokens)
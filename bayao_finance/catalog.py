@@ -0,0 +1,359 @@
+"""
+Catalog of the data files of a snapshot folder or of an incremental store.
+
+The catalog is saved next to the files as catalog.json and lists every file with its
+ticker, extension (the storage format), row count, first and last timestamp, interval,
+columns and checksum. Tickers are looked up in a dict, reads are planned from the first
+and last timestamps so files outside a date range are never opened, and availability
+queries do not open any data file.
+
+Folders written before the catalog existed are scanned once, reading each file, and the
+catalog is saved for the next reads when the folder is writable.
+
+Several catalogs may write to the same folder, e.g. two processes appending different
+tickers to a store. Saving takes a lock file, reloads catalog.json and applies only the
+files added and removed since this catalog was loaded, so entries saved by another
+writer are kept.
+"""
+import json
+import os
+import time
+import zlib
+import pandas as pd
+from bayao_finance.storage import date_key
+
+CATALOG_FILE = 'catalog.json'
+CATALOG_VERSION = 1
+# seconds to wait for another writer to release the catalog lock
+LOCK_TIMEOUT = 30
+
+# median bar spacing to provider interval names
+INTERVALS = {
+    pd.Timedelta(minutes=1): '1m', pd.Timedelta(minutes=2): '2m', pd.Timedelta(minutes=5): '5m',
+    pd.Timedelta(minutes=15): '15m', pd.Timedelta(minutes=30): '30m', pd.Timedelta(hours=1): '1h',
+    pd.Timedelta(minutes=90): '90m', pd.Timedelta(days=1): '1d', pd.Timedelta(days=5): '5d',
+    pd.Timedelta(weeks=1): '1wk',
+}
+
+
+def _day_floor(d):
+    return pd.Timestamp(date_key(d)).tz_localize(None).normalize()
+
+
+def infer_interval(index):
+    """
+    Interval name of a DatetimeIndex from its median spacing, e.g. "1d" for daily bars
+    with weekends missing. Returns None with less than two rows.
+    """
+    if len(index) < 2:
+        return None
+    spacing = pd.Series(index).diff().median()
+    if spacing in INTERVALS:
+        return INTERVALS[spacing]
+    if pd.Timedelta(days=28) <= spacing <= pd.Timedelta(days=31):
+        return '1mo'
+    if pd.Timedelta(days=89) <= spacing <= pd.Timedelta(days=92):
+        return '3mo'
+    return str(spacing)
+
+
+def file_checksum(path, block_size=2 ** 20):
+    checksum = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            checksum = zlib.crc32(block, checksum)
+    return f'crc32:{checksum:08x}'
+
+
+def _timestamp(value):
+    return None if value is None else pd.Timestamp(value)
+
+
+class CatalogEntry:
+    """
+    One data file of a catalog.
+    """
+
+    def __init__(self, ticker, file, rows, first, last, interval, columns, checksum, extension=None):
+        self.ticker = ticker
+        self.file = file
+        # catalogs saved before extensions were listed take it from the file name
+        self.extension = extension or os.path.splitext(file)[1]
+        self.rows = rows
+        self.first = _timestamp(first)
+        self.last = _timestamp(last)
+        self.interval = interval
+        self.columns = list(columns)
+        self.checksum = checksum
+
+    def overlaps(self, start=None, end=None):
+        # Compared by day so partial bars and timezones never drop a file that is needed
+        if self.first is None:
+            return False
+        if start is not None and _day_floor(self.last) < _day_floor(start):
+            return False
+        if end is not None and _day_floor(self.first) > _day_floor(end):
+            return False
+        return True
+
+    def to_dict(self):
+        return {'ticker': self.ticker, 'extension': self.extension, 'rows': self.rows,
+                'first': None if self.first is None else self.first.isoformat(),
+                'last': None if self.last is None else self.last.isoformat(),
+                'interval': self.interval, 'columns': self.columns, 'checksum': self.checksum}
+
+    def __repr__(self):
+        return f'CatalogEntry({self.ticker}: {self.file}, {self.rows} rows, {self.first} to {self.last})'
+
+
+class Catalog:
+    """
+    Parameters
+    ----------
+    folder : str
+        Folder of the data files. The catalog is read from folder/catalog.json when it
+        exists, file names are relative to folder.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._entries = {}
+        self._tickers = {}
+        # changes not saved yet, applied over the saved catalog by save
+        self._added = set()
+        self._removed = set()
+        self._cleared = False
+        self.exists = os.path.isfile(self.path)
+        if self.exists:
+            self._load()
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, CATALOG_FILE)
+
+    def _load(self):
+        with open(self.path) as f:
+            content = json.load(f)
+        for file, entry in content['files'].items():
+            self._add(CatalogEntry(file=file, **entry))
+
+    def _add(self, entry):
+        if entry.file in self._entries:
+            self.remove(entry.file)
+        self._entries[entry.file] = entry
+        self._tickers.setdefault(entry.ticker, []).append(entry)
+
+    def add(self, ticker, file, frame, interval=None):
+        """
+        Lists a file that was just written.
+
+        Parameters
+        ----------
+        ticker : str
+        file : str
+            Path relative to the catalog folder
+        frame : DataFrame
+            Data written to the file, indexed by date
+        interval : str, default None
+            Bar interval, inferred from the index if None
+
+        Returns
+        -------
+        CatalogEntry
+        """
+        index = frame.index
+        entry = CatalogEntry(ticker, file, len(frame), index.min() if len(index) else None,
+                             index.max() if len(index) else None, interval or infer_interval(index),
+                             [str(i) for i in frame.columns], file_checksum(os.path.join(self.folder, file)))
+        self._add(entry)
+        self._added.add(file)
+        self._removed.discard(file)
+        return entry
+
+    def remove(self, file):
+        entry = self._entries.pop(file)
+        entries = self._tickers[entry.ticker]
+        entries.remove(entry)
+        if not entries:
+            del self._tickers[entry.ticker]
+        self._added.discard(file)
+        self._removed.add(file)
+
+    def clear(self):
+        """
+        Removes every entry. The next save replaces the saved catalog instead of merging.
+        """
+        self._entries = {}
+        self._tickers = {}
+        self._added = set()
+        self._removed = set()
+        self._cleared = True
+
+    def scan(self, files, storage):
+        """
+        Lists files by reading them, for folders written without a catalog.
+
+        Parameters
+        ----------
+        files : iterable
+            (ticker, file) pairs, file relative to the catalog folder
+        storage : BaseStorage
+            Format of the files
+        """
+        for ticker, file in files:
+            self.add(ticker, file, storage.read(os.path.join(self.folder, file)))
+
+    def _merge_saved(self):
+        # entries saved by other writers, with the changes of this catalog applied over them
+        if self._cleared or not os.path.isfile(self.path):
+            return
+        changed = {file: self._entries[file] for file in self._added}
+        self._entries = {}
+        self._tickers = {}
+        self._load()
+        for file in self._removed:
+            if file in self._entries:
+                self.remove(file)
+        for entry in changed.values():
+            self._add(entry)
+
+    def _lock(self):
+        # lock file created exclusively, so only one writer saves at a time
+        lock = f'{self.path}.lock'
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return lock
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'{lock} is held by another writer, remove it if no writer is running')
+                time.sleep(0.01)
+
+    def save(self):
+        """
+        Writes catalog.json, keeping the entries other writers saved since it was loaded.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        lock = self._lock()
+        try:
+            self._merge_saved()
+            content = {'version': CATALOG_VERSION,
+                       'files': {file: entry.to_dict() for file, entry in sorted(self._entries.items())}}
+            # written aside and renamed so readers never see a partial catalog
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(content, f, indent=1)
+            os.replace(temporary, self.path)
+        finally:
+            os.remove(lock)
+        self._added, self._removed, self._cleared = set(), set(), False
+        self.exists = True
+
+    def cache(self):
+        """
+        Saves the catalog if the folder is writable. Read only folders keep it in memory,
+        so scanning a folder never fails a read.
+        """
+        try:
+            self.save()
+        except OSError:
+            pass
+
+    def __contains__(self, ticker):
+        return ticker in self._tickers
+
+    def __len__(self):
+        return len(self._tickers)
+
+    def tickers(self, extension=None):
+        """
+        Tickers with files, only those with files of extension (e.g. ".parquet") if given.
+        """
+        if extension is None:
+            return sorted(self._tickers)
+        return sorted({e.ticker for e in self._entries.values() if e.extension == extension})
+
+    def entries(self, ticker=None, extension=None):
+        """
+        Entries of ticker sorted by file name, or of every ticker if None. Only files of
+        extension if given.
+        """
+        if ticker is None:
+            entries = [self._entries[i] for i in sorted(self._entries)]
+        else:
+            entries = sorted(self._tickers.get(ticker, []), key=lambda e: e.file)
+        if extension is not None:
+            entries = [e for e in entries if e.extension == extension]
+        return entries
+
+    def plan(self, ticker, start=None, end=None, extension=None):
+        """
+        Returns
+        -------
+        list
+            Entries of ticker holding rows between start and end, by file name. Only
+            files of extension if given.
+        """
+        return [e for e in self.entries(ticker, extension) if e.overlaps(start, end)]
+
+    def first(self, ticker, extension=None):
+        stamps = [e.first for e in self.entries(ticker, extension) if e.first is not None]
+        return min(stamps) if stamps else None
+
+    def last(self, ticker, extension=None):
+        stamps = [e.last for e in self.entries(ticker, extension) if e.last is not None]
+        return max(stamps) if stamps else None
+
+    def availability(self, tickers=None, start=None, end=None, extension=None):
+        """
+        Parameters
+        ----------
+        tickers : list, default None
+            Default is every ticker in the catalog
+        start, end : str or datetime, default None
+            If given, the covers column tells whether the stored dates include them
+        extension : str, default None
+            Only count files of this extension, e.g. ".parquet"
+
+        Returns
+        -------
+        DataFrame
+            Indexed by ticker: files, rows, first, last, interval, columns (and covers).
+            Rows add up all files, bars repeated across appended parts count twice.
+            Tickers not in the catalog have 0 files.
+        """
+        tickers = self.tickers(extension) if tickers is None else list(tickers)
+        rows = []
+        for i in tickers:
+            entries = self.entries(i, extension)
+            first, last = self.first(i, extension), self.last(i, extension)
+            columns = sorted({c for e in entries for c in e.columns})
+            row = [len(entries), sum(e.rows for e in entries), first, last,
+                   entries[-1].interval if entries else None, columns]
+            if start is not None or end is not None:
+                row.append(first is not None
+                           and (start is None or _day_floor(first) <= _day_floor(start))
+                           and (end is None or _day_floor(last) >= _day_floor(end)))
+            rows.append(row)
+        names = ['files', 'rows', 'first', 'last', 'interval', 'columns']
+        if start is not None or end is not None:
+            names.append('covers')
+        return pd.DataFrame(rows, index=pd.Index(tickers, name='ticker'), columns=names)
+
+    def verify(self):
+        """
+        Returns
+        -------
+        list
+            Files missing or whose checksum changed since they were listed
+        """
+        changed = []
+        for file, entry in sorted(self._entries.items()):
+            path = os.path.join(self.folder, file)
+            if not os.path.isfile(path) or file_checksum(path) != entry.checksum:
+                changed.append(file)
+        return changed
+
+    def __repr__(self):
+        return f'Catalog({len(self._tickers)} tickers, {len(self._entries)} files in {self.folder})'
@@ -0,0 +1,113 @@
+"""
+Compact memory mode: prices as float32 and volume in the narrowest integer type that
+holds it, which takes OHLCV data to about half of its float64 size. Volume is never
+rounded: with missing bars it stays a float, float32 only while every value is an
+integer float32 holds exactly (up to 2^24), and fractional volume stays float64.
+
+Indicators of float32 data are float32 too. Kernels accumulate sums in float64 and
+only round their outputs, so most of the error comes from rounding the prices
+themselves (about 6e-8 relative). Largest errors against float64, measured on 30
+years of daily random walks (python -m benchmarks.run --precision):
+
+    indicator                        error                       observed   tolerance
+    get_sma, get_ema, get_macd,      absolute, relative to the   1e-7       1e-6
+    get_bollinger_bands, sma std     price level
+    get_rsi                          absolute, RSI points        1e-3       1e-2
+    get_returns                      absolute                    1.5e-7     1e-6
+
+MACD and returns cross zero, so their error relative to their own value is
+meaningless. Strategies comparing MACD to its signal or returns to a threshold flip
+only on ties within these tolerances.
+"""
+import numpy as np
+from pandas import DataFrame
+from bayao_finance.storage import PRICE_COLUMNS, VOLUME_COLUMNS
+
+PRICE_DTYPE = np.float32
+
+# largest integer float32 holds exactly
+FLOAT32_MAX_INTEGER = 2 ** 24
+
+# indicator: (how the error is measured, tolerance), see the module docstring
+PRECISION = {
+    'get_sma': ('price', 1e-6),
+    'get_sma_std': ('price', 1e-6),
+    'get_ema': ('price', 1e-6),
+    'get_macd': ('price', 1e-6),
+    'get_bollinger_bands': ('price', 1e-6),
+    'get_rsi': ('absolute', 1e-2),
+    'get_returns': ('absolute', 1e-6),
+}
+
+
+def volume_dtype(values):
+    """
+    Narrowest integer dtype holding values exactly. Values with NaN are kept in float32
+    when they are integers up to 2^24, in float64 otherwise, and fractions in float64.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        integral = values
+    else:
+        finite = values[np.isfinite(values)]
+        if (finite != np.round(finite)).any():
+            return np.dtype(np.float64)
+        if len(finite) < values.size:
+            if np.abs(finite).max(initial=0) <= FLOAT32_MAX_INTEGER:
+                return np.dtype(np.float32)
+            return np.dtype(np.float64)
+        integral = values.astype(np.int64)
+    if not integral.size:
+        return np.dtype(np.uint8)
+    low, high = int(integral.min()), int(integral.max())
+    if low >= 0:
+        return np.min_scalar_type(high)
+    return np.promote_types(np.min_scalar_type(low), np.min_scalar_type(high))
+
+
+def compact_ohlcv(frame):
+    """
+    Downcasts canonical price columns to float32 and volume with volume_dtype.
+    Other columns are kept. StockFrames keep their token and close column.
+    """
+    dtypes = {}
+    for col in frame.columns:
+        if col in PRICE_COLUMNS and frame[col].dtype != PRICE_DTYPE:
+            dtypes[col] = PRICE_DTYPE
+        elif col in VOLUME_COLUMNS:
+            dtype = volume_dtype(frame[col].to_numpy())
+            if dtype != frame[col].dtype:
+                dtypes[col] = dtype
+    if not dtypes:
+        return frame
+    return frame.astype(dtypes)
+
+
+def _full_size(frame):
+    # bytes of the same frame with float64 / int64 columns
+    return int(frame.index.memory_usage()) + 8 * frame.shape[0] * frame.shape[1]
+
+
+def memory_report(data):
+    """
+    Parameters
+    ----------
+    data: dict
+        keys = tickers, values = DataFrame or StockFrame
+
+    Returns
+    -------
+    DataFrame
+        One row per ticker and a "total" row: bytes in memory, float64_bytes the same
+        data would take with 8 byte columns, saved_bytes and saved_ratio
+    """
+    rows = {}
+    for ticker, frame in data.items():
+        used = int(frame.memory_usage(index=True).sum())
+        rows[ticker] = [used, _full_size(frame)]
+    report = DataFrame.from_dict(rows, orient='index', columns=['bytes', 'float64_bytes'], dtype=np.int64)
+    report.loc['total'] = report.sum()
+    report['saved_bytes'] = report['float64_bytes'] - report['bytes']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        report['saved_ratio'] = report['saved_bytes'] / report['float64_bytes']
+    return report
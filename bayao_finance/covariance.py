@@ -0,0 +1,384 @@
+"""
+Rolling and exponentially weighted covariance and correlation matrices of many return
+series.
+
+Sums of x, x^2 and x * y are kept for every pair of tickers in the upper triangle and
+carried from row to row: each new row adds its products and, for rolling windows, the
+row leaving the window subtracts its own. Rows are evaluated in chunks whose
+(rows x pairs) arrays fit in max_bytes and the sums are carried from one chunk to the
+next. Rolling sums are recomputed exactly over the window every kernels.CHUNK_ROWS
+rows, so rounding does not build up over long histories.
+
+Missing values are handled pairwise as in pandas: each pair of tickers uses the rows
+where both have a value. Results match DataFrame.rolling().cov() / .corr() and
+DataFrame.ewm().cov() / .corr() within kernels.RTOL.
+
+    rolling_corr(manipulator.get_panel(), 63)                    # latest matrix
+    ewm_cov(panel, span=63, output='triu', every=21)             # monthly, upper triangle
+"""
+import numpy as np
+from pandas import DataFrame, MultiIndex
+from bayao_finance import kernels
+from bayao_finance.indicators import get_returns_from_data
+from bayao_finance.stockpanel import close_frame
+
+OUTPUTS = ['latest', 'triu', 'full']
+
+# bytes of the (rows x pairs) arrays of one chunk
+MAX_BYTES = 256 * 2 ** 20
+
+
+def _returns(data, prices):
+    # DataFrame of returns indexed by date with one column per ticker
+    data = close_frame(data)
+    if prices:
+        data = get_returns_from_data(data).iloc[1:]
+    return data
+
+
+def _prepare(data, prices):
+    returns = _returns(data, prices)
+    x = returns.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(x)
+    x = np.where(valid, x, 0)
+    # centering keeps the cancellation in sxx - sx^2 / n small, covariances do not change
+    x -= x.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    x[~valid] = 0
+    if valid.all():
+        return returns, x, None
+    return returns, x, valid.astype(np.float64)
+
+
+def _window_sums(x, valid, i, j, weights=None):
+    """
+    Sums of the pairs (i, j) over all rows of x, optionally weighted, computed with
+    matrix products. Layout is the one of _row_terms.
+    """
+    xw = x if weights is None else x * weights[:, None]
+    sxy = (xw.T @ x)[i, j]
+    if valid is None:
+        count = len(x) if weights is None else weights.sum()
+        return [np.asarray(count, dtype=np.float64), xw.sum(axis=0), (xw * x).sum(axis=0), sxy]
+    vw = valid if weights is None else valid * weights[:, None]
+    # sx[a, b] sums x_a over the rows where b is valid too
+    sx = xw.T @ valid
+    sxx = (xw * x).T @ valid
+    return [(vw.T @ valid)[i, j], sx[i, j], sx[j, i], sxx[i, j], sxx[j, i], sxy]
+
+
+def _row_terms(x, valid, i, j):
+    """
+    Per row terms of the pair sums, rows first.
+    Without NaN: count (rows,), sx and sxx (rows, tickers), sxy (rows, pairs).
+    With NaN every sum is per pair: count, sx_i, sx_j, sxx_i, sxx_j, sxy (rows, pairs).
+    """
+    # np.take gathers columns several times faster than fancy indexing
+    x_i, x_j = np.take(x, i, axis=1), np.take(x, j, axis=1)
+    if valid is None:
+        return [np.ones(len(x)), x.copy(), x * x, np.multiply(x_i, x_j, out=x_i)]
+    x2 = x * x
+    v_i, v_j = np.take(valid, i, axis=1), np.take(valid, j, axis=1)
+    return [v_i * v_j, x_i * v_j, x_j * v_i, np.take(x2, i, axis=1) * v_j, np.take(x2, j, axis=1) * v_i,
+            x_i * x_j]
+
+
+def _moments(sums, i, j):
+    # count and centered sums of each pair, over the rows where both are valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if len(sums) == 4:
+            count, sx, sxx, sxy = sums
+            count = count[..., None] if np.ndim(count) else count
+            mean = sx / count
+            # without NaN the variances are per ticker and only gathered per pair
+            css = sxx - sx * mean
+            cxy = sxy - np.take(sx, i, axis=-1) * np.take(mean, j, axis=-1)
+            return count, cxy, np.take(css, i, axis=-1), np.take(css, j, axis=-1)
+        count, sx_i, sx_j, sxx_i, sxx_j, sxy = sums
+        cxy = sxy - sx_i * sx_j / count
+        cxx = sxx_i - sx_i * sx_i / count
+        cyy = sxx_j - sx_j * sx_j / count
+    return count, cxy, cxx, cyy
+
+
+def _correlation(cxy, cxx, cyy):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denominator = np.maximum(cxx, 0)
+        denominator *= np.maximum(cyy, 0)
+        np.sqrt(denominator, out=denominator)
+        return np.where(denominator > 0, cxy / denominator, np.nan)
+
+
+def _rolling_values(sums, i, j, corr, ddof, min_periods):
+    count, cxy, cxx, cyy = _moments(sums, i, j)
+    if corr:
+        values = _correlation(cxy, cxx, cyy)
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(count > ddof, cxy / (count - ddof), np.nan)
+    return np.where(count >= min_periods, values, np.nan)
+
+
+def _ewm_values(sums, weight2, nobs, i, j, corr, bias, min_periods):
+    weight, cxy, cxx, cyy = _moments(sums, i, j)
+    if np.ndim(weight2) and len(sums) == 4:
+        weight2, nobs = weight2[..., None], nobs[..., None]
+    if corr:
+        values = _correlation(cxy, cxx, cyy)
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = cxy / weight
+            if not bias:
+                # same debiasing as pandas: sum(w)^2 / (sum(w)^2 - sum(w^2)), undefined for one observation
+                square = weight * weight
+                values = np.where((nobs > 1) & (square > weight2), values * square / (square - weight2), np.nan)
+    return np.where(nobs >= min_periods, values, np.nan)
+
+
+def _chunk_rows(n_tickers, n_pairs, pairwise, max_bytes):
+    # terms of the entering and leaving rows and their sums
+    row_bytes = 8 * (18 * n_pairs if pairwise else 3 * n_pairs + 6 * n_tickers)
+    return max(int(max_bytes // max(row_bytes, 1)), 1)
+
+
+def _kept(start, stop, n_rows, every):
+    # rows of [start, stop) that are output, counted back from the last row
+    rows = np.arange(start, stop)
+    return rows[(n_rows - 1 - rows) % every == 0]
+
+
+def _accumulate(term, total):
+    # running sums along the rows in place, starting from total. Row by row adds are
+    # much faster than np.cumsum(axis=0) on wide rows
+    term[0] += total
+    for row in range(1, len(term)):
+        term[row] += term[row - 1]
+
+
+def _rolling_chunks(x, valid, n, i, j, corr, ddof, min_periods, every, max_bytes):
+    # yields (kept rows, values (rows, pairs)) chunk by chunk
+    n_rows, n_tickers = x.shape
+    rows = _chunk_rows(n_tickers, len(i), valid is not None, max_bytes)
+    running, synced = None, 0
+    for start in range(0, n_rows, rows):
+        stop = min(start + rows, n_rows)
+        if running is None or start - synced >= kernels.CHUNK_ROWS:
+            # exact sums of the window before start, so rounding does not build up
+            first = max(start - n, 0)
+            running = _window_sums(x[first:start], None if valid is None else valid[first:start], i, j)
+            synced = start
+        # rows entering the window add their terms, rows leaving it subtract theirs
+        terms = _row_terms(x[start:stop], None if valid is None else valid[start:stop], i, j)
+        leaving_start, leaving_stop = max(start - n, 0), stop - n
+        if leaving_stop > leaving_start:
+            leaving = _row_terms(x[leaving_start:leaving_stop],
+                                 None if valid is None else valid[leaving_start:leaving_stop], i, j)
+            offset = leaving_start + n - start
+            for term, old in zip(terms, leaving):
+                term[offset:] -= old
+        for term, total in zip(terms, running):
+            _accumulate(term, total)
+        running = [term[-1].copy() for term in terms]
+        kept = _kept(start, stop, n_rows, every)
+        if len(kept) == stop - start:
+            yield kept, _rolling_values(terms, i, j, corr, ddof, min_periods)
+        elif len(kept):
+            yield kept, _rolling_values([np.take(term, kept - start, axis=0) for term in terms], i, j, corr, ddof,
+                                        min_periods)
+
+
+def _ewsum(term, decay, carry):
+    # y[t] = decay * y[t - 1] + term[t] starting from carry, along the rows
+    flat = term.reshape(len(term), -1)
+    if carry is not None:
+        flat[0] += decay * np.reshape(carry, -1)
+    if decay > 0:
+        flat = kernels._ewsum(flat, np.array([decay]))
+    return flat.reshape(term.shape)
+
+
+def _ewm_chunks(x, valid, alpha, i, j, corr, bias, min_periods, every, max_bytes):
+    n_rows, n_tickers = x.shape
+    rows = _chunk_rows(n_tickers, len(i), valid is not None, max_bytes)
+    decay = 1.0 - alpha
+    # weighted sums decay by (1 - alpha), the sum of squared weights by its square and
+    # the number of observations not at all
+    state, weight2, nobs = None, None, 0
+    for start in range(0, n_rows, rows):
+        stop = min(start + rows, n_rows)
+        terms = _row_terms(x[start:stop], None if valid is None else valid[start:stop], i, j)
+        count = terms[0].copy()
+        sums = [_ewsum(term, decay, None if state is None else state[k]) for k, term in enumerate(terms)]
+        weights2 = _ewsum(count.copy(), decay * decay, weight2)
+        observations = count.copy()
+        _accumulate(observations, nobs)
+        state, weight2, nobs = [s[-1] for s in sums], weights2[-1], observations[-1]
+        kept = _kept(start, stop, n_rows, every)
+        if len(kept):
+            at = kept - start
+            yield kept, _ewm_values([s[at] for s in sums], weights2[at], observations[at], i, j, corr, bias,
+                                    min_periods)
+
+
+def _matrices(values, i, j, n_tickers):
+    # (rows, pairs) upper triangles to (rows, tickers, tickers) symmetric matrices
+    out = np.empty((len(values), n_tickers, n_tickers))
+    out[:, i, j] = values
+    out[:, j, i] = values
+    return out
+
+
+def _output(chunks, returns, output, corr, i, j):
+    tickers = list(returns.columns)
+    kept, values = [], []
+    for rows, chunk in chunks:
+        kept.append(rows)
+        values.append(chunk)
+    kept = np.concatenate(kept) if kept else np.array([], dtype=np.int64)
+    values = np.concatenate(values) if values else np.empty((0, len(i)))
+
+    if output == 'latest':
+        if not len(values):
+            return DataFrame(np.nan, index=tickers, columns=tickers)
+        return DataFrame(_matrices(values[-1:], i, j, len(tickers))[0], index=tickers, columns=tickers)
+    if output == 'triu':
+        # correlations of a ticker with itself are left out
+        keep = i != j if corr else slice(None)
+        labels = np.asarray(tickers, dtype=object)
+        columns = MultiIndex.from_arrays([labels[i][keep], labels[j][keep]])
+        return DataFrame(values[:, keep], index=returns.index[kept], columns=columns)
+    matrices = _matrices(values, i, j, len(tickers)).reshape(-1, len(tickers))
+    return DataFrame(matrices, index=MultiIndex.from_product([returns.index[kept], tickers]), columns=tickers)
+
+
+def _check(output, every):
+    if output not in OUTPUTS:
+        raise AttributeError(f'output must be one of {OUTPUTS}')
+    if every < 1:
+        raise AttributeError('every must be a positive integer')
+
+
+def rolling_cov(data, n, min_periods=None, corr=False, output='latest', every=1, prices=True, ddof=1,
+                max_bytes=MAX_BYTES):
+    """
+    Rolling covariance (or correlation) matrices of the returns of many tickers.
+
+    Parameters
+    ----------
+    data: StockPanel, dict of StockFrames or DataFrame
+        Closes of the universe, e.g. StockManipulator.get_panel(). StockFrames and panels
+        use their close.
+    n: int
+        Window length
+    min_periods: int, default None
+        Rows where both tickers have a value needed by a pair. Default is n.
+    corr: bool, default False
+        Correlation instead of covariance
+    output: str, default "latest"
+        "latest" only the matrix of the last row, as a DataFrame ticker x ticker.
+        "triu" one row per date with the upper triangle, columns (ticker, ticker);
+        the diagonal is left out of correlations.
+        "full" every matrix stacked as in DataFrame.rolling().cov(), index (date, ticker).
+    every: int, default 1
+        With "triu" and "full", keep one date out of every, ending at the last row,
+        e.g. 21 for monthly matrices of daily data
+    prices: bool, default True
+        data holds prices and returns are computed with get_returns. False if data
+        already holds returns.
+    ddof: int, default 1
+    max_bytes: int, default 256 MB
+        Memory of the intermediate arrays of one chunk of rows
+
+    Returns
+    -------
+    DataFrame
+    """
+    _check(output, every)
+    if not min_periods:
+        min_periods = n
+    returns, x, valid = _prepare(data, prices)
+    i, j = np.triu_indices(x.shape[1])
+    if output == 'latest':
+        # only the last window is needed
+        chunks = []
+        if len(x):
+            first = max(len(x) - n, 0)
+            sums = _window_sums(x[first:], None if valid is None else valid[first:], i, j)
+            chunks = [(np.array([len(x) - 1]), _rolling_values(sums, i, j, corr, ddof, min_periods)[None])]
+    else:
+        chunks = _rolling_chunks(x, valid, n, i, j, corr, ddof, min_periods, every, max_bytes)
+    return _output(chunks, returns, output, corr, i, j)
+
+
+def rolling_corr(data, n, min_periods=None, output='latest', every=1, prices=True, max_bytes=MAX_BYTES):
+    """
+    Same as rolling_cov with corr=True.
+    """
+    return rolling_cov(data, n, min_periods=min_periods, corr=True, output=output, every=every, prices=prices,
+                       max_bytes=max_bytes)
+
+
+def _alpha(span, halflife, alpha):
+    if sum(i is not None for i in (span, halflife, alpha)) != 1:
+        raise AttributeError('Pass exactly one of span, halflife or alpha')
+    if span is not None:
+        return 2 / (span + 1)
+    if halflife is not None:
+        return 1 - np.exp(-np.log(2) / halflife)
+    if not 0 < alpha <= 1:
+        raise AttributeError('alpha must be in (0, 1]')
+    return alpha
+
+
+def ewm_cov(data, span=None, halflife=None, alpha=None, min_periods=1, corr=False, bias=False, output='latest',
+            every=1, prices=True, max_bytes=MAX_BYTES):
+    """
+    Exponentially weighted covariance (or correlation) matrices of the returns of many
+    tickers, same as DataFrame.ewm(adjust=True).cov().
+
+    Parameters
+    ----------
+    data: StockPanel, dict of StockFrames or DataFrame
+        Closes of the universe, see rolling_cov
+    span, halflife, alpha: float
+        Decay, pass exactly one
+    min_periods: int, default 1
+        Rows where both tickers have a value needed by a pair
+    corr: bool, default False
+        Correlation instead of covariance
+    bias: bool, default False
+        If False covariances are debiased as in pandas
+    output, every, prices, max_bytes:
+        See rolling_cov
+
+    Returns
+    -------
+    DataFrame
+    """
+    _check(output, every)
+    alpha = _alpha(span, halflife, alpha)
+    min_periods = max(int(min_periods or 0), 1)
+    returns, x, valid = _prepare(data, prices)
+    i, j = np.triu_indices(x.shape[1])
+    if output == 'latest':
+        chunks = []
+        if len(x):
+            weights = (1 - alpha) ** np.arange(len(x) - 1, -1, -1, dtype=np.float64)
+            sums = _window_sums(x, valid, i, j, weights)
+            if valid is None:
+                weight2, nobs = np.asarray((weights * weights).sum()), np.asarray(len(x))
+            else:
+                weight2 = ((valid * (weights * weights)[:, None]).T @ valid)[i, j]
+                nobs = (valid.T @ valid)[i, j]
+            chunks = [(np.array([len(x) - 1]), _ewm_values(sums, weight2, nobs, i, j, corr, bias, min_periods)[None])]
+    else:
+        chunks = _ewm_chunks(x, valid, alpha, i, j, corr, bias, min_periods, every, max_bytes)
+    return _output(chunks, returns, output, corr, i, j)
+
+
+def ewm_corr(data, span=None, halflife=None, alpha=None, min_periods=1, output='latest', every=1, prices=True,
+             max_bytes=MAX_BYTES):
+    """
+    Same as ewm_cov with corr=True.
+    """
+    return ewm_cov(data, span=span, halflife=halflife, alpha=alpha, min_periods=min_periods, corr=True,
+                   output=output, every=every, prices=prices, max_bytes=max_bytes)
@@ -0,0 +1,147 @@
+"""
+Download scheduling: tickers are split in batches that run with bounded concurrency.
+
+A batch that raises is split in halves, so a bad symbol that makes the whole call fail
+ends up alone, and a single ticker that raises is retried with exponential backoff.
+Tickers missing from an answer are retried in a smaller batch. One bad symbol or a
+throttled call does not affect the rest of the download.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class TickerResult:
+    """
+    Outcome of one ticker download.
+    """
+
+    def __init__(self, ticker, success, attempts, rows=0, error=None):
+        self.ticker = ticker
+        self.success = success
+        self.attempts = attempts
+        self.rows = rows
+        self.error = error
+
+    def __repr__(self):
+        if self.success:
+            return f'TickerResult({self.ticker}: {self.rows} rows in {self.attempts} attempts)'
+        return f'TickerResult({self.ticker}: failed after {self.attempts} attempts, {self.error})'
+
+
+class DownloadReport(dict):
+    """
+    keys = tickers, values = TickerResult
+    """
+
+    @property
+    def succeeded(self):
+        return [t for t, r in self.items() if r.success]
+
+    @property
+    def failed(self):
+        return [t for t, r in self.items() if not r.success]
+
+    def summary(self):
+        return f'{len(self.succeeded)} tickers downloaded, {len(self.failed)} failed'
+
+
+class DownloadScheduler:
+    """
+    Parameters
+    ----------
+    provider : DataProvider
+        Source of the data
+    batch_size : int, default 50
+        Tickers per provider call
+    max_workers : int, default 4
+        Provider calls running at the same time
+    retries : int, default 3
+        Extra attempts for tickers that failed or were missing
+    backoff : float, default 1
+        Seconds before the first retry, doubled at each new attempt
+    """
+
+    def __init__(self, provider, batch_size=50, max_workers=4, retries=3, backoff=1.0):
+        self.provider = provider
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+
+    def run(self, tickers, on_ticker=None, **kwargs):
+        """
+        Parameters
+        ----------
+        tickers: list
+            Tickers to download
+        on_ticker: callable, default None
+            Called as on_ticker(ticker, data) as soon as a ticker arrives, always from the
+            calling thread, e.g. to persist it
+        kwargs:
+            Passed to the provider
+
+        Returns
+        -------
+        tuple
+            (dict keys = tickers, values = DataFrame, DownloadReport)
+        """
+        tickers = list(dict.fromkeys(tickers))
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+
+        data = {}
+        report = DownloadReport()
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            futures = [pool.submit(self._download_batch, batch, kwargs) for batch in batches]
+            for future in as_completed(futures):
+                batch_data, batch_report = future.result()
+                for ticker, df in batch_data.items():
+                    if on_ticker is not None:
+                        on_ticker(ticker, df)
+                    data[ticker] = df
+                report.update(batch_report)
+
+        # keep the requested order
+        data = {t: data[t] for t in tickers if t in data}
+        report = DownloadReport((t, report[t]) for t in tickers)
+        return data, report
+
+    def _download_batch(self, batch, kwargs, calls=0):
+        # calls: provider calls that already included these tickers, before a split
+        data = {}
+        report = {}
+        pending = list(batch)
+        error = None
+        for attempt in range(1, self.retries + 2):
+            if attempt > 1:
+                time.sleep(self.backoff * 2 ** (attempt - 2))
+            try:
+                answer = self.provider.download(pending, **kwargs)
+            except Exception as e:
+                error = repr(e)
+                if len(pending) > 1:
+                    return self._split_batch(pending, kwargs, calls + attempt, data, report)
+                continue
+
+            error = 'no data returned'
+            for ticker in pending:
+                df = answer.get(ticker)
+                if df is not None and len(df):
+                    data[ticker] = df
+                    report[ticker] = TickerResult(ticker, True, calls + attempt, rows=len(df))
+            pending = [t for t in pending if t not in data]
+            if not pending:
+                break
+
+        for ticker in pending:
+            report[ticker] = TickerResult(ticker, False, calls + self.retries + 1, error=error)
+        return data, report
+
+    def _split_batch(self, pending, kwargs, calls, data, report):
+        # the call raised for the whole batch, each half is downloaded (and split) on its own
+        time.sleep(self.backoff)
+        middle = len(pending) // 2
+        for half in (pending[:middle], pending[middle:]):
+            half_data, half_report = self._download_batch(half, kwargs, calls)
+            data.update(half_data)
+            report.update(half_report)
+        return data, report
@@ -0,0 +1,154 @@
+"""
+Parallel indicator computation over many tickers with ragged histories.
+
+Ticker closes are packed in one shared memory block and workers write their results in
+a second one, so only offsets go through the pool and no frame is pickled.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from pandas import DataFrame, Series
+from bayao_finance.fused import IndicatorPlan
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before python 3.13 there is no track argument. Pool workers share the resource
+        # tracker of the parent, which unlinks the block once.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _compute_tasks(spec, inputs, outputs, n_outputs, tasks):
+    # tasks are (position, offset, length) of each ticker in inputs
+    plan = IndicatorPlan(spec)
+    for _, offset, length in tasks:
+        result = plan.compute(Series(inputs[offset:offset + length], copy=False))
+        outputs[offset * n_outputs:(offset + length) * n_outputs] = result.to_numpy().ravel()
+    return [position for position, _, _ in tasks]
+
+
+def _compute_shared_tasks(spec, input_name, output_name, n_outputs, tasks):
+    # runs in a worker process
+    input_block = _attach(input_name)
+    output_block = _attach(output_name)
+    try:
+        inputs = np.ndarray((input_block.size // 8,), dtype=np.float64, buffer=input_block.buf)
+        outputs = np.ndarray((output_block.size // 8,), dtype=np.float64, buffer=output_block.buf)
+        positions = _compute_tasks(spec, inputs, outputs, n_outputs, tasks)
+        del inputs, outputs
+    finally:
+        input_block.close()
+        output_block.close()
+    return positions
+
+
+class IndicatorEngine:
+    """
+    Computes an indicator spec over many tickers in parallel.
+
+    Parameters
+    ----------
+    executor : str, default "process"
+        "process" for a process pool or "thread" for a thread pool. Threads avoid
+        copying data and scale when the kernels release the GIL (numba).
+    max_workers : int, default None
+        Pool size. Default is the number of CPUs.
+    chunk_size : int, default 16
+        Tickers sent to a worker per task.
+    """
+
+    def __init__(self, executor="process", max_workers=None, chunk_size=16):
+        if executor not in ["process", "thread"]:
+            raise AttributeError('executor must be "process" or "thread"')
+        self.executor = executor
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+
+    def compute(self, data, spec):
+        """
+        Parameters
+        ----------
+        data: dict
+            keys = tickers, values = StockFrame or Series. StockFrames use their close.
+        spec: list
+            Indicators as in compute_indicators
+
+        Yields
+        ------
+        tuple
+            (ticker, DataFrame of indicators) as soon as each ticker is done
+        """
+        columns = IndicatorPlan(spec).compute(Series([1.0])).columns
+        n_outputs = len(columns)
+
+        tickers = list(data)
+        series = []
+        for ticker in tickers:
+            values = data[ticker]
+            if hasattr(values, '_indicator_data'):
+                values = values._indicator_data()
+            if isinstance(values, DataFrame):
+                raise AttributeError(f'Ticker {ticker} has no close column to compute indicators on')
+            series.append(values)
+
+        lengths = np.array([len(s) for s in series], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        total = int(lengths.sum())
+        tasks = [(i, int(offsets[i]), int(lengths[i])) for i in range(len(tickers))]
+        chunks = [tasks[i:i + self.chunk_size] for i in range(0, len(tasks), self.chunk_size)]
+
+        if self.executor == "thread":
+            inputs = np.empty(total)
+            outputs = np.empty(total * n_outputs)
+            self._fill(inputs, series, offsets, lengths)
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                futures = [pool.submit(_compute_tasks, spec, inputs, outputs, n_outputs, c) for c in chunks]
+                yield from self._collect(futures, outputs, tickers, series, offsets, lengths, columns)
+            return
+
+        # shared memory blocks can not be empty
+        input_block = shared_memory.SharedMemory(create=True, size=max(total, 1) * 8)
+        output_block = shared_memory.SharedMemory(create=True, size=max(total * n_outputs, 1) * 8)
+        try:
+            inputs = np.ndarray((total,), dtype=np.float64, buffer=input_block.buf)
+            outputs = np.ndarray((total * n_outputs,), dtype=np.float64, buffer=output_block.buf)
+            self._fill(inputs, series, offsets, lengths)
+            with ProcessPoolExecutor(self.max_workers) as pool:
+                futures = [pool.submit(_compute_shared_tasks, spec, input_block.name, output_block.name, n_outputs, c)
+                           for c in chunks]
+                yield from self._collect(futures, outputs, tickers, series, offsets, lengths, columns)
+            del inputs, outputs
+        finally:
+            input_block.close()
+            input_block.unlink()
+            output_block.close()
+            output_block.unlink()
+
+    def compute_all(self, data, spec):
+        """
+        Same as compute but waits for every ticker.
+
+        Returns
+        -------
+        dict
+            keys = tickers, values = DataFrame of indicators
+        """
+        results = dict(self.compute(data, spec))
+        return {ticker: results[ticker] for ticker in data}
+
+    @staticmethod
+    def _fill(inputs, series, offsets, lengths):
+        for s, offset, length in zip(series, offsets, lengths):
+            inputs[offset:offset + length] = s.to_numpy(dtype=np.float64)
+
+    @staticmethod
+    def _collect(futures, outputs, tickers, series, offsets, lengths, columns):
+        n_outputs = len(columns)
+        for future in as_completed(futures):
+            for position in future.result():
+                offset, length = offsets[position], lengths[position]
+                values = outputs[offset * n_outputs:(offset + length) * n_outputs].reshape(length, n_outputs)
+                # copied so results outlive the shared memory block
+                yield tickers[position], DataFrame(values.copy(), index=series[position].index, columns=columns)
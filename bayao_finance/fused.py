@@ -0,0 +1,157 @@
+from pandas import Series, DataFrame, concat
+from bayao_finance.indicators import (get_sma_from_data, get_sma_std_from_data, get_ema_from_data, get_rsi,
+                                     get_returns_from_data)
+
+INDICATOR_DEFAULTS = {
+    'sma': {'n': 20, 'min_periods': None},
+    'ema': {'n': 20, 'min_periods': None},
+    'macd': {'n_short': 12, 'n_long': 26, 'n_signal': 9},
+    'bb': {'n': 20, 'k': 2},
+    'rsi': {'n': 14, 'min_periods': None},
+    'returns': {},
+}
+
+
+def _parse_spec(spec):
+    """
+    Accepts "rsi", ("rsi", {"n": 10}) or ("rsi", 10) items and returns a list of
+    (name, indicator, params) with defaults filled.
+    """
+    parsed = []
+    for item in spec:
+        if isinstance(item, str):
+            indicator, params = item, {}
+        else:
+            indicator, params = item
+        if indicator not in INDICATOR_DEFAULTS:
+            raise AttributeError(f'Indicator {indicator} is not available. Use one of {list(INDICATOR_DEFAULTS)}')
+        if not isinstance(params, dict):
+            params = {'n': params}
+        params = dict(params)
+        name = params.pop('name', None)
+        unknown = set(params) - set(INDICATOR_DEFAULTS[indicator])
+        if unknown:
+            raise AttributeError(f'Invalid parameters for {indicator}: {sorted(unknown)}')
+        params = {**INDICATOR_DEFAULTS[indicator], **params}
+        if name is None:
+            name = '_'.join([indicator] + [str(v) for k, v in params.items() if k != 'min_periods'])
+        parsed.append((name, indicator, params))
+    return parsed
+
+
+class IndicatorPlan:
+    """
+    Computes several indicators over the same data sharing intermediate results.
+
+    Intermediates (rolling windows, EMAs) are keyed by their parameters, so an EMA used
+    by "ema" and "macd" or the rolling window used by "sma" and "bb" is computed only once.
+
+    Parameters
+    ----------
+    spec : list
+        Items like "rsi", ("sma", {"n": 50}) or ("bb", {"n": 20, "k": 2}).
+        A "name" key in params sets the output column name.
+    """
+
+    def __init__(self, spec):
+        self.spec = _parse_spec(spec)
+        # windows needing the standard deviation compute mean and std in one pass
+        self._std_windows = {params['n'] for _, indicator, params in self.spec if indicator == 'bb'}
+        self._cache = {}
+        self._data = None
+
+    def _get(self, key):
+        if key not in self._cache:
+            self._cache[key] = getattr(self, '_build_' + key[0])(*key[1:])
+        return self._cache[key]
+
+    def _min_periods(self, n, min_periods):
+        return min_periods if min_periods else n
+
+    def _build_sma_std(self, n):
+        return get_sma_std_from_data(self._data, n)
+
+    def _build_sma(self, n, min_periods):
+        if min_periods == n and n in self._std_windows:
+            return self._get(('sma_std', n))[0]
+        return get_sma_from_data(self._data, n, min_periods)
+
+    def _build_ema(self, n, min_periods):
+        return get_ema_from_data(self._data, n, min_periods)
+
+    def _build_macd(self, n_short, n_long):
+        return self._get(('ema', n_short, n_short)).sub(self._get(('ema', n_long, n_long)))
+
+    def _build_macd_signal(self, n_short, n_long, n_signal):
+        return get_ema_from_data(self._get(('macd', n_short, n_long)), n_signal)
+
+    def _build_rsi(self, n, min_periods):
+        return get_rsi(self._data, n, min_periods)
+
+    def _build_returns(self):
+        return get_returns_from_data(self._data)
+
+    def _indicator_outputs(self, name, indicator, params):
+        if indicator == 'sma':
+            n = params['n']
+            return {name: self._get(('sma', n, self._min_periods(n, params['min_periods'])))}
+        if indicator == 'ema':
+            n = params['n']
+            return {name: self._get(('ema', n, self._min_periods(n, params['min_periods'])))}
+        if indicator == 'macd':
+            n_short, n_long, n_signal = params['n_short'], params['n_long'], params['n_signal']
+            return {name: self._get(('macd', n_short, n_long)),
+                    f'{name}_signal': self._get(('macd_signal', n_short, n_long, n_signal))}
+        if indicator == 'bb':
+            n, k = params['n'], params['k']
+            mean, std = self._get(('sma_std', n))
+            return {f'{name}_inf': mean.sub(std.mul(k)),
+                    name: mean,
+                    f'{name}_sup': mean.add(std.mul(k))}
+        if indicator == 'rsi':
+            n = params['n']
+            return {name: self._get(('rsi', n, self._min_periods(n, params['min_periods'])))}
+        return {name: self._get(('returns',))}
+
+    def compute(self, data):
+        """
+        Parameters
+        ----------
+        data: Series or DataFrame
+
+        Returns
+        -------
+        DataFrame
+            For a Series, one column per output. For a DataFrame, columns are a
+            MultiIndex of (output, data column).
+        """
+        self._data = data
+        self._cache = {}
+        outputs = {}
+        try:
+            for name, indicator, params in self.spec:
+                outputs.update(self._indicator_outputs(name, indicator, params))
+        finally:
+            self._data = None
+            self._cache = {}
+
+        if isinstance(data, Series):
+            return DataFrame({k: v.to_numpy() for k, v in outputs.items()}, index=data.index)
+        return concat({k: DataFrame(v) for k, v in outputs.items()}, axis=1)
+
+
+def compute_indicators(data, spec):
+    """
+    Computes all indicators in spec over data in a single plan.
+
+    Parameters
+    ----------
+    data: Series or DataFrame
+    spec: list
+        See IndicatorPlan
+
+    Returns
+    -------
+    DataFrame
+    """
+    return IndicatorPlan(spec).compute(data)
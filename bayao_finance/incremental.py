@@ -0,0 +1,164 @@
+import os
+import pandas as pd
+from bayao_finance.ticker_extension import TickerParser
+from bayao_finance.storage import slice_dates
+from bayao_finance.catalog import Catalog
+
+PART_DATE_FORMAT = "%Y%m%d%H%M%S"
+
+
+class _Part:
+    # dates of the name are only informative, the catalog holds the exact ones
+    def __init__(self, file_name, extension):
+        seq, _, _ = file_name[:-len(extension)].split('_')
+        self.file_name = file_name
+        self.seq = int(seq)
+
+
+class IncrementalStore:
+    """
+    Append only store keyed by ticker.
+
+    Each ticker has its own folder and every append writes a new part file holding only
+    the new rows, named "<sequence>_<first date>_<last date>". History is never rewritten:
+    rows with repeated timestamps are resolved when reading, keeping the latest written.
+    Parts are listed in the store catalog (see bayao_finance.catalog), so finding the last
+    stored bar or the parts of a date range does not open any file.
+
+    Parameters
+    ----------
+    root : str
+        Store folder
+    storage : BaseStorage
+        Format of part files
+    """
+
+    def __init__(self, root, storage):
+        self.root = root
+        self.storage = storage
+        self.catalog = Catalog(root)
+        if not self.catalog.exists and os.path.isdir(root):
+            # stores written before catalogs existed, read only stores keep it in memory
+            self._scan_catalog()
+            self.catalog.cache()
+
+    def _ticker_folder(self, ticker):
+        return os.path.join(self.root, TickerParser(ticker).save_format())
+
+    def _parts(self, ticker):
+        # catalog entries of ticker, by sequence
+        return self.catalog.entries(ticker, self.storage.extension)
+
+    def rebuild_catalog(self):
+        """
+        Lists every part file found in the store folders, reading each of them.
+        Use it after parts were written or removed without the store.
+        """
+        self._scan_catalog()
+        self.catalog.save()
+
+    def _scan_catalog(self):
+        self.catalog = Catalog(self.root)
+        self.catalog.clear()
+        extension = self.storage.extension
+        files = []
+        for folder in sorted(os.listdir(self.root)):
+            if not os.path.isdir(os.path.join(self.root, folder)):
+                continue
+            ticker = TickerParser(folder).ticker
+            parts = [_Part(i, extension) for i in os.listdir(os.path.join(self.root, folder)) if i.endswith(extension)]
+            files += [(ticker, f'{folder}/{p.file_name}') for p in sorted(parts, key=lambda p: p.seq)]
+        self.catalog.scan(files, self.storage)
+
+    def tickers(self):
+        return self.catalog.tickers(self.storage.extension)
+
+    def last_timestamp(self, ticker):
+        """
+        Returns the last stored timestamp of ticker or None if nothing is stored.
+        """
+        return self.catalog.last(ticker, self.storage.extension)
+
+    def append(self, ticker, frame, save_catalog=True):
+        """
+        Stores the rows of frame not older than the last stored timestamp.
+
+        The bar at the last stored timestamp is written again so a partial bar gets
+        replaced by its final values.
+
+        Parameters
+        ----------
+        ticker: str
+        frame: DataFrame
+        save_catalog: bool, default True
+            If False the catalog is only updated in memory, call catalog.save() after
+            appending many tickers
+
+        Returns
+        -------
+        int
+            Number of rows written
+        """
+        frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+        parts = self._parts(ticker)
+        if parts:
+            last = self.last_timestamp(ticker)
+            frame = frame[frame.index >= last]
+        if frame.empty:
+            return 0
+
+        self._write_part(ticker, frame, parts)
+        if save_catalog:
+            self.catalog.save()
+        return len(frame)
+
+    def _write_part(self, ticker, frame, parts):
+        folder = self._ticker_folder(ticker)
+        os.makedirs(folder, exist_ok=True)
+        # parts written by another store are not in this catalog yet and are never overwritten
+        extension = self.storage.extension
+        names = [os.path.basename(p.file) for p in parts] + [i for i in os.listdir(folder) if i.endswith(extension)]
+        seq = max(_Part(i, extension).seq for i in names) + 1 if names else 0
+        first = frame.index[0].strftime(PART_DATE_FORMAT)
+        last = frame.index[-1].strftime(PART_DATE_FORMAT)
+        file_name = f'{seq:06d}_{first}_{last}{self.storage.extension}'
+        self.storage.write(frame, os.path.join(folder, file_name))
+        self.catalog.add(ticker, f'{os.path.basename(folder)}/{file_name}', frame)
+
+    def read(self, ticker, start=None, end=None, columns=None):
+        """
+        Parameters
+        ----------
+        ticker: str
+        start: str or datetime, default None
+            First date to return, inclusive
+        end: str or datetime, default None
+            Last date to return, inclusive. Use it to get data as of a date.
+        columns: list, default None
+            Columns to read. Default is all columns
+
+        Returns
+        -------
+        DataFrame or None if ticker has no data in the range
+        """
+        frames = [self.storage.read_range(os.path.join(self.root, p.file), start, end, columns=columns)
+                  for p in self.catalog.plan(ticker, start, end, extension=self.storage.extension)]
+        if not frames:
+            return None
+        data = pd.concat(frames)
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        return slice_dates(data, start, end)
+
+    def compact(self, ticker):
+        """
+        Merges all parts of ticker into a single part file.
+        """
+        parts = self._parts(ticker)
+        if len(parts) < 2:
+            return
+        data = self.read(ticker)
+        self._write_part(ticker, data, parts)
+        for p in parts:
+            os.remove(os.path.join(self.root, p.file))
+            self.catalog.remove(p.file)
+        self.catalog.save()
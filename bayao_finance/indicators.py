@@ -1,17 +1,66 @@
-from pandas import Series
-from numpy import where
+import numpy as np
+from pandas import Series, DataFrame, concat
+from bayao_finance import kernels
+
+
+def _kernel_values(data, kwargs, recursive=False):
+    """
+    Returns data as a float ndarray when it can be computed by kernels, otherwise None.
+    Extra pandas kwargs and non numeric data go through pandas, and so do recursive
+    indicators when their kernels are not faster than pandas.
+    """
+    if kwargs or not isinstance(data, (Series, DataFrame)) or len(data) == 0:
+        return None
+    if recursive and not kernels.recursive_kernels_fast():
+        return None
+    values = data.to_numpy()
+    if values.dtype.kind not in 'fiu':
+        return None
+    return values
+
+
+def _keep_float32(data, result):
+    # pandas windows compute in float64, compact float32 data keeps float32 results
+    dtypes = [data.dtype] if isinstance(data, Series) else list(data.dtypes)
+    if dtypes and all(i == np.float32 for i in dtypes):
+        return result.astype(np.float32)
+    return result
+
+
+def _wrap(data, values):
+    if isinstance(data, Series):
+        return data._constructor(values, index=data.index, name=data.name)
+    return data._constructor(values, index=data.index, columns=data.columns)
 
 
 def get_sma_from_data(data, n=20, min_periods=None, **kwargs):
     if not min_periods:
         min_periods = n
-    return data.rolling(n, min_periods=min_periods, **kwargs).mean()
+    values = _kernel_values(data, kwargs)
+    if values is not None:
+        return _wrap(data, kernels.rolling_mean(values, n, min_periods))
+    return _keep_float32(data, data.rolling(n, min_periods=min_periods, **kwargs).mean())
+
+
+def get_sma_std_from_data(data, n=20, min_periods=None, **kwargs):
+    # return a tuple: (SMA, rolling standard deviation) sharing one window
+    if not min_periods:
+        min_periods = n
+    values = _kernel_values(data, kwargs, recursive=True)
+    if values is not None:
+        mean, std = kernels.rolling_mean_std(values, n, min_periods)
+        return _wrap(data, mean), _wrap(data, std)
+    window = data.rolling(n, min_periods=min_periods, **kwargs)
+    return _keep_float32(data, window.mean()), _keep_float32(data, window.std())
 
 
 def get_ema_from_data(data, n=20, min_periods=None, **kwargs):
     if not min_periods:
         min_periods = n
-    return data.ewm(span=n, min_periods=min_periods, **kwargs).mean()
+    values = _kernel_values(data, kwargs, recursive=True)
+    if values is not None:
+        return _wrap(data, kernels.ewm_mean(values, 2 / (n + 1), min_periods))
+    return _keep_float32(data, data.ewm(span=n, min_periods=min_periods, **kwargs).mean())
 
 
 def get_macd_from_data(data, n_short=12, n_long=26, n_signal=9, token=None):
@@ -23,7 +72,7 @@ def get_macd_from_data(data, n_short=12, n_long=26, n_signal=9, token=None):
         .sub(get_ema_from_data(data=data, n=n_long))
     )
 
-    signal = macd_calculation.ewm(span=n_signal, min_periods=n_signal).mean()
+    signal = get_ema_from_data(macd_calculation, n=n_signal)
 
     if isinstance(macd_calculation, Series):
         if not token:
@@ -32,20 +81,17 @@ def get_macd_from_data(data, n_short=12, n_long=26, n_signal=9, token=None):
         signal = signal.to_frame(name=token)
 
     columns_index = []
-    macd_cols = macd_calculation.columns
-    for i in macd_cols:
-        macd_calculation[i + '_signal'] = signal[i]
+    for i in macd_calculation.columns:
         columns_index.extend([i, f'{i}_signal'])
 
-    return macd_calculation[columns_index]
+    return concat([macd_calculation, signal.add_suffix('_signal')], axis=1)[columns_index]
 
 
 def get_bollinger_bands_from_data(data, n=20, k=2, token=None):
     # return a tuple: (min, center, max)
     # If data == None -> data = self.close
 
-    bb = get_sma_from_data(data, n=n)
-    std = data.rolling(n).std()
+    bb, std = get_sma_std_from_data(data, n=n)
 
     bb_inf = bb.sub(std.mul(k))
     bb_sup = bb.add(std.mul(k))
@@ -53,35 +99,63 @@ def get_bollinger_bands_from_data(data, n=20, k=2, token=None):
     if isinstance(bb, Series):
         if not token:
             token = 'bb'
-        bb = data.to_frame(name=token)
+        bb = bb.to_frame(name=token)
         bb_inf = bb_inf.to_frame(name=token)
         bb_sup = bb_sup.to_frame(name=token)
 
     columns_index = []
     for i in bb.columns:
-        bb[i + '_inf'] = bb_inf[i]
-        bb[i + '_sup'] = bb_sup[i]
         columns_index.extend([f'{i}_inf', i, f'{i}_sup'])
 
-    return bb[columns_index]
+    return concat([bb, bb_inf.add_suffix('_inf'), bb_sup.add_suffix('_sup')], axis=1)[columns_index]
 
 
 def get_rsi(data, n=14, min_periods=None, **kwargs):
     if not min_periods:
         min_periods = n
 
-    delta = data.diff().copy()
-    u = delta * 0
-    d = delta * 0
-    u[delta >= 0] = delta[delta >= 0]
-    d[delta < 0] = delta[delta < 0]
+    values = _kernel_values(data, kwargs, recursive=True)
+    if values is not None:
+        return _wrap(data, kernels.rsi(values, n, min_periods))
+
+    delta = data.diff()
+    u = delta.clip(lower=0)
+    d = -delta.clip(upper=0)
     rs = (
             u.ewm(alpha=1 / n, min_periods=min_periods, **kwargs).mean() /
             d.ewm(alpha=1 / n, min_periods=min_periods, **kwargs).mean()
     )
     rsi_calc = 100 - 100 / (1 + rs)
-    return rsi_calc
+    return _keep_float32(data, rsi_calc)
 
 
 def get_returns_from_data(data):
     return data.pct_change()
+
+
+def get_true_range_from_data(high, low, close):
+    # max(high - low, |high - previous close|, |low - previous close|)
+    # The first row has no previous close and is high - low. Building block of ATR, ADX,
+    # Keltner channels and Chandelier exits.
+    values = [_kernel_values(i, {}) for i in (high, low, close)]
+    if all(i is not None for i in values):
+        return _wrap(close, kernels.true_range(*values))
+    previous_close = close.shift()
+    true_range = high - low
+    for other in [(high - previous_close).abs(), (low - previous_close).abs()]:
+        true_range = true_range.where(~((other > true_range) | true_range.isna()), other)
+    return true_range
+
+
+def get_atr_from_data(high, low, close, n=14, wilder=False, min_periods=None):
+    # Average True Range: SMA of the true range, or Wilder smoothing (alpha = 1 / n) if wilder
+    if not min_periods:
+        min_periods = n
+    true_range = get_true_range_from_data(high, low, close)
+    if not wilder:
+        return get_sma_from_data(true_range, n, min_periods)
+
+    values = _kernel_values(true_range, {}, recursive=True)
+    if values is not None:
+        return _wrap(true_range, kernels.ewm_mean(values, 1 / n, min_periods))
+    return _keep_float32(true_range, true_range.ewm(alpha=1 / n, min_periods=min_periods).mean())
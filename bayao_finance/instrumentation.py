@@ -0,0 +1,267 @@
+"""
+Opt-in timing of the I/O and indicator hot paths.
+
+enable() replaces the instrumented functions with timed wrappers and disable() puts the
+originals back, so nothing is measured and nothing costs anything while disabled.
+Each call records wall time, rows and bytes under the name of the function. Times are
+inclusive: download_data also counts the StockFrame constructions it makes.
+
+    from bayao_finance import instrumentation
+
+    with instrumentation.instrumented():
+        manipulator.read_data(tickers=['PETR4.SA'])
+    print(instrumentation.report())
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pandas import DataFrame, Series
+
+
+class CallStats:
+    """
+    Totals of one instrumented function.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return f'CallStats({self.name}: {self.calls} calls, {self.seconds:.6f} s, {self.rows} rows, {self.bytes} bytes)'
+
+
+_lock = threading.Lock()
+_stats = {}
+_callbacks = []
+# (namespace, attribute, original) of every replaced function
+_patched = []
+
+
+def _rows(value):
+    if isinstance(value, (Series, DataFrame)):
+        return len(value)
+    if isinstance(value, dict):
+        # LazyStockDict is a Mapping, not a dict, so lazy reads do not load tickers here
+        return sum(len(i) for i in value.values() if isinstance(i, (Series, DataFrame)))
+    return 0
+
+
+def _file_bytes(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def _measure_result(args, kwargs, result):
+    return _rows(result), 0
+
+
+def _measure_input(args, kwargs, result):
+    # indicators: rows of the data they ran on
+    data = kwargs.get('data', args[0] if args else None)
+    return _rows(data), 0
+
+
+def _measure_self(args, kwargs, result):
+    # constructors: rows of the object built
+    return _rows(args[0]), 0
+
+
+def _measure_write(args, kwargs, result):
+    # storage.write(frame, path)
+    frame, path = args[1], kwargs.get('path', args[2] if len(args) > 2 else None)
+    return _rows(frame), _file_bytes(path)
+
+
+def _measure_read(args, kwargs, result):
+    # storage.read(path) and storage.read_range(path): size of the file on disk
+    path = kwargs.get('path', args[1] if len(args) > 1 else None)
+    return _rows(result), _file_bytes(path)
+
+
+def _record(name, seconds, rows, nbytes):
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = CallStats(name)
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        stats.rows += rows
+        stats.bytes += nbytes
+        callbacks = list(_callbacks)
+    for callback in callbacks:
+        callback(name, seconds, rows, nbytes)
+
+
+def _timed(function, name, measure):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        rows, nbytes = measure(args, kwargs, result)
+        _record(name, seconds, rows, nbytes)
+        return result
+
+    return wrapper
+
+
+def hot_paths():
+    """
+    Returns
+    -------
+    list
+        (namespace, attribute, name, measure) of every instrumented function
+    """
+    from bayao_finance import indicators, stockframe, persistence, providers, storage
+
+    paths = [
+        (persistence.StockManipulator, 'download_data', 'StockManipulator.download_data', _measure_result),
+        (persistence.StockManipulator, 'read_data', 'StockManipulator.read_data', _measure_result),
+        (stockframe.StockFrame, '__init__', 'StockFrame.__init__', _measure_self),
+        (stockframe, '_ensure_columns', 'stockframe._ensure_columns', _measure_result),
+        (stockframe.ColPatternMapper, 'map_and_kind', 'ColPatternMapper.map_and_kind', _measure_result),
+    ]
+    for cls in providers.PROVIDERS.values():
+        if 'download' in vars(cls):
+            paths.append((cls, 'download', f'{cls.__name__}.download', _measure_result))
+    for cls in [storage.BaseStorage, *storage.STORAGES.values()]:
+        for attribute, measure in [('write', _measure_write), ('read', _measure_read), ('read_range', _measure_read)]:
+            if attribute in vars(cls):
+                paths.append((cls, attribute, f'{cls.__name__}.{attribute}', measure))
+    for attribute, value in vars(indicators).items():
+        if callable(value) and not attribute.startswith('_') and getattr(value, '__module__', None) == indicators.__name__:
+            paths.append((indicators, attribute, f'indicators.{attribute}', _measure_input))
+    return paths
+
+
+def _package_modules():
+    return [m for name, m in list(sys.modules.items())
+            if m is not None and (name == 'bayao_finance' or name.startswith('bayao_finance.'))]
+
+
+def enable(callback=None):
+    """
+    Starts timing the hot paths.
+
+    Parameters
+    ----------
+    callback: callable, default None
+        Registered with add_callback
+    """
+    if callback is not None:
+        add_callback(callback)
+    with _lock:
+        if _patched:
+            return
+        modules = _package_modules()
+        for namespace, attribute, name, measure in hot_paths():
+            original = vars(namespace)[attribute]
+            wrapper = _timed(original, name, measure)
+            setattr(namespace, attribute, wrapper)
+            _patched.append((namespace, attribute, original))
+            # functions imported by name, e.g. "from bayao_finance.indicators import *"
+            for module in modules:
+                if module is not namespace and vars(module).get(attribute) is original:
+                    setattr(module, attribute, wrapper)
+                    _patched.append((module, attribute, original))
+
+
+def disable():
+    """
+    Puts the original functions back. Recorded stats are kept until reset.
+    """
+    with _lock:
+        while _patched:
+            namespace, attribute, original = _patched.pop()
+            setattr(namespace, attribute, original)
+
+
+def is_enabled():
+    return bool(_patched)
+
+
+@contextmanager
+def instrumented(callback=None, reset_stats=True):
+    """
+    Enables instrumentation inside a with block.
+
+    Parameters
+    ----------
+    callback: callable, default None
+        Called for every call recorded inside the block
+    reset_stats: bool, default True
+        Clear previous stats when entering
+    """
+    if reset_stats:
+        reset()
+    if callback is not None:
+        add_callback(callback)
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+        if callback is not None:
+            remove_callback(callback)
+
+
+def add_callback(callback):
+    """
+    Parameters
+    ----------
+    callback: callable
+        Called as callback(name, seconds, rows, nbytes) after each instrumented call,
+        e.g. to export metrics. It runs in the thread that made the call.
+    """
+    with _lock:
+        if callback not in _callbacks:
+            _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    with _lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def stats():
+    """
+    Returns
+    -------
+    dict
+        keys = function names, values = CallStats
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def report():
+    """
+    Returns
+    -------
+    DataFrame
+        One row per instrumented function that was called, slowest total first:
+        calls, seconds, mean_ms, max_ms, rows, bytes, rows_per_second
+    """
+    columns = ['calls', 'seconds', 'mean_ms', 'max_ms', 'rows', 'bytes', 'rows_per_second']
+    with _lock:
+        rows = {s.name: [s.calls, s.seconds, 1000 * s.seconds / s.calls, 1000 * s.max_seconds, s.rows, s.bytes,
+                         s.rows / s.seconds if s.seconds else 0.0] for s in _stats.values()}
+    table = DataFrame.from_dict(rows, orient='index', columns=columns)
+    return table.sort_values('seconds', ascending=False)
@@ -0,0 +1,406 @@
+"""
+Raw ndarray implementations of the indicators.
+
+Every kernel takes 1-D or 2-D (time x ticker) float arrays and returns an array of the
+same shape and float dtype. NaN follows pandas rules: missing rows do not count as
+observations. Rolling and exponentially weighted kernels treat inf as missing, as pandas
+does.
+
+Recursive kernels (EMA, Wilder smoothing, rolling std) run compiled loops when numba is
+installed. Without numba they use blocked prefix sums, which are fully vectorized:
+rolling sums are differences of cumulative sums and exponentially weighted sums are
+cumulative sums of values scaled by powers of the decay factor.
+
+Results match the pandas implementation within RTOL and ATOL.
+"""
+import functools
+import importlib.util
+import numpy as np
+
+# numba is imported when a compiled kernel is first called, it takes longer to import
+# than the rest of the package
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+# Prefix sums restart every CHUNK_ROWS rows to keep rounding errors independent of length
+CHUNK_ROWS = 4096
+
+# Largest power of the decay factor inverse used by exponentially weighted sums, ln(1e200)
+EWM_MAX_EXPONENT = 460.0
+
+
+def _jit(func):
+    if not HAS_NUMBA:
+        return func
+    compiled = None
+
+    @functools.wraps(func)
+    def call(*args):
+        nonlocal compiled
+        if compiled is None:
+            import numba
+            compiled = numba.njit(cache=True, nogil=True)(func)
+        return compiled(*args)
+
+    return call
+
+
+def recursive_kernels_fast():
+    """
+    Whether EMA, Wilder and rolling std kernels beat pandas. Without numba the blocked
+    sums are slower than pandas' compiled loops, so callers should keep using pandas.
+    """
+    return HAS_NUMBA
+
+
+def _as_2d(x):
+    x = np.asarray(x)
+    if x.dtype.kind != 'f':
+        x = x.astype(np.float64)
+    if x.ndim == 1:
+        return x.reshape(-1, 1), True
+    return x, False
+
+
+def _finite(x):
+    # pandas rolling and ewm windows treat inf as missing, prefix sums would also carry
+    # it into every later window
+    inf = np.isinf(x)
+    if inf.any():
+        x = x.copy()
+        x[inf] = np.nan
+    return x
+
+
+def _restore(out, squeeze):
+    return out[:, 0] if squeeze else out
+
+
+def _leading_nan_rows(valid):
+    # rows before the first value of any column add nothing to windows or weighted sums
+    rows = valid.any(axis=1)
+    return int(rows.argmax()) if rows.any() else len(valid)
+
+
+def _window_sums(segment, n, skip):
+    """
+    Sums over the n rows ending at each row of segment, dropping the first skip rows.
+    """
+    prefix = np.zeros((len(segment) + n,) + segment.shape[1:])
+    np.cumsum(segment, axis=0, out=prefix[n:])
+    return prefix[n + skip:] - prefix[skip:len(segment)]
+
+
+def _chunks(n_rows, n):
+    # yields (start, stop, first row needed by the windows of [start, stop))
+    for start in range(0, n_rows, CHUNK_ROWS):
+        yield start, min(start + CHUNK_ROWS, n_rows), max(start - n + 1, 0)
+
+
+def _window_count(valid, has_nan, n, start, stop, first):
+    if has_nan:
+        return _window_sums(valid[first:stop], n, start - first)
+    return np.minimum(np.arange(start, stop) + 1, n)[:, None].astype(np.float64)
+
+
+def rolling_mean(x, n, min_periods=None):
+    """
+    Rolling mean using prefix sums. Windows with fewer than min_periods valid values are NaN.
+    """
+    if not min_periods:
+        min_periods = n
+    x, squeeze = _as_2d(x)
+    x = _finite(x)
+    out = np.empty_like(x)
+    valid = ~np.isnan(x)
+    lead = _leading_nan_rows(valid)
+    out[:lead] = np.nan
+    x, valid, out_rows = x[lead:], valid[lead:], out[lead:]
+    has_nan = not valid.all()
+    filled = np.where(valid, x, 0) if has_nan else x
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start, stop, first in _chunks(x.shape[0], n):
+            count = _window_count(valid, has_nan, n, start, stop, first)
+            total = _window_sums(filled[first:stop], n, start - first)
+            out_rows[start:stop] = np.where(count >= min_periods, total / count, np.nan)
+
+    return _restore(out, squeeze)
+
+
+@_jit
+def _rolling_mean_var_loop(x, n, min_periods, ddof, mean_out, var_out):
+    n_rows, n_cols = x.shape
+    for j in range(n_cols):
+        nobs = 0
+        mean = 0.0
+        ssqdm = 0.0
+        for i in range(n_rows):
+            if i >= n:
+                old = x[i - n, j]
+                if old == old:
+                    nobs -= 1
+                    if nobs == 0:
+                        mean = 0.0
+                        ssqdm = 0.0
+                    else:
+                        delta = old - mean
+                        mean -= delta / nobs
+                        ssqdm -= delta * (old - mean)
+            value = x[i, j]
+            if value == value:
+                nobs += 1
+                delta = value - mean
+                mean += delta / nobs
+                ssqdm += delta * (value - mean)
+
+            if nobs >= min_periods and nobs > 0:
+                mean_out[i, j] = mean
+            else:
+                mean_out[i, j] = np.nan
+            if nobs >= min_periods and nobs > ddof:
+                var_out[i, j] = max(ssqdm / (nobs - ddof), 0.0) if nobs > 1 else 0.0
+            else:
+                var_out[i, j] = np.nan
+
+
+def _rolling_mean_var_sums(x, n, min_periods, ddof, mean_out, var_out):
+    # shifted sums: values are centered on the chunk mean before summing squares,
+    # which keeps the cancellation in sum(x^2) - sum(x)^2 / n small
+    valid = ~np.isnan(x)
+    lead = _leading_nan_rows(valid)
+    mean_out[:lead] = np.nan
+    var_out[:lead] = np.nan
+    x, valid, mean_out, var_out = x[lead:], valid[lead:], mean_out[lead:], var_out[lead:]
+    has_nan = not valid.all()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start, stop, first in _chunks(x.shape[0], n):
+            segment = x[first:stop]
+            if has_nan:
+                segment_valid = valid[first:stop]
+                segment = np.where(segment_valid, segment, 0)
+                shift = segment.sum(axis=0) / np.maximum(segment_valid.sum(axis=0), 1)
+                dev = np.where(segment_valid, segment - shift, 0)
+            else:
+                shift = segment.mean(axis=0)
+                dev = segment - shift
+            count = _window_count(valid, has_nan, n, start, stop, first)
+            s1 = _window_sums(dev, n, start - first)
+            s2 = _window_sums(dev * dev, n, start - first)
+
+            mean_out[start:stop] = np.where((count >= min_periods) & (count > 0), s1 / count + shift, np.nan)
+            var = np.where(count > 1, np.maximum((s2 - s1 * s1 / count) / (count - ddof), 0), 0)
+            var_out[start:stop] = np.where((count >= min_periods) & (count > ddof), var, np.nan)
+
+
+def rolling_mean_std(x, n, min_periods=None, ddof=1):
+    """
+    Rolling mean and standard deviation in a single pass.
+
+    Uses Welford's algorithm with numba, shifted prefix sums otherwise.
+
+    Returns
+    -------
+    tuple
+        (mean, std)
+    """
+    if not min_periods:
+        min_periods = n
+    x, squeeze = _as_2d(x)
+    x = _finite(x)
+    mean_out = np.empty_like(x)
+    var_out = np.empty_like(x)
+    if HAS_NUMBA:
+        _rolling_mean_var_loop(x, n, min_periods, ddof, mean_out, var_out)
+    else:
+        _rolling_mean_var_sums(x, n, min_periods, ddof, mean_out, var_out)
+    return _restore(mean_out, squeeze), _restore(np.sqrt(var_out), squeeze)
+
+
+@_jit
+def _ewm_mean_loop(x, alpha, min_periods, adjust, out):
+    n_rows, n_cols = x.shape
+    for j in range(n_cols):
+        old_wt_factor = 1.0 - alpha[j]
+        new_wt = 1.0 if adjust else alpha[j]
+        weighted = x[0, j]
+        nobs = 1 if weighted == weighted else 0
+        out[0, j] = weighted if nobs >= min_periods else np.nan
+        old_wt = 1.0
+        for i in range(1, n_rows):
+            cur = x[i, j]
+            is_observation = cur == cur
+            if is_observation:
+                nobs += 1
+            if weighted == weighted:
+                old_wt *= old_wt_factor
+                if is_observation:
+                    # avoid numerical errors on constant series
+                    if weighted != cur:
+                        weighted = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+                    if adjust:
+                        old_wt += new_wt
+                    else:
+                        old_wt = 1.0
+            elif is_observation:
+                weighted = cur
+            out[i, j] = weighted if nobs >= min_periods else np.nan
+
+
+def _ewm_mean_vector(x, alpha, min_periods, adjust, out):
+    # same recursion as _ewm_mean_loop, one time step at a time over all columns
+    n_rows, n_cols = x.shape
+    old_wt_factor = 1.0 - alpha
+    new_wt = np.ones(n_cols) if adjust else alpha
+    weighted = x[0].copy()
+    nobs = (~np.isnan(weighted)).astype(np.int64)
+    out[0] = np.where(nobs >= min_periods, weighted, np.nan)
+    old_wt = np.ones(n_cols)
+    for i in range(1, n_rows):
+        cur = x[i]
+        is_observation = ~np.isnan(cur)
+        nobs += is_observation
+        started = ~np.isnan(weighted)
+        old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+        update = started & is_observation
+        blended = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+        weighted = np.where(update & (weighted != cur), blended, weighted)
+        if adjust:
+            old_wt = np.where(update, old_wt + new_wt, old_wt)
+        else:
+            old_wt = np.where(update, 1.0, old_wt)
+        weighted = np.where(~started & is_observation, cur, weighted)
+        out[i] = np.where(nobs >= min_periods, weighted, np.nan)
+
+
+def _ewsum(z, decay):
+    """
+    y[t] = decay * y[t - 1] + z[t] computed with blocked cumulative sums.
+    """
+    out = np.empty(z.shape)
+    log_decay = np.log(decay)
+    block = int(max(1, min(CHUNK_ROWS, EWM_MAX_EXPONENT // -log_decay.min())))
+    powers = np.arange(min(block, z.shape[0]))[:, None] * log_decay
+    grow = np.exp(-powers)
+    shrink = np.exp(powers)
+    carry = np.zeros(z.shape[1])
+    for start in range(0, z.shape[0], block):
+        stop = min(start + block, z.shape[0])
+        length = stop - start
+        acc = out[start:stop]
+        np.multiply(z[start:stop], grow[:length], out=acc)
+        np.cumsum(acc, axis=0, out=acc)
+        acc += carry * decay
+        acc *= shrink[:length]
+        carry = acc[-1]
+    return out
+
+
+def _ewm_mean_sums(x, alpha, min_periods, out):
+    # with adjust, the ewm is a ratio of exponentially weighted sums of values and of weights
+    decay = 1.0 - alpha
+    if np.all(decay == decay[0]):
+        # powers of a shared decay are computed once for all columns
+        decay = decay[:1]
+    valid = ~np.isnan(x)
+    lead = _leading_nan_rows(valid)
+    out[:lead] = np.nan
+    x, valid, out = x[lead:], valid[lead:], out[lead:]
+    has_nan = not valid.all()
+    if has_nan:
+        values = _ewsum(np.where(valid, x, 0), decay)
+        weights = _ewsum(valid, decay)
+        nobs = np.cumsum(valid, axis=0)
+    else:
+        values = _ewsum(x, decay)
+        weights = _ewsum(np.ones((x.shape[0], len(decay))), decay)
+        nobs = np.arange(1, x.shape[0] + 1)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out[:] = np.where(nobs >= min_periods, values / weights, np.nan)
+
+
+def ewm_mean(x, alpha, min_periods=1, adjust=True):
+    """
+    Exponentially weighted mean, same as pandas ewm(alpha=alpha, adjust=adjust).mean().
+
+    Parameters
+    ----------
+    x: ndarray
+    alpha: float or ndarray
+        Smoothing factor, one per column if an array. EMA of span n uses 2 / (n + 1),
+        Wilder smoothing uses 1 / n.
+    min_periods: int
+    adjust: bool
+    """
+    x, squeeze = _as_2d(x)
+    x = _finite(x)
+    alpha = np.ascontiguousarray(np.broadcast_to(np.asarray(alpha, dtype=np.float64), (x.shape[1],)))
+    min_periods = max(int(min_periods or 0), 1)
+    out = np.empty_like(x)
+    if x.shape[0] == 0:
+        return _restore(out, squeeze)
+    if HAS_NUMBA:
+        _ewm_mean_loop(x, alpha, min_periods, adjust, out)
+    elif adjust and np.all(alpha < 1):
+        _ewm_mean_sums(x, alpha, min_periods, out)
+    else:
+        _ewm_mean_vector(x, alpha, min_periods, adjust, out)
+    return _restore(out, squeeze)
+
+
+def diff(x):
+    x, squeeze = _as_2d(x)
+    out = np.empty_like(x)
+    out[:1] = np.nan
+    np.subtract(x[1:], x[:-1], out=out[1:])
+    return _restore(out, squeeze)
+
+
+def rsi(x, n=14, min_periods=None):
+    """
+    Relative Strength Index with Wilder smoothing of gains and losses.
+    Gains and losses are smoothed together in one call.
+    """
+    if not min_periods:
+        min_periods = n
+    x, squeeze = _as_2d(x)
+    delta = diff(x)
+    n_cols = x.shape[1]
+    moves = np.empty((x.shape[0], 2 * n_cols), dtype=x.dtype)
+    np.maximum(delta, 0, out=moves[:, :n_cols])
+    np.maximum(-delta, 0, out=moves[:, n_cols:])
+    smoothed = ewm_mean(moves, 1 / n, min_periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = smoothed[:, :n_cols] / smoothed[:, n_cols:]
+        out = 100 - 100 / (1 + rs)
+    return _restore(out, squeeze)
+
+
+def true_range(high, low, close):
+    """
+    max(high - low, |high - previous close|, |low - previous close|).
+    The first row has no previous close and is high - low.
+    """
+    high, squeeze = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    prev_close = np.empty_like(close)
+    prev_close[:1] = np.nan
+    prev_close[1:] = close[:-1]
+    with np.errstate(invalid='ignore'):
+        out = high - low
+        np.fmax(out, np.abs(high - prev_close), out=out)
+        np.fmax(out, np.abs(low - prev_close), out=out)
+    return _restore(out, squeeze)
+
+
+def atr(high, low, close, n=14, wilder=False, min_periods=None):
+    """
+    Average True Range. Simple moving average of true range, or Wilder smoothing if wilder.
+    """
+    tr = true_range(high, low, close)
+    if wilder:
+        return ewm_mean(tr, 1 / n, min_periods or n)
+    return rolling_mean(tr, n, min_periods)
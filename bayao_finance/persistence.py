@@ -1,9 +1,21 @@
 import datetime
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
-import yfinance as yf
 import os
+from functools import partial
 from bayao_finance import StockFrame
+from bayao_finance.stockpanel import StockPanel
+from bayao_finance.engine import IndicatorEngine
+from bayao_finance.screener import Screener
+from bayao_finance.covariance import rolling_cov, ewm_cov
 from bayao_finance.ticker_extension import TickerParser
+from bayao_finance.storage import get_storage
+from bayao_finance.incremental import IncrementalStore
+from bayao_finance.catalog import Catalog
+from bayao_finance.providers import get_provider
+from bayao_finance.download import DownloadScheduler, DownloadReport
+from bayao_finance.compact import compact_ohlcv, memory_report
 
 
 def _clean_date(d):
@@ -19,16 +31,50 @@ def _clean_date(d):
 
 
 def _validate_tickers(tickers, valid_tickers):
+    # valid_tickers is a set or a Catalog of ticker names, both looked up in O(1)
+    found = []
     for i in tickers:
-        found = False
-        counter = 0
-        while not found and counter < len(valid_tickers):
-            if i.ticker == valid_tickers[counter].ticker:
-                found = True
-            counter += 1
-        if not found:
+        if i.ticker in valid_tickers:
+            found.append(i)
+        else:
             print(f'Ticker {i.ticker} not found in persistence folder')
-            tickers.remove(i)
+    return found
+
+
+class LazyStockDict(Mapping):
+    """
+    Read only dict of tickers whose StockFrames are loaded on first access and then kept.
+
+    Parameters
+    ----------
+    loaders : dict
+        keys = tickers, values = callable returning the StockFrame
+    """
+
+    def __init__(self, loaders):
+        self._loaders = loaders
+        self._loaded = {}
+
+    def __getitem__(self, ticker):
+        if ticker not in self._loaded:
+            self._loaded[ticker] = self._loaders[ticker]()
+        return self._loaded[ticker]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def __contains__(self, ticker):
+        return ticker in self._loaders
+
+    @property
+    def loaded(self):
+        return list(self._loaded)
+
+    def __repr__(self):
+        return f'LazyStockDict({len(self._loaded)} of {len(self._loaders)} tickers loaded)'
 
 
 class StockManipulator:
@@ -38,28 +84,55 @@ class StockManipulator:
 
     Parameters
     ----------
-    source : string, default yahoo
-        Define the API provider
+    source : string or DataProvider, default yahoo
+        Define the API provider: yahoo, fake or an instance of DataProvider
         #todo: implement pdr_reader and alpha_vantage
+    storage : string or BaseStorage, default csv
+        Format used to save and read data: csv, parquet or feather.
+        Binary formats keep typed OHLCV columns and are much faster to read.
+    incremental : bool, default False
+        If True data is saved in an append only store at ./data/store instead of a
+        full copy per day. Downloads with save_data only fetch bars newer than the last
+        stored ones.
+    batch_size : int, default 50
+        Tickers per provider call
+    max_workers : int, default 4
+        Provider calls running at the same time
+    retries : int, default 3
+        Extra attempts for tickers that failed or were missing
+    compact : bool, default False
+        If True StockFrames are loaded with float32 prices and integer volume, which
+        takes about half the memory, and panels use float32 blocks. Saved files keep
+        the storage dtypes, use e.g. FeatherStorage(price_dtype='float32') to also store
+        float32. See bayao_finance.compact for the precision of indicators.
     """
 
-    def __init__(self, source="yahoo"):
+    def __init__(self, source="yahoo", storage="csv", incremental=False, batch_size=50, max_workers=4,
+                 retries=3, compact=False):
 
         # check whether source is available
-        if source not in ["yahoo"]:
-            raise AttributeError("This source is not yet available")
-        self.source = source
+        self.provider = get_provider(source)
+        self.source = self.provider.name
+        self.scheduler = DownloadScheduler(self.provider, batch_size=batch_size, max_workers=max_workers,
+                                           retries=retries)
+        self.download_report = None
+        self.storage = get_storage(storage)
+        self.compact = compact
+        self.store = IncrementalStore(os.path.join('.', 'data', 'store'), self.storage) if incremental else None
         self.data_list = []
         self.data_dict = {}
         self.tickers = []
 
     def download_data(self, tickers, save_data=False, period="max", interval='1d', start=None, end=None,
-                      **kwargs):
+                      as_panel=False, **kwargs):
         """
         Parameters
         ----------
         save_data : bool
             Default True. If false won't save the data in computer
+            Each ticker is saved as soon as it is downloaded.
+            With an incremental store, only bars newer than the stored ones are downloaded
+            and the returned StockFrames hold the full stored history.
         tickers : str, list
             List of tickers to download
         period : str
@@ -75,6 +148,8 @@ class StockManipulator:
         end: str
             Download end date string (YYYY-MM-DD) or _datetime.
             Default is now
+        as_panel: bool
+            Default False. If True returns a StockPanel with all tickers aligned
         kwargs:
             Other values from API provider
 
@@ -82,25 +157,70 @@ class StockManipulator:
         -------
         dict
             keys = tickers, values = StockFrame
+            or StockPanel if as_panel
+            Tickers that failed are left out, see download_report.
         """
 
         if isinstance(tickers, str):
             self.tickers = [tickers]
         else:
-            self.tickers = tickers
+            self.tickers = list(tickers)
 
-        if self.source == "yahoo":
-            self._download_from_yfinance(tickers, period=period, interval=interval, start=start, end=end, **kwargs)
+        self.download_report = DownloadReport()
+        if save_data and self.store is not None:
+            self._download_incremental(period=period, interval=interval, start=start, end=end, **kwargs)
         else:
-            raise AttributeError("This source is not yet available")
+            on_ticker, catalog = self._ticker_saver(end, interval) if save_data else (None, None)
+            try:
+                data = self._download(self.tickers, on_ticker, period=period, interval=interval, start=start,
+                                      end=end, **kwargs)
+            finally:
+                if catalog is not None:
+                    catalog.save()
+            self.data_list = [self._stock_frame(data[i], i) for i in self.tickers if i in data]
+            self.data_dict = dict(zip([i for i in self.tickers if i in data], self.data_list))
+
+        for i in self.download_report.failed:
+            print(f'Ticker {i} could not be downloaded: {self.download_report[i].error}')
+
+        if as_panel:
+            return self.get_panel()
+        return self.data_dict
 
-        if save_data:
-            self._save_data(end)
+    def _download_incremental(self, period, start, end, **kwargs):
+        # tickers sharing the same last stored bar are downloaded together
+        groups = {}
+        for i in self.tickers:
+            groups.setdefault(self.store.last_timestamp(i), []).append(i)
+
+        try:
+            for last, tickers in groups.items():
+                if last is None:
+                    self._download(tickers, self._store_append, period=period, start=start, end=end, **kwargs)
+                else:
+                    self._download(tickers, self._store_append, start=last.strftime("%Y-%m-%d"), end=end, **kwargs)
+        finally:
+            self.store.catalog.save()
 
-        self.data_dict = dict(zip(self.tickers, self.data_list))
-        return self.data_dict
+        self.data_list = []
+        self.data_dict = {}
+        for i in self.tickers:
+            if self.store.last_timestamp(i) is None:
+                continue
+            df = self._stock_frame(self.store.read(i), i)
+            self.data_list.append(df)
+            self.data_dict[i] = df
+
+    def _download(self, tickers, on_ticker=None, **kwargs):
+        data, report = self.scheduler.run(tickers, on_ticker=on_ticker, **kwargs)
+        self.download_report.update(report)
+        return data
 
-    def read_data(self, file_date=None, tickers=None):
+    def _store_append(self, ticker, data):
+        self.store.append(ticker, StockFrame(data, stock_token=ticker), save_catalog=False)
+
+    def read_data(self, file_date=None, tickers=None, columns=None, start=None, end=None, as_panel=False,
+                  lazy=False):
         """
 
         Parameters
@@ -108,63 +228,264 @@ class StockManipulator:
         file_date: str
             Files download date string (YYYY-MM-DD) or _datetime.
             Default is 'now'
+            With an incremental store it is the as-of date: no bar after it is returned.
+        tickers: str, list
+            Tickers to read. Default is all tickers in folder
+        columns: list, default None
+            Columns to read, e.g. ['close', 'volume']. Default is all columns
+        start: str
+            First date to read (YYYY-MM-DD) or _datetime. Default is the first stored
+        end: str
+            Last date to read (YYYY-MM-DD) or _datetime. Default is the last stored
+        as_panel: bool
+            Default False. If True returns a StockPanel with all tickers aligned
+        lazy: bool
+            Default False. If True returns a LazyStockDict and each ticker is only read
+            when accessed. Feather files are memory mapped, so with start and end only the
+            requested rows are loaded. data_list stays empty in lazy mode.
 
         Returns
         -------
         dict
             keys = tickers, values = StockFrame
+            or StockPanel if as_panel
         """
 
-        read_date = _clean_date(file_date)
-
-        date_string = read_date.strftime("%Y-%m-%d")
-        folder_path = os.path.join('.', 'data', date_string)
-
-        if not os.path.isdir(folder_path):
-            raise IsADirectoryError("No such directory: " + folder_path)
-
         if isinstance(tickers, str):
             tickers = [tickers]
 
-        self._read_data(folder_path, date_string, tickers)
+        if self.store is not None:
+            if file_date is not None:
+                as_of = _clean_date(file_date).strftime("%Y-%m-%d")
+                if end is None or pd.Timestamp(as_of) < pd.Timestamp(_clean_date(end)):
+                    end = as_of
+            loaders = self._store_loaders(tickers, columns, start, end)
+        else:
+            loaders = self._snapshot_loaders(file_date, tickers, columns, start, end)
 
+        if lazy:
+            self.data_list = []
+            self.data_dict = LazyStockDict(loaders)
+        else:
+            self.data_dict = {}
+            for i, loader in loaders.items():
+                df = loader()
+                if df is not None:
+                    self.data_dict[i] = df
+            self.data_list = list(self.data_dict.values())
+
+        if as_panel:
+            return self.get_panel()
         return self.data_dict
 
-    def _read_data(self, folder_path, date_prefix, tickers):
-        folder_tickers_with_extension = ['_'.join(i.split('_')[1:]) for i in os.listdir(folder_path)]
-        folder_tickers = [TickerParser(i.split('.csv')[0]) for i in folder_tickers_with_extension]
+    def get_panel(self):
+        """
+        Returns
+        -------
+        StockPanel
+            Loaded tickers aligned in one block per field
+        """
+        return StockPanel.from_frames(self.data_dict, dtype=np.float32 if self.compact else np.float64)
 
-        self.data_list = []
-        self.data_dict = {}
+    def memory_report(self):
+        """
+        Returns
+        -------
+        DataFrame
+            Memory of each loaded ticker against its float64 size, see
+            bayao_finance.compact.memory_report
+        """
+        data = self.data_dict
+        if isinstance(data, LazyStockDict):
+            data = {i: data[i] for i in data.loaded}
+        return memory_report(data)
 
-        if not tickers:
-            tickers = folder_tickers
-        else:
-            tickers = [TickerParser(i) for i in tickers]
-            _validate_tickers(tickers, folder_tickers)
+    def screener(self, spec, history=1):
+        """
+        Builds a Screener of the loaded tickers, see bayao_finance.screener.
 
-        for i in tickers:
-            file_path = os.path.join(folder_path, f'{date_prefix}_{i.save_format()}.csv')
-            df = StockFrame(pd.read_csv(file_path, index_col=0, parse_dates=True), stock_token=i.ticker)
-            self.data_dict[i.ticker] = df
-            self.data_list.append(df)
+        Parameters
+        ----------
+        spec: list
+            Indicators and parameters, see BaseStock.compute_indicators
+        history: int
+            Time slices kept. Default is 1, only the latest values
 
-    def _segregate_yahoo_data(self, data, tickers):
-        self.data_list = []
-        for i in tickers:
-            self.data_list.append(StockFrame(data[i], stock_token=i).dropna())
+        Returns
+        -------
+        Screener
+        """
+        return Screener.from_data(self.get_panel(), spec, history=history)
 
-    def _download_from_yfinance(self, tickers, **kwargs):
-        self.data_list = []
-        self.data_dict = {}
-        data = yf.download(tickers, group_by='ticker', **kwargs)
-        if isinstance(tickers, list):
-            self._segregate_yahoo_data(data, tickers)
-        else:
-            self.data_list = [data]
+    def covariance(self, n=None, span=None, corr=False, output="latest", **kwargs):
+        """
+        Covariance or correlation matrices of the returns of the loaded tickers, over a
+        rolling window of n rows or exponentially weighted with span.
+        See bayao_finance.covariance.
+
+        Parameters
+        ----------
+        n: int
+            Rolling window length
+        span: float
+            EWMA span, used instead of n
+        corr: bool
+            Correlation instead of covariance. Default is False
+        output: str
+            "latest", "triu" or "full". Default is "latest", the matrix of the last date
+        kwargs:
+            Passed to rolling_cov or ewm_cov, e.g. every or max_bytes
+
+        Returns
+        -------
+        DataFrame
+        """
+        if (n is None) == (span is None):
+            raise AttributeError('Pass either n or span')
+        if n is not None:
+            return rolling_cov(self.get_panel(), n, corr=corr, output=output, **kwargs)
+        return ewm_cov(self.get_panel(), span=span, corr=corr, output=output, **kwargs)
+
+    def compute_indicators(self, spec, executor="process", max_workers=None):
+        """
+        Computes indicators over the close of every loaded ticker in parallel.
+
+        Parameters
+        ----------
+        spec: list
+            Indicators and parameters, see BaseStock.compute_indicators
+        executor: str
+            "process" or "thread". Default is "process"
+        max_workers: int
+            Pool size. Default is the number of CPUs
+
+        Returns
+        -------
+        dict
+            keys = tickers, values = DataFrame of indicators
+        """
+        engine = IndicatorEngine(executor=executor, max_workers=max_workers)
+        return engine.compute_all(self.data_dict, spec)
+
+    def _snapshot_loaders(self, file_date, tickers, columns, start, end):
+        return self._file_loaders(self.catalog(file_date), tickers, columns, start, end)
 
-    def _save_data(self, last_date='now'):
+    def catalog(self, file_date=None):
+        """
+        Parameters
+        ----------
+        file_date: str
+            Snapshot download date string (YYYY-MM-DD) or _datetime. Default is 'now'.
+            Ignored with an incremental store.
 
+        Returns
+        -------
+        Catalog
+            Files of the snapshot folder or of the store, see bayao_finance.catalog
+        """
+        if self.store is not None:
+            return self.store.catalog
+
+        date_string = _clean_date(file_date).strftime("%Y-%m-%d")
+        folder_path = os.path.join('.', 'data', date_string)
+        if not os.path.isdir(folder_path):
+            raise IsADirectoryError("No such directory: " + folder_path)
+
+        catalog, scanned = self._snapshot_catalog(folder_path)
+        if scanned:
+            catalog.cache()
+        return catalog
+
+    def _snapshot_catalog(self, folder_path):
+        # returns (catalog, whether files were scanned into it)
+        catalog = Catalog(folder_path)
+        extension = self.storage.extension
+        # files saved before catalogs were written are not listed, they are read once
+        listed = {e.file for e in catalog.entries()}
+        files = [(TickerParser('_'.join(i.split('_')[1:])[:-len(extension)]).ticker, i)
+                 for i in sorted(os.listdir(folder_path)) if i.endswith(extension) and i not in listed]
+        catalog.scan(files, self.storage)
+        return catalog, bool(files)
+
+    def availability(self, file_date=None, tickers=None, start=None, end=None):
+        """
+        Stored data of each ticker, answered from the catalog without reading data files.
+
+        Parameters
+        ----------
+        file_date: str
+            Snapshot download date, see catalog
+        tickers: str, list
+            Default is all stored tickers
+        start: str
+            With start or end, the covers column tells whether the stored dates include
+            them (YYYY-MM-DD) or _datetime
+        end: str
+
+        Returns
+        -------
+        DataFrame
+            Indexed by ticker: files, rows, first, last, interval, columns (and covers)
+        """
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        if tickers is not None:
+            tickers = [TickerParser(i).ticker for i in tickers]
+        return self.catalog(file_date).availability(tickers, start, end, extension=self.storage.extension)
+
+    def _store_loaders(self, tickers, columns=None, start=None, end=None):
+        catalog = self.store.catalog
+        extension = self.store.storage.extension
+        if not tickers:
+            tickers = self.store.tickers()
+
+        loaders = {}
+        for i in tickers:
+            if not catalog.entries(i, extension):
+                print(f'Ticker {i} not found in store')
+                continue
+            if not catalog.plan(i, start, end, extension=extension):
+                print(f'Ticker {i} has no data in store between {start} and {end}')
+                continue
+            loaders[i] = partial(self._load_store, i, columns, start, end)
+        return loaders
+
+    def _load_store(self, ticker, columns, start, end):
+        data = self.store.read(ticker, start=start, end=end, columns=columns)
+        if data is None:
+            print(f'Ticker {ticker} has no data in store between {start} and {end}')
+            return None
+        return self._stock_frame(data, ticker)
+
+    def _file_loaders(self, catalog, tickers, columns=None, start=None, end=None):
+        # a folder may hold files of several storages, only those of self.storage are read
+        extension = self.storage.extension
+        if not tickers:
+            tickers = [TickerParser(i) for i in catalog.tickers(extension)]
+        else:
+            tickers = _validate_tickers([TickerParser(i) for i in tickers], set(catalog.tickers(extension)))
+
+        loaders = {}
+        for i in tickers:
+            # files without rows between start and end are not opened
+            entries = catalog.plan(i.ticker, start, end, extension=extension)
+            if not entries:
+                print(f'Ticker {i.ticker} has no data between {start} and {end}')
+                continue
+            file_path = os.path.join(catalog.folder, entries[-1].file)
+            loaders[i.ticker] = partial(self._load_file, file_path, i.ticker, columns, start, end)
+        return loaders
+
+    def _load_file(self, file_path, ticker, columns, start, end):
+        return self._stock_frame(self.storage.read_range(file_path, start, end, columns=columns), ticker)
+
+    def _stock_frame(self, data, ticker):
+        frame = StockFrame(data, stock_token=ticker)
+        if self.compact:
+            frame = compact_ohlcv(frame)
+        return frame
+
+    def _ticker_saver(self, last_date='now', interval=None):
         save_date = _clean_date(last_date)
 
         # save data so you can download it later
@@ -172,7 +493,14 @@ class StockManipulator:
 
         save_path = os.path.join('.', 'data', today)
         os.makedirs(save_path, exist_ok=True)
+        # files already in the folder stay listed, the catalog is saved by the caller once
+        # the download is over
+        catalog, _ = self._snapshot_catalog(save_path)
+
+        def save(ticker, data):
+            t = TickerParser(ticker)
+            file_name = f'{today}_{t.save_format()}{self.storage.extension}'
+            self.storage.write(StockFrame(data, stock_token=ticker), os.path.join(save_path, file_name))
+            catalog.add(t.ticker, file_name, data, interval)
 
-        for i in range(0, len(self.tickers)):
-            t = TickerParser(self.tickers[i])
-            self.data_list[i].to_csv(os.path.join(save_path, f'{today}_{t.save_format()}.csv'))
+        return save, catalog
@@ -0,0 +1,153 @@
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from bayao_finance.storage import slice_dates
+
+
+class DataProvider:
+    """
+    Defines where StockManipulator downloads ticker histories from.
+
+    download receives one batch of tickers and returns the ones it got. Tickers without
+    data are left out of the result, errors affecting the whole batch (network,
+    throttling) are raised so the scheduler can retry them.
+    """
+
+    name = None
+
+    def download(self, tickers, **kwargs):
+        """
+        Parameters
+        ----------
+        tickers: list
+            Tickers of one batch
+        kwargs:
+            period, interval, start, end and other values from API provider
+
+        Returns
+        -------
+        dict
+            keys = tickers, values = DataFrame indexed by date
+        """
+        raise NotImplementedError
+
+
+class YahooProvider(DataProvider):
+    """
+    Downloads from Yahoo Finance using yfinance.
+    """
+
+    name = 'yahoo'
+
+    def download(self, tickers, **kwargs):
+        import yfinance as yf
+
+        # the scheduler already runs batches concurrently
+        kwargs.setdefault('threads', False)
+        kwargs.setdefault('progress', False)
+        data = yf.download(list(tickers), group_by='ticker', **kwargs)
+        if data is None or data.empty:
+            return {}
+
+        result = {}
+        for i in tickers:
+            if isinstance(data.columns, pd.MultiIndex):
+                if i not in data.columns.get_level_values(0):
+                    continue
+                df = data[i]
+            else:
+                df = data
+            df = df.dropna()
+            if not df.empty:
+                result[i] = df
+        return result
+
+
+class FakeProvider(DataProvider):
+    """
+    Local provider generating random walk OHLCV histories, for tests and benchmarks.
+    The history of a ticker is always the same, so incremental downloads line up.
+
+    Parameters
+    ----------
+    n_rows : int, default 2520
+        Business days per ticker, ending at end_date
+    end_date : str, default "2020-12-31"
+        Last date of every history
+    missing : list, default None
+        Tickers that never return data
+    invalid : list, default None
+        Tickers that make every download call including them raise, like unknown
+        symbols with some providers
+    transient_failures : int, default 0
+        Number of download calls that raise before the provider starts answering
+    latency : float, default 0
+        Seconds each download call takes
+    """
+
+    name = 'fake'
+
+    def __init__(self, n_rows=2520, end_date='2020-12-31', missing=None, transient_failures=0, latency=0,
+                 invalid=None):
+        self.n_rows = n_rows
+        self.end_date = end_date
+        self.missing = set(missing or [])
+        self.invalid = set(invalid or [])
+        self.transient_failures = transient_failures
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def history(self, ticker):
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+        index = pd.bdate_range(end=self.end_date, periods=self.n_rows, name='Date')
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, self.n_rows)))
+        open_ = close * np.exp(rng.normal(0, 0.005, self.n_rows))
+        spread = np.abs(rng.normal(0, 0.01, self.n_rows))
+        return pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + spread),
+            'Low': np.minimum(open_, close) * (1 - spread),
+            'Close': close,
+            'Adj Close': close,
+            'Volume': rng.integers(1e5, 1e7, self.n_rows).astype(np.float64),
+        }, index=index)
+
+    def download(self, tickers, start=None, end=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self.calls <= self.transient_failures
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError('Simulated provider failure')
+        invalid = self.invalid.intersection(tickers)
+        if invalid:
+            raise ValueError(f'Invalid symbols: {sorted(invalid)}')
+        return {i: slice_dates(self.history(i), start, end) for i in tickers if i not in self.missing}
+
+
+PROVIDERS = {
+    'yahoo': YahooProvider,
+    'fake': FakeProvider,
+}
+
+
+def get_provider(source):
+    """
+    Parameters
+    ----------
+    source: str or DataProvider
+        Provider name (yahoo, fake) or an instance of DataProvider.
+
+    Returns
+    -------
+    DataProvider
+    """
+    if isinstance(source, DataProvider):
+        return source
+    if source not in PROVIDERS:
+        raise AttributeError(f'Source {source} is not yet available. Use one of {list(PROVIDERS)}')
+    return PROVIDERS[source]()
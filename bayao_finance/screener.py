@@ -0,0 +1,284 @@
+"""
+Cross-sectional screening of a universe on its latest indicator values.
+
+A Screener keeps the last few time slices of every indicator for every ticker in one
+(time x ticker x output) array and the online state needed to extend it, so a new bar
+updates all tickers in a few vectorized operations and queries never touch the full
+histories.
+
+    screener = Screener.from_data(manipulator.data_dict, ['rsi', 'bb'])
+    screener.query('rsi_14 < 30 and close < bb_20_2_inf')
+    screener.update('2021-01-04', new_closes)
+"""
+from collections import deque
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from bayao_finance.fused import _parse_spec
+from bayao_finance.stockpanel import close_frame
+from bayao_finance.streaming import (OnlineSMA, OnlineEMA, OnlineMACD, OnlineBollingerBands, OnlineRSI,
+                                     OnlineIndicator)
+
+
+class _OnlineReturns(OnlineIndicator):
+    # close over previous close, same as get_returns
+    def __init__(self, n_columns=1, columns=None):
+        super().__init__(n_columns, columns)
+        self.history_rows = 2
+        self._previous = np.full(n_columns, np.nan)
+
+    def _update(self, row):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = row / self._previous - 1
+        self._previous = row
+        self.value = self._output(returns)
+        return self.value
+
+
+def _online_indicator(indicator, params, n_columns, columns):
+    if indicator == 'sma':
+        return OnlineSMA(params['n'], params['min_periods'], n_columns=n_columns, columns=columns)
+    if indicator == 'ema':
+        return OnlineEMA(params['n'], params['min_periods'], n_columns=n_columns, columns=columns)
+    if indicator == 'macd':
+        return OnlineMACD(params['n_short'], params['n_long'], params['n_signal'], n_columns=n_columns,
+                          columns=columns)
+    if indicator == 'bb':
+        return OnlineBollingerBands(params['n'], params['k'], n_columns=n_columns, columns=columns)
+    if indicator == 'rsi':
+        return OnlineRSI(params['n'], params['min_periods'], n_columns=n_columns, columns=columns)
+    return _OnlineReturns(n_columns=n_columns, columns=columns)
+
+
+def _output_names(name, indicator):
+    # same names as compute_indicators
+    if indicator == 'macd':
+        return [name, f'{name}_signal']
+    if indicator == 'bb':
+        return [f'{name}_inf', name, f'{name}_sup']
+    return [name]
+
+
+def _output_values(value):
+    if not isinstance(value, tuple):
+        value = (value,)
+    return [np.asarray(i, dtype=np.float64).reshape(-1) for i in value]
+
+
+class Screener:
+    """
+    Latest values of several indicators over a universe of tickers.
+
+    Parameters
+    ----------
+    spec : list
+        Indicators as in compute_indicators, e.g. ["rsi", ("bb", {"n": 20, "k": 2})].
+        The close is always available as "close".
+    tickers : list
+        Tickers in column order
+    history : int, default 1
+        Time slices kept, e.g. 5 to also screen on the last week
+
+    Use from_data to build a screener seeded with the histories.
+    """
+
+    def __init__(self, spec, tickers, history=1):
+        if history < 1:
+            raise AttributeError('history must be at least 1')
+        self.spec = _parse_spec(spec)
+        self.tickers = list(tickers)
+        self.history = history
+        n_tickers = len(self.tickers)
+        self._indicators = [_online_indicator(indicator, params, n_tickers, self.tickers)
+                            for _, indicator, params in self.spec]
+        self.outputs = ['close'] + [o for name, indicator, _ in self.spec for o in _output_names(name, indicator)]
+        self._slices = deque(maxlen=history)
+        self._times = deque(maxlen=history)
+
+    @classmethod
+    def from_data(cls, data, spec, history=1):
+        """
+        Parameters
+        ----------
+        data : StockPanel, dict of StockFrames or DataFrame
+            Histories of the universe. StockFrames and panels use their close,
+            DataFrames have one close column per ticker.
+        spec : list
+            See Screener
+        history : int, default 1
+
+        Returns
+        -------
+        Screener
+        """
+        closes = close_frame(data)
+        screener = cls(spec, closes.columns, history=history)
+        screener._seed(closes)
+        return screener
+
+    def _seed(self, closes):
+        values = closes.to_numpy(dtype=np.float64)
+        n_rows = len(values)
+        first_kept = max(n_rows - self.history, 0)
+        kept = np.empty((n_rows - first_kept, len(self.tickers), len(self.outputs)))
+        kept[:, :, 0] = values[first_kept:]
+
+        position = 1
+        for indicator, (name, kind, _) in zip(self._indicators, self.spec):
+            # window indicators only need their last window before the kept slices
+            start = 0
+            if indicator.history_rows is not None:
+                start = max(first_kept - indicator.history_rows, 0)
+            for row in range(start, n_rows):
+                value = indicator._update(values[row])
+                if row >= first_kept:
+                    outputs = _output_values(value)
+                    kept[row - first_kept, :, position:position + len(outputs)] = np.column_stack(outputs)
+            position += len(_output_names(name, kind))
+
+        for time, outputs in zip(closes.index[first_kept:], kept):
+            self._times.append(time)
+            self._slices.append(outputs)
+
+    def update(self, time, closes):
+        """
+        Adds a new bar of every ticker.
+
+        Parameters
+        ----------
+        time : timestamp
+            Date of the bar
+        closes : Series, dict or array
+            Close of each ticker, keyed by ticker or in ticker order. Missing tickers
+            are NaN.
+
+        Returns
+        -------
+        DataFrame
+            The new latest values
+        """
+        if isinstance(closes, Mapping):
+            closes = Series(closes)
+        if isinstance(closes, Series):
+            closes = closes.reindex(self.tickers)
+        row = np.asarray(closes, dtype=np.float64).reshape(-1)
+        if row.size != len(self.tickers):
+            raise AttributeError(f'Expected {len(self.tickers)} closes, got {row.size}')
+
+        values = np.column_stack([row] + [o for i in self._indicators for o in _output_values(i._update(row))])
+        self._times.append(pd.Timestamp(time))
+        self._slices.append(values)
+        return self.latest
+
+    def update_many(self, closes):
+        """
+        Adds several bars, e.g. the closes downloaded since the last update.
+
+        Parameters
+        ----------
+        closes : DataFrame
+            Indexed by date with one column per ticker
+        """
+        closes = closes.reindex(columns=self.tickers)
+        for time, row in zip(closes.index, closes.to_numpy(dtype=np.float64)):
+            self.update(time, row)
+        return self.latest
+
+    @property
+    def times(self):
+        return list(self._times)
+
+    @property
+    def table(self):
+        """
+        Returns
+        -------
+        ndarray (time, ticker, output)
+            Kept slices, oldest first. Outputs are in the order of self.outputs.
+        """
+        return np.stack(self._slices)
+
+    def at(self, t=-1):
+        """
+        Parameters
+        ----------
+        t : int or timestamp, default -1
+            Position in the kept slices or date of the slice
+
+        Returns
+        -------
+        DataFrame
+            Indexed by ticker with one column per output
+        """
+        if not self._slices:
+            raise AttributeError('Screener has no data')
+        if not isinstance(t, (int, np.integer)):
+            times = list(self._times)
+            t = times.index(pd.Timestamp(t))
+        return DataFrame(self._slices[t], index=pd.Index(self.tickers, name='ticker'), columns=self.outputs)
+
+    @property
+    def latest(self):
+        return self.at(-1)
+
+    def query(self, expr, t=-1):
+        """
+        Filters tickers with a DataFrame.query expression over the outputs, e.g.
+        "rsi_14 < 30 and close < bb_20_2_inf".
+
+        Returns
+        -------
+        DataFrame
+            Matching tickers and their values
+        """
+        return self.at(t).query(expr)
+
+    def top(self, column, n=10, ascending=False, t=-1):
+        """
+        Returns
+        -------
+        DataFrame
+            n tickers with the largest column values, or the smallest if ascending
+        """
+        values = self.at(t)
+        if ascending:
+            return values.nsmallest(n, column)
+        return values.nlargest(n, column)
+
+    def percentile(self, column, q, above=False, t=-1):
+        """
+        Parameters
+        ----------
+        column : str
+        q : float
+            Percentile between 0 and 100 of column over the universe
+        above : bool, default False
+            Keep tickers at or above the percentile instead of at or below
+
+        Returns
+        -------
+        DataFrame
+            Matching tickers and their values
+        """
+        values = self.at(t)
+        column_values = values[column].to_numpy()
+        if np.isnan(column_values).all():
+            return values.iloc[:0]
+        threshold = np.nanpercentile(column_values, q)
+        with np.errstate(invalid='ignore'):
+            mask = column_values >= threshold if above else column_values <= threshold
+        return values[mask]
+
+    def rank(self, column, ascending=True, pct=False, t=-1):
+        """
+        Returns
+        -------
+        Series
+            Rank of every ticker by column, NaN values are not ranked
+        """
+        return self.at(t)[column].rank(ascending=ascending, pct=pct)
+
+    def __repr__(self):
+        return (f'Screener({len(self.tickers)} tickers, {len(self.outputs)} outputs, '
+                f'{len(self._slices)} of {self.history} slices)')
@@ -1,9 +1,12 @@
 from bayao_finance.stockseries import StockSeries
-from pandas import DataFrame, Series
+from pandas import DataFrame, Series, DatetimeIndex, concat
 import numpy as np
 import re
-from bayao_finance.decorators import singleton
-from bayao_finance.base_stock import BaseStock
+import threading
+from bayao_finance.base_stock import BaseStock, TracksMutations, order_by_index
+from bayao_finance.compact import compact_ohlcv
+from bayao_finance.cache import cached_indicator
+from bayao_finance.indicators import get_true_range_from_data, get_atr_from_data
 
 
 def no_leading_or_trailing_pattern(word, leading='(?<![a-zA-Z])', trailing='(?![a-zA-Z]|_)'):
@@ -19,70 +22,121 @@ ADJ_CLOSE_PATTERN = no_leading_or_trailing_pattern(r'((?<=(adjusted)(\s|_|-))|(?
                                                    leading='')
 VOLUME_PATTERN = no_leading_or_trailing_pattern('volume')
 
+# canonical column names and their kind letter, in kind order
+CANONICAL_COLUMNS = {'open': 'o', 'high': 'h', 'low': 'l', 'close': 'c', 'adj_close': 'a', 'volume': 'v'}
+
+# how each canonical column is aggregated into a larger bar, other columns keep the last value
+OHLCV_AGGREGATION = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'adj_close': 'last',
+                     'volume': 'sum'}
+
+# (cols_map, kind) by columns tuple, mapping the same columns again costs a dict lookup
+_COLUMNS_CACHE = {}
+_COLUMNS_CACHE_SIZE = 1024
+
 
-@singleton
 class ColPatternMapper:
-    def __init__(self):
-        flags = re.IGNORECASE
-        self.compile_list = {'open': re.compile(OPEN_PATTERN, flags=flags),
-                             'high': re.compile(HIGH_PATTERN, flags=flags),
-                             'low': re.compile(LOW_PATTERN, flags=flags),
-                             'close': re.compile(CLOSE_PATTERN, flags=flags),
-                             'adj_close': re.compile(ADJ_CLOSE_PATTERN, flags=flags),
-                             'volume': re.compile(VOLUME_PATTERN, flags=flags),
-                             }
-        self.mapper = {}
-        self.founds_array = np.zeros(len(self.compile_list))
+    """
+    Maps column names to canonical OHLCV names.
+
+    It keeps no state between calls, so one instance can be shared by threads building
+    StockFrames at the same time.
+    """
+
+    flags = re.IGNORECASE
+    compile_list = {'open': re.compile(OPEN_PATTERN, flags=flags),
+                    'high': re.compile(HIGH_PATTERN, flags=flags),
+                    'low': re.compile(LOW_PATTERN, flags=flags),
+                    'close': re.compile(CLOSE_PATTERN, flags=flags),
+                    'adj_close': re.compile(ADJ_CLOSE_PATTERN, flags=flags),
+                    'volume': re.compile(VOLUME_PATTERN, flags=flags),
+                    }
+
+    # kind of the last map_columns call of each thread, read by get_kind
+    _last_kind = threading.local()
+
+    def map_and_kind(self, columns):
+        """
+        Maps columns and finds their kind in one call, without touching any shared state.
+
+        Returns
+        -------
+        tuple
+            (dict of column -> canonical name, kind string such as "ohlcav")
+        """
+        founds = dict.fromkeys(self.compile_list, 0)
+        mapper = {}
+        for col in columns:
+            if not isinstance(col, str):
+                continue
+            for key, pattern in self.compile_list.items():
+                if pattern.search(col):
+                    founds[key] += 1
+                    # repeated matches keep their historical names, e.g. close_2.0
+                    mapper[col] = key if founds[key] == 1 else f'{key}_{float(founds[key])}'
+        kind = ''.join(CANONICAL_COLUMNS[key] for key, matches in founds.items() if matches)
+        return mapper, kind
 
     def map_columns(self, columns):
-        self.founds_array = np.zeros(len(self.compile_list))
-        self.mapper = {}
-        for i in columns:
-            self._map_col(i)
-        return self.mapper
-
-    def _map_col(self, col):
-        counter = 0
-        for key, value in self.compile_list.items():
-            if value.search(col):
-                self.founds_array[counter] += 1
-                self._mark_map(col, key, self.founds_array[counter])
-            counter += 1
-
-    def _mark_map(self, col, key, matches):
-        if matches == 1:
-            self.mapper[col] = key
-        else:
-            self.mapper[col] = f'{key}_{matches}'
+        """
+        Returns
+        -------
+        dict
+            column -> canonical name. The kind is then given by get_kind, prefer
+            map_and_kind to get both at once.
+        """
+        mapper, self._last_kind.kind = self.map_and_kind(columns)
+        return mapper
 
     def get_kind(self):
-        kind_mapper = ['o', 'h', 'l', 'c', 'a', 'v']
-        kind = ''
-        for i in range(0, len(self.founds_array)):
-            if self.founds_array[i] > 0:
-                kind += kind_mapper[i]
-        return kind
+        """
+        Kind of the columns of the last map_columns call made by this thread.
+        """
+        return getattr(self._last_kind, 'kind', '')
 
 
-def _ensure_columns(columns):
-    cols_map = _get_cols_map(columns)
-    cols_kind = _get_cols_kind()
-    return cols_map, cols_kind
+COLUMN_MAPPER = ColPatternMapper()
 
 
-def _get_cols_map(columns):
-    mapper = ColPatternMapper()
-    col_map = mapper.map_columns(columns)
-    return col_map
+def _has_label_columns(columns):
+    # numeric or date columns (e.g. a transposed frame) can not hold OHLCV names
+    return getattr(columns, 'dtype', np.dtype(object)).kind not in 'biufcmM'
 
 
-def _get_cols_kind():
-    mapper = ColPatternMapper()
-    kind = mapper.get_kind()
-    return kind
+def _canonical_kind(columns):
+    if not _has_label_columns(columns):
+        return ''
+    return ''.join(kind for col, kind in CANONICAL_COLUMNS.items() if col in columns)
 
 
-class StockFrame(DataFrame, BaseStock):
+def _ensure_columns(columns):
+    key = tuple(columns)
+    try:
+        return _COLUMNS_CACHE[key]
+    except KeyError:
+        pass
+    except TypeError:
+        key = None
+
+    if key is not None and len(set(key)) == len(key) and all(isinstance(i, str) and i in CANONICAL_COLUMNS
+                                                             for i in key):
+        # already canonical, no need for the regexes
+        result = {}, _canonical_kind(columns)
+    else:
+        cols_map, kind = COLUMN_MAPPER.map_and_kind(columns)
+        result = {k: v for k, v in cols_map.items() if k != v}, kind
+
+    if key is not None:
+        if len(_COLUMNS_CACHE) >= _COLUMNS_CACHE_SIZE:
+            _COLUMNS_CACHE.clear()
+        _COLUMNS_CACHE[key] = result
+    return result
+
+
+def _get_cols_map(columns):
+    return COLUMN_MAPPER.map_and_kind(columns)[0]
+
+
+class StockFrame(TracksMutations, DataFrame, BaseStock):
     """
     Class to generate indexes with ohlcav and store data
 
@@ -99,36 +153,41 @@ class StockFrame(DataFrame, BaseStock):
     kind : string, default "ohlcav"
         Will define the columns names
         # todo : make it using string reading
+    drop_duplicates : bool, default False
+        If True keeps only the last row of each repeated timestamp
+    validate : bool, default False
+        If True raises when a column is not numeric
     """
 
-    _metadata = ["_stock_indexes", "close_col_name", "_hist_kind", "stock_token"]
+    _metadata = ["_stock_indexes", "close_col_name", "stock_token"]
+    close_col_name = None
+    # kind of the columns object it was derived from, see _hist_kind
+    _kind = ''
+    _kind_columns = None
 
-    def __init__(self, data, *args, stock_token=None, kind=None, **kwargs):
+    def __init__(self, data, *args, stock_token=None, kind=None, drop_duplicates=False, validate=False,
+                 **kwargs):
 
-        if isinstance(data, DataFrame):
-            if data.index[0] > data.index[1]:
-                data = data[::-1]
-        elif isinstance(data, np.ndarray):
-            try:
-                if kwargs.get('index')[0] > kwargs.get('index')[1]:
-                    data = data[::-1]
-                    kwargs['index'] = kwargs['index'][::-1]
-            except IndexError:
-                pass
+        # Data must be ordered by date, see order_by_index
+        if args or kwargs or not isinstance(data, DataFrame):
+            data = DataFrame(data, *args, **kwargs)
+            args, kwargs = (), {}
+        data = order_by_index(data, drop_duplicates=drop_duplicates, validate=validate)
 
         BaseStock.__init__(self, stock_token=stock_token)
         DataFrame.__init__(self, data, *args, **kwargs)
 
-        if kind is None:
+        if not _has_label_columns(self.columns):
+            cols_map, kind = {}, kind or ''
+        elif kind is None:
             cols_map, kind = _ensure_columns(list(self.columns))
         else:
-            cols_map = _get_cols_map(list(self.columns))
+            cols_map = _ensure_columns(list(self.columns))[0]
 
-        self._hist_kind = kind
-        self.rename(columns=cols_map, inplace=True)
-
-        if 'ohlc' in self._hist_kind or 'ohla' in self._hist_kind:
-            self._has_atr = True
+        if cols_map:
+            self.rename(columns=cols_map, inplace=True)
+        object.__setattr__(self, '_kind', kind)
+        object.__setattr__(self, '_kind_columns', self.columns)
 
         if 'a' in self._hist_kind:
             self.close_col_name = 'adj_close'
@@ -145,21 +204,60 @@ class StockFrame(DataFrame, BaseStock):
     def _constructor_sliced(self):
         return StockSeries
 
-    def __getitem__(self, key):
-        """
-        If the result is a column containing only 'geometry', return a
-        GeoSeries. If it's a DataFrame with a 'geometry' column, return a
-        GeoDataFrame.
-        """
-        result = super().__getitem__(key)
+    def _constructor_from_mgr(self, mgr, axes):
+        # results of operations on a StockFrame already have mapped columns, so __init__
+        # is skipped and the metadata is carried over
+        frame = StockFrame._from_mgr(mgr, axes=axes)
+        frame._inherit_metadata(self)
+        return frame
+
+    def _constructor_sliced_from_mgr(self, mgr, axes):
+        series = StockSeries._from_mgr(mgr, axes=axes)
+        series._name = None
+        object.__setattr__(series, 'stock_token', self.stock_token)
+        return series
+
+    def __finalize__(self, other, method=None, **kwargs):
+        super().__finalize__(other, method=method, **kwargs)
+        self._check_metadata()
+        return self
+
+    def _inherit_metadata(self, parent):
+        object.__setattr__(self, 'stock_token', getattr(parent, 'stock_token', None) or 'Unknown')
+        object.__setattr__(self, 'close_col_name', getattr(parent, 'close_col_name', None))
+        if self.columns is getattr(parent, '_kind_columns', None):
+            object.__setattr__(self, '_kind', parent._kind)
+            object.__setattr__(self, '_kind_columns', parent._kind_columns)
+        self._check_metadata()
+
+    def _check_metadata(self):
+        # a close column copied from a parent may not be in the columns left
         close_col = self.close_col_name
-        if isinstance(result, DataFrame) and close_col in result:
-            result.__class__ = StockFrame
-            result.close_col_name = close_col
-        elif isinstance(result, DataFrame) and close_col not in result:
-            result.__class__ = StockFrame
-            result.close_col_name = None
-        return result
+        if close_col is not None and _has_label_columns(self.columns) and close_col in self.columns:
+            return
+        kind = self._hist_kind
+        if 'a' in kind:
+            close_col = 'adj_close'
+        elif 'c' in kind:
+            close_col = 'close'
+        else:
+            close_col = None
+        object.__setattr__(self, 'close_col_name', close_col)
+
+    @property
+    def _hist_kind(self):
+        # derived again only when the columns change
+        columns = self.columns
+        if columns is not self._kind_columns:
+            object.__setattr__(self, '_kind', _canonical_kind(columns))
+            object.__setattr__(self, '_kind_columns', columns)
+        return self._kind
+
+    @property
+    def _has_atr(self):
+        # true range needs high, low and a close, open is not used
+        kind = self._hist_kind
+        return 'h' in kind and 'l' in kind and ('c' in kind or 'a' in kind)
 
     def __setattr__(self, attr, val):
         # have to special case geometry b/c pandas tries to use as column...
@@ -180,6 +278,11 @@ class StockFrame(DataFrame, BaseStock):
         fget=_get_target_close, fset=_set_target_close, doc="CloseIndex for HistoricalData"
     )
 
+    def _indicator_data(self):
+        if self.close_col_name is None:
+            return self
+        return self[self.close_col_name]
+
     def set_close(self, col, inplace=False):
         if inplace:
             frame = self
@@ -196,17 +299,166 @@ class StockFrame(DataFrame, BaseStock):
         if not inplace:
             return frame
 
-    def get_atr(self, n=14):
+    def compact(self):
+        """
+        Returns
+        -------
+        StockFrame
+            Prices as float32 and volume in the narrowest integer type, see
+            bayao_finance.compact for the precision of indicators computed on it
+        """
+        return compact_ohlcv(self)
+
+    @classmethod
+    def from_trades(cls, source, kind='time', size='1min', stock_token=None, **kwargs):
+        """
+        Aggregates trades into bars reading them in chunks, see bayao_finance.bars.
+
+        Parameters
+        ----------
+        source: str, DataFrame or iterable of DataFrame
+            Trades file (csv, parquet or feather), trades or chunks of trades
+        kind: str
+            "time", "tick", "volume" or "dollar". Default is "time"
+        size: str or number
+            Offset of time bars (default "1min"), trades, volume or value of the others
+        stock_token: str
+        kwargs:
+            Column names and other values of bayao_finance.bars.trades_to_bars
+
+        Returns
+        -------
+        StockFrame
+            open, high, low, close, volume, vwap and trades columns
+        """
+        from bayao_finance.bars import trades_to_bars
+        return trades_to_bars(source, kind=kind, size=size, stock_token=stock_token, **kwargs)
+
+    def resample_ohlcv(self, rule, **kwargs):
+        """
+        Aggregates bars into a larger timeframe: first open, max high, min low, last close
+        and adj_close, summed volume. Buckets without bars are dropped.
+
+        Parameters
+        ----------
+        rule: str
+            pandas offset alias, e.g. "W", "ME" or "4h"
+        kwargs:
+            Other values of DataFrame.resample, e.g. label or origin
+
+        Returns
+        -------
+        StockFrame
+            Same stock_token and close column as self
+        """
+        aggregation = {col: OHLCV_AGGREGATION.get(col, 'last') for col in self.columns}
+        bars = DataFrame(self).resample(rule, **kwargs).agg(aggregation)
+
+        prices = [col for col in bars.columns if OHLCV_AGGREGATION.get(col) != 'sum']
+        if prices:
+            bars = bars.dropna(how='all', subset=prices)
 
+        frame = StockFrame(bars, stock_token=self.stock_token)
+        if self.close_col_name in frame.columns:
+            frame.close_col_name = self.close_col_name
+        return frame
+
+    def _bucket_last_timestamps(self, rule, **kwargs):
+        # bucket label -> timestamp of the last bar of self in that bucket
+        return Series(self.index, index=self.index).resample(rule, **kwargs).last().dropna()
+
+    def align_to_index(self, data, rule, **kwargs):
+        """
+        Aligns values computed on resample_ohlcv(rule) bars back onto the index of self.
+
+        A bucket value is only known once its last bar closes, so it is placed at the
+        timestamp of that bar and carried forward. Earlier bars of the bucket see the
+        previous bucket, so there is no lookahead.
+
+        Parameters
+        ----------
+        data: Series or DataFrame
+            Indexed by the bucket labels of resample_ohlcv(rule, **kwargs)
+        rule: str
+            Same rule used to resample
+
+        Returns
+        -------
+        Series or DataFrame indexed like self
+        """
+        last = self._bucket_last_timestamps(rule, **kwargs).reindex(data.index)
+        data = data[last.notna().to_numpy()]
+        data.index = DatetimeIndex(last.dropna().to_numpy(), name=self.index.name)
+        return data.reindex(self.index, method='ffill')
+
+    def compute_multi_timeframe(self, spec, rules, **kwargs):
+        """
+        Computes the same indicators on several timeframes derived from self and aligns
+        them on the index of self, see align_to_index.
+
+        Parameters
+        ----------
+        spec: list
+            Indicators and parameters, see compute_indicators
+        rules: list
+            pandas offset aliases, e.g. ["W", "ME"]. None uses the bars of self.
+        kwargs:
+            Other values of DataFrame.resample
+
+        Returns
+        -------
+        DataFrame
+            Columns MultiIndex of (rule, indicator output), rule None named "base"
+        """
+        results = {}
+        for rule in rules:
+            if rule is None:
+                results['base'] = self.compute_indicators(spec)
+            else:
+                values = self.resample_ohlcv(rule, **kwargs).compute_indicators(spec)
+                results[rule] = self.align_to_index(values, rule, **kwargs)
+        return concat(results, axis=1)
+
+    def _true_range_columns(self):
+        # high and low are not adjusted, so the raw close is preferred when available
         if not self._has_atr:
             return None
+        close = 'close' if 'close' in self.columns else 'adj_close'
+        return self['high'], self['low'], self[close]
 
-        tr_hl = self.high - self.low
-        tr = tr_hl.to_frame(name='HL')
-
-        tr['CL'] = self[self.close_col_name].shift() - self.low
-        tr['HC'] = self.high - self.close.shift()
-        tr['max'] = tr.max(axis=1)
-        atr_calculation = self.get_sma(data=tr['max'], n=n)
+    @cached_indicator
+    def get_true_range(self):
+        """
+        Returns
+        -------
+        StockSeries
+            max(high - low, |high - previous close|, |low - previous close|), or None
+            without high, low and close columns
+        """
+        columns = self._true_range_columns()
+        if columns is None:
+            return None
+        return get_true_range_from_data(*columns).rename('true_range')
 
-        return atr_calculation
+    @cached_indicator
+    def get_atr(self, n=14, wilder=False, min_periods=None):
+        """
+        Average True Range
+
+        Parameters
+        ----------
+        n: int
+            Window of the average
+        wilder: bool, default False
+            If True uses Wilder smoothing (alpha = 1 / n) instead of a simple moving average
+        min_periods: int, default None
+            Minimum number of observations. Default is n.
+
+        Returns
+        -------
+        StockSeries or None without high, low and close columns
+        """
+        columns = self._true_range_columns()
+        if columns is None:
+            return None
+        return get_atr_from_data(*columns, n=n, wilder=wilder, min_periods=min_periods).rename('atr')
@@ -0,0 +1,225 @@
+from collections.abc import Mapping
+import numpy as np
+from pandas import DataFrame, Index, Series
+from bayao_finance.base_stock import BaseStock
+from bayao_finance.cache import cached_indicator
+from bayao_finance.indicators import get_true_range_from_data, get_atr_from_data
+from bayao_finance.stockframe import StockFrame, _get_cols_map
+
+
+class StockPanel(BaseStock):
+    """
+    Data of several tickers stored as one aligned block (time x ticker) per field.
+
+    Indicators are computed over the close block of all tickers in a single vectorized
+    call. panel[ticker] returns a StockFrame view of one ticker without copying the data,
+    so it should not be modified in place. Dates where a ticker has no data are NaN.
+
+    Parameters
+    ----------
+    fields : dict
+        keys = field names (open, high, low, close, adj_close, volume),
+        values = DataFrame indexed by date with one column per ticker.
+    dtype : numpy dtype, default float64
+        Dtype of the blocks. float32 halves the memory, see bayao_finance.compact.
+    """
+
+    def __init__(self, fields, stock_token=None, dtype=np.float64):
+        BaseStock.__init__(self, stock_token=stock_token)
+        if not fields:
+            raise AttributeError('StockPanel needs at least one field')
+
+        frames = list(fields.values())
+        index = frames[0].index
+        tickers = frames[0].columns
+        for frame in frames[1:]:
+            index = index.union(frame.index)
+            tickers = tickers.union(frame.columns, sort=False)
+        self.index = index.sort_values()
+        self.tickers = list(tickers)
+        self._ticker_positions = {t: i for i, t in enumerate(self.tickers)}
+
+        # Fortran order keeps each ticker contiguous, so ticker views are plain slices
+        self._blocks = {}
+        for field, frame in fields.items():
+            frame = frame.reindex(index=self.index, columns=self.tickers)
+            self._blocks[field] = np.asfortranarray(frame.to_numpy(dtype=dtype))
+
+        if 'adj_close' in self._blocks:
+            self.close_col_name = 'adj_close'
+        elif 'close' in self._blocks:
+            self.close_col_name = 'close'
+        else:
+            self.close_col_name = None
+
+    @classmethod
+    def from_frames(cls, frames, stock_token=None, dtype=np.float64):
+        """
+        Parameters
+        ----------
+        frames : dict
+            keys = tickers, values = StockFrame or DataFrame with OHLCV columns
+        dtype : numpy dtype, default float64
+            Dtype of the blocks
+
+        Returns
+        -------
+        StockPanel
+        """
+        stock_frames = {t: f if isinstance(f, StockFrame) else StockFrame(f, stock_token=t)
+                        for t, f in frames.items()}
+        index = None
+        for frame in stock_frames.values():
+            index = frame.index if index is None else index.union(frame.index)
+
+        fields = {}
+        for ticker, frame in stock_frames.items():
+            for col in frame.columns:
+                fields.setdefault(col, {})[ticker] = frame[col]
+        fields = {field: DataFrame(series, index=index) for field, series in fields.items()}
+        return cls(fields, stock_token=stock_token, dtype=dtype)
+
+    @classmethod
+    def from_yahoo(cls, data, stock_token=None, dtype=np.float64):
+        """
+        Builds a panel from a yfinance download grouped by ticker, without splitting it
+        into one frame per ticker.
+
+        Parameters
+        ----------
+        data : DataFrame
+            Columns MultiIndex of (ticker, field)
+        dtype : numpy dtype, default float64
+            Dtype of the blocks
+
+        Returns
+        -------
+        StockPanel
+        """
+        fields = {}
+        for field, name in _get_cols_map(list(data.columns.get_level_values(1).unique())).items():
+            fields[name] = data.xs(field, axis=1, level=1)
+        return cls(fields, stock_token=stock_token, dtype=dtype)
+
+    @property
+    def fields(self):
+        return list(self._blocks)
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.tickers)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, ticker):
+        return ticker in self._ticker_positions
+
+    def __iter__(self):
+        return iter(self.tickers)
+
+    def field(self, name):
+        """
+        Returns
+        -------
+        DataFrame
+            One field of all tickers, indexed by date with one column per ticker
+        """
+        if name not in self._blocks:
+            raise KeyError(f'Field {name} not in panel. Available fields: {self.fields}')
+        return DataFrame(self._blocks[name], index=self.index, columns=Index(self.tickers), copy=False)
+
+    @property
+    def target_close(self):
+        if self.close_col_name is None:
+            return None
+        return self.field(self.close_col_name)
+
+    def __getitem__(self, ticker):
+        """
+        Returns
+        -------
+        StockFrame
+            View of ticker sharing memory with the panel
+        """
+        position = self._ticker_positions[ticker]
+        data = {field: block[:, position] for field, block in self._blocks.items()}
+        return StockFrame(DataFrame(data, index=self.index, copy=False), stock_token=ticker)
+
+    def items(self):
+        for ticker in self.tickers:
+            yield ticker, self[ticker]
+
+    def to_dict(self, dropna=True):
+        """
+        Returns
+        -------
+        dict
+            keys = tickers, values = StockFrame. With dropna, rows without data are
+            dropped, which copies each frame.
+        """
+        if dropna:
+            return {ticker: frame.dropna(how='all') for ticker, frame in self.items()}
+        return dict(self.items())
+
+    def _stock_data(self):
+        return self.target_close
+
+    def _true_range_fields(self):
+        # high and low are not adjusted, so the raw close is preferred when available
+        close = 'close' if 'close' in self._blocks else self.close_col_name
+        if close is None or 'high' not in self._blocks or 'low' not in self._blocks:
+            return None
+        return self.field('high'), self.field('low'), self.field(close)
+
+    @cached_indicator
+    def get_true_range(self):
+        """
+        Returns
+        -------
+        DataFrame
+            True range of every ticker computed in one pass, or None without high, low
+            and close fields
+        """
+        fields = self._true_range_fields()
+        if fields is None:
+            return None
+        return get_true_range_from_data(*fields)
+
+    @cached_indicator
+    def get_atr(self, n=14, wilder=False, min_periods=None):
+        """
+        Average True Range of every ticker computed in one pass, see StockFrame.get_atr
+
+        Returns
+        -------
+        DataFrame or None without high, low and close fields
+        """
+        fields = self._true_range_fields()
+        if fields is None:
+            return None
+        return get_atr_from_data(*fields, n=n, wilder=wilder, min_periods=min_periods)
+
+
+def close_frame(data):
+    """
+    Closes of a universe as a DataFrame indexed by date with one column per ticker.
+
+    Parameters
+    ----------
+    data: StockPanel, dict of StockFrames, StockFrame, Series or DataFrame of closes
+        Stocks and panels use their close
+
+    Returns
+    -------
+    DataFrame
+    """
+    if isinstance(data, Mapping):
+        data = StockPanel.from_frames(dict(data))
+    if hasattr(data, '_indicator_data'):
+        data = data._indicator_data()
+    if isinstance(data, Series):
+        data = data.to_frame()
+    if not isinstance(data, DataFrame):
+        raise AttributeError('data must be a StockPanel, a dict of StockFrames or a DataFrame of closes')
+    return data
@@ -1,11 +1,11 @@
 import pandas as pd
 from pandas import Series
 from bayao_finance.indicators import *
-from bayao_finance.base_stock import BaseStock
+from bayao_finance.base_stock import BaseStock, TracksMutations, order_by_index
 import numpy as np
 
 
-class StockSeries(Series, BaseStock):
+class StockSeries(TracksMutations, Series, BaseStock):
     """
     Series which can generate indexes with close or adj_close
 
@@ -13,33 +13,33 @@ class StockSeries(Series, BaseStock):
     ----------
     data : Series
         One column = close or adj_close
+    drop_duplicates : bool, default False
+        If True keeps only the last value of each repeated timestamp
+    validate : bool, default False
+        If True raises when values are not numeric
     """
 
-    _metadata = ["_stock_indexes", "_close_indexes", "stock_token"]
+    _metadata = ["_close_indexes", "stock_token"]
 
-    def __init__(self, data, *args, stock_token=None, **kwargs):
+    def __init__(self, data, *args, stock_token=None, drop_duplicates=False, validate=False, **kwargs):
 
-        # Data must be a DataFrame wtih index of Timestamp or Datetime
-        if isinstance(data, Series):
-            if data.index[0] > data.index[1]:
-                data = data[::-1]
-        elif isinstance(data, np.ndarray):
-            try:
-                if kwargs.get('index')[0] > kwargs.get('index')[1]:
-                    data = data[::-1]
-                    kwargs['index'] = kwargs['index'][::-1]
-            except IndexError:
-                pass
+        # Data must be ordered by date, see order_by_index
+        if args or kwargs or not isinstance(data, Series):
+            data = Series(data, *args, **kwargs)
+            args, kwargs = (), {}
+        data = order_by_index(data, drop_duplicates=drop_duplicates, validate=validate)
 
         BaseStock.__init__(self, stock_token=stock_token)
         Series.__init__(self, data, *args, **kwargs)
 
-        self._stock_indexes = {"sma": self.get_sma,
-                               "ema": self.get_ema,
-                               "macd": self.get_macd,
-                               "bb": self.get_bollinger_bands,
-                               "rsi": self.get_rsi,
-                               "returns": self.get_returns}
+    @property
+    def _stock_indexes(self):
+        return {"sma": self.get_sma,
+                "ema": self.get_ema,
+                "macd": self.get_macd,
+                "bb": self.get_bollinger_bands,
+                "rsi": self.get_rsi,
+                "returns": self.get_returns}
 
     @property
     def _constructor(self):
@@ -50,6 +50,19 @@ class StockSeries(Series, BaseStock):
         from bayao_finance import StockFrame
         return StockFrame
 
+    def _constructor_from_mgr(self, mgr, axes):
+        # results of operations on a StockSeries skip __init__ and keep the token
+        series = StockSeries._from_mgr(mgr, axes=axes)
+        series._name = None
+        object.__setattr__(series, 'stock_token', self.stock_token)
+        return series
+
+    def _constructor_expanddim_from_mgr(self, mgr, axes):
+        from bayao_finance import StockFrame
+        frame = StockFrame._from_mgr(mgr, axes=mgr.axes)
+        frame._inherit_metadata(self)
+        return frame
+
 
     def get_stock_indexes(self):
         return self._stock_indexes
@@ -0,0 +1,206 @@
+import datetime
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'adj_close']
+VOLUME_COLUMNS = ['volume']
+
+
+def date_key(d):
+    """
+    Converts a date to a key usable in DataFrame.loc slices.
+    Dates become "YYYY-MM-DD" strings so slicing includes every bar of that day.
+    """
+    if d is None or isinstance(d, (str, pd.Timestamp)):
+        return d
+    if isinstance(d, datetime.datetime):
+        return pd.Timestamp(d)
+    if isinstance(d, datetime.date):
+        return d.strftime("%Y-%m-%d")
+    raise AttributeError('date must be a datetime object or a string in "%Y-%m-%d" format')
+
+
+def slice_dates(frame, start=None, end=None):
+    if start is None and end is None:
+        return frame
+    return frame.loc[date_key(start):date_key(end)]
+
+
+def _typed_ohlcv(frame, price_dtype):
+    """
+    Cast canonical OHLCV columns to fixed dtypes so binary files keep a stable schema.
+    Prices use price_dtype and volume is stored as float64 since it may hold NaN.
+    """
+    dtypes = {}
+    for col in frame.columns:
+        if col in PRICE_COLUMNS:
+            dtypes[col] = price_dtype
+        elif col in VOLUME_COLUMNS:
+            dtypes[col] = np.float64
+    if not dtypes:
+        return frame
+    return frame.astype(dtypes)
+
+
+class BaseStorage:
+    """
+    Defines how StockManipulator writes and reads one ticker history.
+
+    Parameters
+    ----------
+    price_dtype : str or numpy dtype, default "float64"
+        Dtype used for open, high, low, close and adj_close columns.
+    """
+
+    name = None
+    extension = None
+
+    def __init__(self, price_dtype='float64'):
+        self.price_dtype = np.dtype(price_dtype)
+        if self.price_dtype not in (np.float32, np.float64):
+            raise AttributeError('price_dtype must be float32 or float64')
+
+    def write(self, frame, path):
+        raise NotImplementedError
+
+    def read(self, path, columns=None):
+        """
+        Parameters
+        ----------
+        path: str
+            File path
+        columns: list, default None
+            Columns to load. If None all columns are loaded.
+
+        Returns
+        -------
+        DataFrame indexed by date
+        """
+        raise NotImplementedError
+
+    def read_range(self, path, start=None, end=None, columns=None):
+        """
+        Same as read but only returns rows between start and end, both inclusive.
+        """
+        return slice_dates(self.read(path, columns=columns), start, end)
+
+
+class CsvStorage(BaseStorage):
+    """
+    Plain text storage, one csv per ticker. Kept as the default for compatibility.
+    """
+
+    name = 'csv'
+    extension = '.csv'
+
+    def write(self, frame, path):
+        frame.to_csv(path)
+
+    def read(self, path, columns=None):
+        usecols = None
+        if columns is not None:
+            index_col = pd.read_csv(path, nrows=0).columns[0]
+            usecols = [index_col] + list(columns)
+        return pd.read_csv(path, index_col=0, parse_dates=True, usecols=usecols)
+
+
+class ParquetStorage(BaseStorage):
+    """
+    Columnar binary storage using parquet. Requires pyarrow.
+
+    Parameters
+    ----------
+    compression : str, default "snappy"
+        Parquet compression codec
+    """
+
+    name = 'parquet'
+    extension = '.parquet'
+
+    def __init__(self, price_dtype='float64', compression='snappy'):
+        super().__init__(price_dtype=price_dtype)
+        self.compression = compression
+
+    def write(self, frame, path):
+        frame = _typed_ohlcv(pd.DataFrame(frame), self.price_dtype)
+        frame.to_parquet(path, compression=self.compression)
+
+    def read(self, path, columns=None):
+        if columns is not None:
+            columns = list(columns)
+        return pd.read_parquet(path, columns=columns)
+
+
+class FeatherStorage(BaseStorage):
+    """
+    Columnar binary storage using the Arrow IPC (feather v2) format. Requires pyarrow.
+
+    Parameters
+    ----------
+    compression : str, default "uncompressed"
+        Feather compression codec, "uncompressed", "lz4" or "zstd".
+        Uncompressed files are larger but are the fastest to read.
+    """
+
+    name = 'feather'
+    extension = '.feather'
+    index_name = 'date'
+
+    def __init__(self, price_dtype='float64', compression='uncompressed'):
+        super().__init__(price_dtype=price_dtype)
+        self.compression = compression
+
+    def write(self, frame, path):
+        frame = _typed_ohlcv(pd.DataFrame(frame), self.price_dtype)
+        # feather does not store the index
+        frame = frame.rename_axis(self.index_name).reset_index()
+        frame.to_feather(path, compression=self.compression)
+
+    def read(self, path, columns=None):
+        if columns is not None:
+            columns = [self.index_name] + list(columns)
+        return pd.read_feather(path, columns=columns).set_index(self.index_name)
+
+    def read_range(self, path, start=None, end=None, columns=None):
+        """
+        Same as read but only returns rows between start and end, both inclusive.
+
+        The file is memory mapped and only the date column is scanned to find the rows,
+        so uncompressed files only load the pages of the requested rows and columns.
+        """
+        from pyarrow import ipc, memory_map
+
+        with memory_map(path) as source:
+            table = ipc.open_file(source).read_all()
+            if start is not None or end is not None:
+                dates = pd.DatetimeIndex(table.column(self.index_name).to_pandas())
+                first, stop, _ = dates.slice_indexer(date_key(start), date_key(end)).indices(len(dates))
+                table = table.slice(first, max(stop - first, 0))
+            if columns is not None:
+                table = table.select([self.index_name] + list(columns))
+            return table.to_pandas().set_index(self.index_name)
+
+
+STORAGES = {
+    'csv': CsvStorage,
+    'parquet': ParquetStorage,
+    'feather': FeatherStorage,
+}
+
+
+def get_storage(storage):
+    """
+    Parameters
+    ----------
+    storage: str or BaseStorage
+        Storage name (csv, parquet, feather) or an instance of BaseStorage.
+
+    Returns
+    -------
+    BaseStorage
+    """
+    if isinstance(storage, BaseStorage):
+        return storage
+    if storage not in STORAGES:
+        raise AttributeError(f'Storage {storage} is not available. Use one of {list(STORAGES)}')
+    return STORAGES[storage]()
@@ -0,0 +1,315 @@
+"""
+Online indicators updated one bar at a time.
+
+Each indicator keeps the state of the batch recursion, so after seeding with the history
+a new bar costs O(1) instead of recomputing the whole history: rolling indicators add the
+bar entering the window and remove the one leaving it. Seeded from a Series the values
+are floats; seeded from a DataFrame (one column per ticker) they are arrays in column
+order.
+
+EMA based indicators (EMA, MACD, RSI, Wilder ATR) reproduce the batch values exactly,
+window based ones match them within kernels.RTOL.
+"""
+from collections import deque
+import numpy as np
+from pandas import DataFrame
+
+
+def _as_row(value, n_columns):
+    row = np.asarray(value, dtype=np.float64).reshape(-1)
+    if row.size == 1 and n_columns > 1:
+        row = np.full(n_columns, row[0])
+    if row.size != n_columns:
+        raise AttributeError(f'Expected {n_columns} values per bar, got {row.size}')
+    return row
+
+
+def _history(data):
+    if hasattr(data, '_indicator_data'):
+        data = data._indicator_data()
+    values = np.asarray(data, dtype=np.float64)
+    columns = list(data.columns) if isinstance(data, DataFrame) else None
+    return values.reshape(len(values), -1), columns
+
+
+class _EwmState:
+    # same recursion as pandas ewm(alpha=alpha, adjust=True).mean(), one row at a time
+    def __init__(self, alpha, min_periods, n_columns):
+        self.old_wt_factor = 1.0 - alpha
+        self.min_periods = max(int(min_periods or 0), 1)
+        self.weighted = np.full(n_columns, np.nan)
+        self.old_wt = np.ones(n_columns)
+        self.nobs = np.zeros(n_columns, dtype=np.int64)
+        self.started = False
+
+    def update(self, cur):
+        is_observation = ~np.isnan(cur)
+        self.nobs += is_observation
+        if not self.started:
+            self.weighted = cur.copy()
+            self.started = True
+        else:
+            weighted = self.weighted
+            started = ~np.isnan(weighted)
+            self.old_wt = np.where(started, self.old_wt * self.old_wt_factor, self.old_wt)
+            update = started & is_observation
+            with np.errstate(invalid='ignore'):
+                blended = (self.old_wt * weighted + cur) / (self.old_wt + 1.0)
+            weighted = np.where(update & (weighted != cur), blended, weighted)
+            self.old_wt = np.where(update, self.old_wt + 1.0, self.old_wt)
+            self.weighted = np.where(~started & is_observation, cur, weighted)
+        return np.where(self.nobs >= self.min_periods, self.weighted, np.nan)
+
+
+class _WindowState:
+    # running count, mean and sum of squared deviations of the last n rows, updated with
+    # the row entering and the row leaving the window (same update as kernels._rolling_mean_var_loop)
+    def __init__(self, n, min_periods, n_columns):
+        self.n = n
+        self.min_periods = min_periods if min_periods else n
+        self.rows = deque(maxlen=n)
+        self.count = np.zeros(n_columns, dtype=np.int64)
+        self.mean = np.zeros(n_columns)
+        self.ssqdm = np.zeros(n_columns)
+
+    def _remove(self, row):
+        valid = ~np.isnan(row)
+        self.count -= valid
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = row - self.mean
+            mean = self.mean - delta / self.count
+            ssqdm = self.ssqdm - delta * (row - mean)
+        # an emptied window restarts from zero so rounding does not carry over
+        empty = self.count == 0
+        self.mean = np.where(valid, np.where(empty, 0.0, mean), self.mean)
+        self.ssqdm = np.where(valid, np.where(empty, 0.0, ssqdm), self.ssqdm)
+
+    def _add(self, row):
+        valid = ~np.isnan(row)
+        self.count += valid
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = row - self.mean
+            mean = self.mean + delta / self.count
+            ssqdm = self.ssqdm + delta * (row - mean)
+        self.mean = np.where(valid, mean, self.mean)
+        self.ssqdm = np.where(valid, ssqdm, self.ssqdm)
+
+    def update(self, row):
+        if len(self.rows) == self.n:
+            self._remove(self.rows[0])
+        self.rows.append(row)
+        self._add(row)
+        return self.count
+
+    def values(self):
+        # (mean, standard deviation) of the window, NaN below min_periods
+        enough = (self.count >= self.min_periods) & (self.count > 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = np.where(self.count > 1, np.maximum(self.ssqdm / (self.count - 1), 0), np.nan)
+        return np.where(enough, self.mean, np.nan), np.where(enough, np.sqrt(var), np.nan)
+
+
+class OnlineIndicator:
+    """
+    Base class of online indicators.
+
+    Use from_data to seed from a StockSeries, StockFrame or DataFrame, then update with
+    each new bar. StockFrames are seeded with their close column.
+    """
+
+    history_rows = None
+
+    def __init__(self, n_columns=1, columns=None):
+        self.n_columns = n_columns
+        self.columns = columns
+        self.value = None
+
+    @classmethod
+    def from_data(cls, data, **params):
+        values, columns = _history(data)
+        indicator = cls(n_columns=values.shape[1], columns=columns, **params)
+        indicator._seed(values)
+        return indicator
+
+    def _seed(self, values):
+        if self.history_rows is not None:
+            values = values[-self.history_rows:]
+        for row in values:
+            self._update(row)
+
+    def _output(self, values):
+        if self.n_columns == 1:
+            return float(values[0])
+        return values
+
+    def update(self, value):
+        """
+        Parameters
+        ----------
+        value: float or array
+            New close, one per column
+
+        Returns
+        -------
+        The indicator value after the new bar
+        """
+        return self._update(_as_row(value, self.n_columns))
+
+    def _update(self, row):
+        raise NotImplementedError
+
+
+class OnlineSMA(OnlineIndicator):
+    """
+    Simple moving average, same as get_sma.
+    """
+
+    def __init__(self, n=20, min_periods=None, n_columns=1, columns=None):
+        super().__init__(n_columns, columns)
+        self.history_rows = n
+        self._window = _WindowState(n, min_periods, n_columns)
+
+    def _update(self, row):
+        self._window.update(row)
+        self.value = self._output(self._window.values()[0])
+        return self.value
+
+
+class OnlineEMA(OnlineIndicator):
+    """
+    Exponential moving average, same as get_ema.
+    """
+
+    def __init__(self, n=20, min_periods=None, n_columns=1, columns=None):
+        super().__init__(n_columns, columns)
+        self._ema = _EwmState(2 / (n + 1), min_periods if min_periods else n, n_columns)
+
+    def _update(self, row):
+        self.value = self._output(self._ema.update(row))
+        return self.value
+
+
+class OnlineMACD(OnlineIndicator):
+    """
+    Moving Average Convergence Divergence and its signal, same as get_macd.
+    value is a tuple (macd, signal).
+    """
+
+    def __init__(self, n_short=12, n_long=26, n_signal=9, n_columns=1, columns=None):
+        super().__init__(n_columns, columns)
+        self._short = _EwmState(2 / (n_short + 1), n_short, n_columns)
+        self._long = _EwmState(2 / (n_long + 1), n_long, n_columns)
+        self._signal = _EwmState(2 / (n_signal + 1), n_signal, n_columns)
+
+    def _update(self, row):
+        macd = self._short.update(row) - self._long.update(row)
+        signal = self._signal.update(macd)
+        self.value = (self._output(macd), self._output(signal))
+        return self.value
+
+
+class OnlineBollingerBands(OnlineIndicator):
+    """
+    Bollinger Bands, same as get_bollinger_bands.
+    value is a tuple (bb_inf, bb, bb_sup).
+    """
+
+    def __init__(self, n=20, k=2, n_columns=1, columns=None):
+        super().__init__(n_columns, columns)
+        self.history_rows = n
+        self.k = k
+        self._window = _WindowState(n, n, n_columns)
+
+    def _update(self, row):
+        self._window.update(row)
+        mean, std = self._window.values()
+        self.value = (self._output(mean - self.k * std), self._output(mean), self._output(mean + self.k * std))
+        return self.value
+
+
+class OnlineRSI(OnlineIndicator):
+    """
+    Relative Strength Index with Wilder smoothing, same as get_rsi.
+    """
+
+    def __init__(self, n=14, min_periods=None, n_columns=1, columns=None):
+        super().__init__(n_columns, columns)
+        min_periods = min_periods if min_periods else n
+        self._gain = _EwmState(1 / n, min_periods, n_columns)
+        self._loss = _EwmState(1 / n, min_periods, n_columns)
+        self._previous = np.full(n_columns, np.nan)
+
+    def _update(self, row):
+        delta = row - self._previous
+        self._previous = row
+        gain = self._gain.update(np.maximum(delta, 0))
+        loss = self._loss.update(np.maximum(-delta, 0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = 100 - 100 / (1 + gain / loss)
+        self.value = self._output(rsi)
+        return self.value
+
+
+class OnlineATR(OnlineIndicator):
+    """
+    Average True Range over high, low and close.
+    Simple moving average of true range, or Wilder smoothing if wilder.
+    """
+
+    def __init__(self, n=14, wilder=False, n_columns=1, columns=None):
+        super().__init__(n_columns, columns)
+        if wilder:
+            self._average = _EwmState(1 / n, n, n_columns)
+        else:
+            self._average = None
+            self._window = _WindowState(n, n, n_columns)
+        self._previous_close = np.full(n_columns, np.nan)
+
+    @classmethod
+    def from_data(cls, data, **params):
+        """
+        Parameters
+        ----------
+        data: StockFrame
+            Must have high, low and close columns
+        """
+        indicator = cls(**params)
+        if indicator._average is None:
+            # the simple average only needs the last window and the close before it
+            data = data.iloc[-(indicator._window.n + 1):]
+        if hasattr(data, '_true_range_columns'):
+            # same columns as StockFrame.get_atr, the raw close is preferred to the adjusted one
+            columns = data._true_range_columns()
+            if columns is None:
+                raise AttributeError('data must have high, low and close columns')
+        else:
+            columns = data['high'], data['low'], data['close']
+        for high, low, close in zip(*(i.to_numpy() for i in columns)):
+            indicator._update(np.array([high]), np.array([low]), np.array([close]))
+        return indicator
+
+    def update(self, high, low, close):
+        """
+        Parameters
+        ----------
+        high, low, close: float or array
+            New bar values, one per column
+
+        Returns
+        -------
+        The ATR after the new bar
+        """
+        return self._update(_as_row(high, self.n_columns), _as_row(low, self.n_columns),
+                            _as_row(close, self.n_columns))
+
+    def _update(self, high, low, close):
+        true_range = np.fmax(np.fmax(high - low, np.abs(high - self._previous_close)),
+                             np.abs(low - self._previous_close))
+        self._previous_close = close
+        if self._average is not None:
+            atr = self._average.update(true_range)
+        else:
+            self._window.update(true_range)
+            atr = self._window.values()[0]
+        self.value = self._output(atr)
+        return self.value
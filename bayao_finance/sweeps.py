@@ -0,0 +1,237 @@
+"""
+Indicators evaluated over a whole grid of parameters at once.
+
+Windows of one sweep share their intermediates: rolling sums of every window are
+differences of the same prefix sums, Bollinger Bands of every k reuse the mean and
+standard deviation of their window, and EMAs of every span run in one kernel call with
+one alpha per column. Results are ndarrays (time x ticker x parameter) or DataFrames
+with (parameter, ticker) MultiIndex columns.
+
+Results match the get_*_from_data functions within kernels.RTOL and kernels.ATOL.
+"""
+from itertools import product
+import numpy as np
+from pandas import DataFrame, Series, MultiIndex
+from bayao_finance import kernels
+
+
+def _sweep_data(data):
+    # (float ndarray time x ticker, index, tickers). Stocks use their close.
+    token = getattr(data, 'stock_token', None)
+    if hasattr(data, '_indicator_data'):
+        data = data._indicator_data()
+    # inf is missing, as in the kernels and pandas windows
+    if isinstance(data, Series):
+        name = token if token and token != 'Unknown' else data.name
+        return kernels._finite(data.to_numpy(dtype=np.float64).reshape(-1, 1)), data.index, [name]
+    if isinstance(data, DataFrame):
+        return kernels._finite(data.to_numpy(dtype=np.float64)), data.index, list(data.columns)
+    raise AttributeError('data must be a Series, a DataFrame or a stock')
+
+
+def _windows(windows):
+    windows = [int(n) for n in windows]
+    if not windows or min(windows) < 1:
+        raise AttributeError('windows must be a non empty list of positive integers')
+    return windows
+
+
+def _min_periods(windows, min_periods):
+    # as in get_sma and get_ema, the default of each window is the window itself
+    if not min_periods:
+        return np.asarray(windows)
+    return np.full(len(windows), min_periods)
+
+
+def _mask(values, bad):
+    if np.ndim(bad):
+        values[np.broadcast_to(bad, values.shape)] = np.nan
+    elif bad:
+        values[:] = np.nan
+
+
+def _finish_moments(mean, std, count, shift, min_periods):
+    # in place: mean and std hold window sums of deviations and of squared deviations
+    if std is not None:
+        std -= mean * mean / count
+        np.maximum(std, 0, out=std)
+        std /= count - 1
+        np.sqrt(std, out=std)
+        _mask(std, (count < min_periods) | (count < 2))
+    mean /= count
+    mean += shift
+    _mask(mean, (count < min_periods) | (count < 1))
+
+
+def _rolling_moments(x, windows, min_periods, moments):
+    """
+    Rolling mean, and standard deviation if moments == 2, of every window from one
+    pass of shifted prefix sums per chunk of rows.
+
+    Returns
+    -------
+    tuple
+        (mean, std or None), each (rows, columns, windows). They are views of arrays
+        laid out window by window, so each window is written contiguously.
+    """
+    n_rows, n_cols = x.shape
+    mean_out = np.empty((len(windows), n_rows, n_cols))
+    std_out = np.empty((len(windows), n_rows, n_cols)) if moments == 2 else None
+    valid = ~np.isnan(x)
+    lead = kernels._leading_nan_rows(valid)
+    mean_out[:, :lead] = np.nan
+    if moments == 2:
+        std_out[:, :lead] = np.nan
+    x, valid = x[lead:], valid[lead:]
+    has_nan = not valid.all()
+    pad = max(windows)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start, stop, first in kernels._chunks(x.shape[0], pad):
+            segment = x[first:stop]
+            if has_nan:
+                segment_valid = valid[first:stop]
+                segment = np.where(segment_valid, segment, 0)
+                shift = segment.sum(axis=0) / np.maximum(segment_valid.sum(axis=0), 1)
+                dev = np.where(segment_valid, segment - shift, 0)
+            else:
+                shift = segment.mean(axis=0)
+                dev = segment - shift
+            skip, length = start - first, stop - first
+
+            # cumulative sums padded with pad zero rows, shared by every window
+            s1_prefix = np.zeros((length + pad, n_cols))
+            np.cumsum(dev, axis=0, out=s1_prefix[pad:])
+            if moments == 2:
+                s2_prefix = np.zeros((length + pad, n_cols))
+                np.cumsum(dev * dev, axis=0, out=s2_prefix[pad:])
+            if has_nan:
+                count_prefix = np.zeros((length + pad, n_cols))
+                np.cumsum(segment_valid, axis=0, out=count_prefix[pad:])
+            rows = slice(lead + start, lead + stop)
+            ends = slice(pad + skip, pad + length)
+
+            for i, n in enumerate(windows):
+                window = slice(pad + skip - n, pad + length - n)
+                mean = mean_out[i, rows]
+                np.subtract(s1_prefix[ends], s1_prefix[window], out=mean)
+                std = None
+                if moments == 2:
+                    std = std_out[i, rows]
+                    np.subtract(s2_prefix[ends], s2_prefix[window], out=std)
+                if has_nan:
+                    count = count_prefix[ends] - count_prefix[window]
+                    _finish_moments(mean, std, count, shift, min_periods[i])
+                    continue
+                # without NaN a window holds n values after its first n - 1 rows
+                warm = min(max(n - 1 - start, 0), stop - start)
+                count = np.arange(start + 1, start + warm + 1, dtype=np.float64)[:, None]
+                _finish_moments(mean[:warm], None if std is None else std[:warm], count, shift, min_periods[i])
+                _finish_moments(mean[warm:], None if std is None else std[warm:], float(n), shift, min_periods[i])
+
+    mean_out = mean_out.transpose(1, 2, 0)
+    if moments == 2:
+        std_out = std_out.transpose(1, 2, 0)
+    return mean_out, std_out
+
+
+def _as_frame(values, index, params, names, tickers):
+    # (rows, tickers, params) -> DataFrame with (param, ticker) columns
+    n_rows = values.shape[0]
+    columns = MultiIndex.from_tuples([(*(p if isinstance(p, tuple) else (p,)), t) for p in params for t in tickers],
+                                     names=names + [None])
+    return DataFrame(values.transpose(0, 2, 1).reshape(n_rows, -1), index=index, columns=columns)
+
+
+def sweep_sma(data, windows, min_periods=None, as_frame=False):
+    """
+    Simple moving averages of every window, sharing one prefix sum.
+
+    Parameters
+    ----------
+    data: Series, DataFrame, StockSeries, StockFrame or StockPanel
+        Values, one column per ticker. Stocks use their close.
+    windows: list
+        Window lengths, e.g. range(5, 201)
+    min_periods: int, default None
+        Valid values needed by a window. Default is the window length.
+    as_frame: bool, default False
+        Return a DataFrame with (n, ticker) columns instead of an ndarray
+
+    Returns
+    -------
+    ndarray (rows, tickers, windows) or DataFrame
+    """
+    values, index, tickers = _sweep_data(data)
+    windows = _windows(windows)
+    mean, _ = _rolling_moments(values, windows, _min_periods(windows, min_periods), moments=1)
+    if as_frame:
+        return _as_frame(mean, index, windows, ['n'], tickers)
+    return mean
+
+
+def sweep_ema(data, windows, min_periods=None, as_frame=False):
+    """
+    Exponential moving averages of every span, computed in a single kernel call with
+    one alpha per (ticker, span) column.
+
+    Parameters and returns as in sweep_sma.
+    """
+    values, index, tickers = _sweep_data(data)
+    windows = _windows(windows)
+    n_rows, n_tickers = values.shape
+
+    tiled = np.repeat(values[:, :, None], len(windows), axis=2).reshape(n_rows, -1)
+    alpha = np.tile(2 / (np.asarray(windows, dtype=np.float64) + 1), n_tickers)
+    ema = kernels.ewm_mean(tiled, alpha, min_periods=1).reshape(n_rows, n_tickers, len(windows))
+    # the observation count is the same for every span
+    count = np.cumsum(~np.isnan(values), axis=0)
+    ema[count[:, :, None] < _min_periods(windows, min_periods)[None, None, :]] = np.nan
+    if as_frame:
+        return _as_frame(ema, index, windows, ['n'], tickers)
+    return ema
+
+
+def sweep_bollinger(data, windows, ks=(2,), as_frame=False):
+    """
+    Bollinger Bands of every (n, k) pair. Mean and standard deviation are computed once
+    per window and shared by every k.
+
+    Parameters
+    ----------
+    data: Series, DataFrame, StockSeries, StockFrame or StockPanel
+        Values, one column per ticker. Stocks use their close.
+    windows: list
+        Window lengths
+    ks: list, default (2,)
+        Numbers of standard deviations
+    as_frame: bool, default False
+        Return a DataFrame with (n, k, band) columns named as in get_bollinger_bands
+        (ticker_inf, ticker, ticker_sup) instead of an ndarray
+
+    Returns
+    -------
+    ndarray (rows, tickers, pairs, 3) or DataFrame
+        Pairs ordered as product(windows, ks), last axis is (inf, center, sup)
+    """
+    values, index, tickers = _sweep_data(data)
+    windows = _windows(windows)
+    ks = np.asarray(ks, dtype=np.float64)
+    mean, std = _rolling_moments(values, windows, np.asarray(windows), moments=2)
+
+    n_rows, n_tickers = values.shape
+    bands = np.empty((n_rows, n_tickers, len(windows), len(ks), 3))
+    width = std[:, :, :, None] * ks
+    bands[..., 1] = mean[:, :, :, None]
+    np.subtract(bands[..., 1], width, out=bands[..., 0])
+    np.add(bands[..., 1], width, out=bands[..., 2])
+    bands = bands.reshape(n_rows, n_tickers, len(windows) * len(ks), 3)
+
+    if not as_frame:
+        return bands
+    pairs = list(product(windows, ks.tolist()))
+    labels = [f'{t}_inf' for t in tickers], list(tickers), [f'{t}_sup' for t in tickers]
+    columns = MultiIndex.from_tuples([(n, k, labels[b][i]) for n, k in pairs for i in range(n_tickers) for b in range(3)],
+                                     names=['n', 'k', None])
+    # (rows, pairs, tickers, bands) matches the column order above
+    return DataFrame(bands.transpose(0, 2, 1, 3).reshape(n_rows, -1), index=index, columns=columns)
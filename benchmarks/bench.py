@@ -0,0 +1,132 @@
+"""
+Timing, peak memory and baseline comparison used by the benchmark suites.
+"""
+import gc
+import json
+import time
+import tracemalloc
+
+
+class Case:
+    """
+    One benchmark.
+
+    Parameters
+    ----------
+    name : str
+        Unique name, used as key in the baseline
+    run : callable
+        Timed function, receives what setup returned
+    setup : callable, default None
+        Untimed preparation, called before every run
+    rows : int, default 0
+        Rows processed by one run, used for the throughput
+    """
+
+    def __init__(self, name, run, setup=None, rows=0):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.rows = rows
+
+
+def measure(case, repeat=3, min_time=0.2):
+    """
+    Runs case at least repeat times (and for at least min_time seconds) and keeps the
+    best time. Peak memory is taken in one extra run under tracemalloc so tracing does
+    not slow down the timed runs.
+
+    Returns
+    -------
+    dict
+        seconds, rows_per_second, peak_mb, or error if the case raised
+    """
+    try:
+        times = []
+        while len(times) < repeat or (sum(times) < min_time and len(times) < 100):
+            state = case.setup() if case.setup else None
+            gc.collect()
+            start = time.perf_counter()
+            case.run(state)
+            times.append(time.perf_counter() - start)
+            del state
+
+        state = case.setup() if case.setup else None
+        gc.collect()
+        tracemalloc.start()
+        case.run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    except Exception as e:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {'error': repr(e)}
+
+    seconds = min(times)
+    return {'seconds': seconds,
+            'rows_per_second': case.rows / seconds if case.rows and seconds else None,
+            'peak_mb': peak / 2 ** 20}
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Parameters
+    ----------
+    results, baseline : dict
+        keys = case names, values = measure outputs
+    tolerance : float, default 0.25
+        Relative slowdown or memory growth accepted before flagging a regression
+
+    Returns
+    -------
+    dict
+        keys = case names, values = (time ratio, memory ratio, status) where status is
+        "ok", "faster", "regression", "new" or "error"
+    """
+    report = {}
+    for name, result in results.items():
+        old = baseline.get(name)
+        if 'error' in result:
+            report[name] = (None, None, 'error')
+        elif old is None or 'error' in old:
+            report[name] = (None, None, 'new')
+        else:
+            time_ratio = result['seconds'] / old['seconds']
+            memory_ratio = result['peak_mb'] / old['peak_mb'] if old['peak_mb'] else 1.0
+            if time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance:
+                status = 'regression'
+            elif time_ratio < 1 / (1 + tolerance):
+                status = 'faster'
+            else:
+                status = 'ok'
+            report[name] = (time_ratio, memory_ratio, status)
+    return report
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def format_table(results, comparison=None):
+    lines = [f'{"case":<48} {"seconds":>10} {"Mrows/s":>9} {"peak MB":>9}  vs baseline']
+    for name, result in results.items():
+        if 'error' in result:
+            lines.append(f'{name:<48} {"error":>10}  {result["error"]}')
+            continue
+        throughput = result['rows_per_second']
+        throughput = f'{throughput / 1e6:9.2f}' if throughput else f'{"-":>9}'
+        line = f'{name:<48} {result["seconds"]:10.5f} {throughput} {result["peak_mb"]:9.1f}'
+        if comparison and name in comparison:
+            time_ratio, memory_ratio, status = comparison[name]
+            if time_ratio is None:
+                line += f'  {status}'
+            else:
+                line += f'  x{time_ratio:.2f} time x{memory_ratio:.2f} memory {status}'
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,60 @@
+"""
+Synthetic OHLCV data and trades for benchmarks, always the same for a given size and seed.
+"""
+import numpy as np
+import pandas as pd
+
+
+def ohlcv(n_rows, seed=0, freq='min', yahoo_columns=True):
+    """
+    Random walk OHLCV DataFrame of n_rows bars ending on 2020-12-31.
+
+    Parameters
+    ----------
+    n_rows : int
+    seed : int
+    freq : str, default "min"
+        Bar frequency. Minutes keep 10M rows inside the supported date range.
+    yahoo_columns : bool, default True
+        Use yfinance column names (Open, Adj Close, ...) instead of canonical ones
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(end='2020-12-31', periods=n_rows, freq=freq, name='Date')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n_rows)))
+    open_ = close * np.exp(rng.normal(0, 0.0005, n_rows))
+    spread = np.abs(rng.normal(0, 0.001, n_rows))
+    data = pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + spread),
+        'low': np.minimum(open_, close) * (1 - spread),
+        'close': close,
+        'adj_close': close,
+        'volume': rng.integers(100_000, 10_000_000, n_rows).astype(np.float64),
+    }, index=index)
+    if yahoo_columns:
+        data.columns = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+    return data
+
+
+def universe(n_tickers, n_rows, seed=0):
+    """
+    Returns
+    -------
+    dict
+        keys = tickers T0000, T0001, ..., values = daily OHLCV DataFrame
+    """
+    return {f'T{i:04d}': ohlcv(n_rows, seed=seed + i, freq='B') for i in range(n_tickers)}
+
+
+def trades(n_rows, seed=0):
+    """
+    Random walk trades DataFrame with time, price and size columns, about 20 trades per
+    second starting on 2020-12-30.
+    """
+    rng = np.random.default_rng(seed)
+    gaps = rng.exponential(0.05, n_rows)
+    return pd.DataFrame({
+        'time': pd.Timestamp('2020-12-30') + pd.to_timedelta(np.cumsum(gaps), unit='s'),
+        'price': 100 * np.exp(np.cumsum(rng.normal(0, 1e-4, n_rows))),
+        'size': rng.integers(1, 1_000, n_rows).astype(np.float64),
+    })
@@ -0,0 +1,48 @@
+"""
+Precision of indicators computed on compact float32 data against float64, checked
+against the tolerances documented in bayao_finance.compact.PRECISION.
+"""
+import numpy as np
+from pandas import DataFrame
+from bayao_finance import indicators
+from bayao_finance.compact import PRECISION
+from benchmarks.data import universe
+
+INDICATORS = {
+    'get_sma': lambda d: indicators.get_sma_from_data(d, n=20),
+    'get_sma_std': lambda d: indicators.get_sma_std_from_data(d, n=20)[1],
+    'get_ema': lambda d: indicators.get_ema_from_data(d, n=20),
+    'get_macd': lambda d: indicators.get_macd_from_data(d),
+    'get_bollinger_bands': lambda d: indicators.get_bollinger_bands_from_data(d),
+    'get_rsi': lambda d: indicators.get_rsi(d, n=14),
+    'get_returns': lambda d: indicators.get_returns_from_data(d),
+}
+
+
+def check_precision(n_tickers=50, n_rows=7560):
+    """
+    Parameters
+    ----------
+    n_tickers : int, default 50
+    n_rows : int, default 7560
+        Daily bars per ticker, 30 years by default
+
+    Returns
+    -------
+    DataFrame
+        One row per indicator: dtype of the float32 result, measure, error, tolerance, ok
+    """
+    close = DataFrame({t: d['Close'] for t, d in universe(n_tickers, n_rows).items()})
+    compact = close.astype(np.float32)
+    price_level = float(np.abs(close.to_numpy()).mean())
+
+    rows = {}
+    for name, function in INDICATORS.items():
+        measure, tolerance = PRECISION[name]
+        expected = function(close).to_numpy()
+        result = function(compact)
+        error = np.nanmax(np.abs(result.to_numpy(dtype=np.float64) - expected))
+        if measure == 'price':
+            error /= price_level
+        rows[name] = [str(result.to_numpy().dtype), measure, error, tolerance, error <= tolerance]
+    return DataFrame.from_dict(rows, orient='index', columns=['dtype', 'measure', 'error', 'tolerance', 'ok'])
@@ -0,0 +1,88 @@
+"""
+Runs the benchmarks offline on synthetic data.
+
+Usage, from the repository root:
+
+    python -m benchmarks.run --profile quick
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --fail-on-regression
+    python -m benchmarks.run --precision
+    python -m benchmarks.run --suite startup
+
+Profiles go from 1k to 10M rows and 1 to 5k tickers, see suites.PROFILES. Baselines
+are machine specific, compare runs from the same machine. The startup suite times
+imports in fresh interpreters and fails the cases loading modules they should not.
+"""
+import argparse
+import sys
+import tempfile
+import warnings
+from benchmarks import bench, precision, suites
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='bayao_finance benchmarks')
+    parser.add_argument('--profile', default='default', choices=list(suites.PROFILES))
+    parser.add_argument('--suite', action='append', choices=list(suites.SUITES),
+                        help='Suites to run, may be repeated. Default is all')
+    parser.add_argument('--filter', default=None, help='Only run cases whose name contains this text')
+    parser.add_argument('--rows', type=int, nargs='+', default=None, help='Override the profile row sizes')
+    parser.add_argument('--tickers', type=int, nargs='+', default=None, help='Override the profile ticker counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=None, help='Baseline json to compare with')
+    parser.add_argument('--save-baseline', default=None, help='Write the results to this json')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--precision', action='store_true',
+                        help='Only check the float32 precision of indicators, fails above tolerance')
+    args = parser.parse_args(argv)
+
+    if args.precision:
+        table = precision.check_precision()
+        print(table.to_string())
+        return 0 if table['ok'].all() else 1
+
+    profile = suites.PROFILES[args.profile]
+    rows = args.rows or profile['rows']
+    tickers = args.tickers or profile['tickers']
+
+    warnings.simplefilter('ignore')
+    root = tempfile.mkdtemp(prefix='bayao_bench_')
+    results = {}
+    try:
+        for suite in args.suite or list(suites.SUITES):
+            if suite in suites.ROW_SUITES:
+                cases = suites.SUITES[suite](rows)
+            elif suite == 'startup':
+                cases = suites.SUITES[suite]()
+            elif suite == 'persistence':
+                cases = suites.SUITES[suite](tickers, root=root)
+            else:
+                cases = suites.SUITES[suite](tickers)
+            for case in cases:
+                if args.filter and args.filter not in case.name:
+                    continue
+                results[case.name] = bench.measure(case, repeat=args.repeat)
+                print(bench.format_table({case.name: results[case.name]}).splitlines()[1], flush=True)
+    finally:
+        suites.cleanup(root)
+
+    comparison = None
+    if args.baseline:
+        comparison = bench.compare(results, bench.load_baseline(args.baseline), tolerance=args.tolerance)
+    print()
+    print(bench.format_table(results, comparison))
+
+    if args.save_baseline:
+        bench.save_baseline(results, args.save_baseline)
+
+    if comparison and args.fail_on_regression:
+        regressions = [name for name, (_, _, status) in comparison.items() if status == 'regression']
+        if regressions:
+            print(f'\n{len(regressions)} regressions: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
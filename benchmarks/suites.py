@@ -0,0 +1,227 @@
+"""
+Benchmark cases grouped by area. Every suite takes the sizes to run and returns a list
+of Case.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+import bayao_finance as bf
+from bayao_finance import indicators
+from bayao_finance.covariance import rolling_corr, ewm_cov
+from bayao_finance.fused import compute_indicators
+from bayao_finance.providers import DataProvider
+from bayao_finance.storage import STORAGES
+from bayao_finance.sweeps import sweep_sma, sweep_bollinger
+from bayao_finance.bars import trades_to_bars
+from benchmarks.bench import Case
+from benchmarks.data import ohlcv, universe, trades
+
+INDICATORS = {
+    'get_sma_from_data': lambda s: indicators.get_sma_from_data(s, n=20),
+    'get_sma_std_from_data': lambda s: indicators.get_sma_std_from_data(s, n=20),
+    'get_ema_from_data': lambda s: indicators.get_ema_from_data(s, n=20),
+    'get_macd_from_data': lambda s: indicators.get_macd_from_data(s),
+    'get_bollinger_bands_from_data': lambda s: indicators.get_bollinger_bands_from_data(s),
+    'get_rsi': lambda s: indicators.get_rsi(s, n=14),
+    'get_returns_from_data': lambda s: indicators.get_returns_from_data(s),
+}
+
+FUSED_SPEC = ['rsi', ('sma', {'n': 50}), ('sma', {'n': 200}), 'ema', 'macd', 'bb', 'returns']
+
+SWEEP_WINDOWS = list(range(5, 201))
+
+# sweeps return (rows x windows) arrays, about 1.6 GB per million rows for SWEEP_WINDOWS,
+# larger row sizes would run out of memory
+SWEEP_MAX_ROWS = 100_000
+
+
+class _UniverseProvider(DataProvider):
+    # serves an in memory universe so persistence benchmarks never touch the network
+    name = 'benchmark'
+
+    def __init__(self, data):
+        self.data = data
+
+    def download(self, tickers, **kwargs):
+        return {i: self.data[i] for i in tickers if i in self.data}
+
+
+@contextmanager
+def _working_dir(path):
+    # StockManipulator saves relative to the working directory
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _available_storages():
+    storages = ['csv']
+    try:
+        import pyarrow  # noqa: F401
+        storages += ['parquet', 'feather']
+    except ImportError:
+        pass
+    return [i for i in storages if i in STORAGES]
+
+
+def indicator_suite(row_sizes):
+    cases = []
+    for n_rows in row_sizes:
+        frame = bf.StockFrame(ohlcv(n_rows))
+        close = frame.target_close
+        for name, function in INDICATORS.items():
+            cases.append(Case(f'indicators.{name}[{n_rows}]', lambda _, f=function, s=close: f(s), rows=n_rows))
+        cases.append(Case(f'StockFrame.get_atr[{n_rows}]', lambda _, f=frame: f.get_atr(), rows=n_rows))
+        cases.append(Case(f'compute_indicators[{n_rows}]',
+                          lambda _, s=close: compute_indicators(s, FUSED_SPEC), rows=n_rows))
+        if n_rows > SWEEP_MAX_ROWS:
+            continue
+        cases.append(Case(f'sweeps.sweep_sma[{n_rows}]',
+                          lambda _, s=close: sweep_sma(s, SWEEP_WINDOWS), rows=n_rows))
+        cases.append(Case(f'sweeps.sweep_bollinger[{n_rows}]',
+                          lambda _, s=close: sweep_bollinger(s, SWEEP_WINDOWS[::5], [1, 2, 3]), rows=n_rows))
+    return cases
+
+
+def construction_suite(row_sizes):
+    cases = []
+    for n_rows in row_sizes:
+        raw = ohlcv(n_rows)
+        frame = bf.StockFrame(raw)
+        close = raw['Close']
+        start, end = raw.index[n_rows // 2], raw.index[-1]
+        cases += [
+            Case(f'StockFrame.__init__[{n_rows}]', lambda _, d=raw: bf.StockFrame(d), rows=n_rows),
+            Case(f'StockFrame.compact[{n_rows}]', lambda _, f=frame: f.compact(), rows=n_rows),
+            Case(f'StockSeries.__init__[{n_rows}]', lambda _, d=close: bf.StockSeries(d), rows=n_rows),
+            Case(f'StockFrame.column[{n_rows}]', lambda _, f=frame: f['close'], rows=n_rows),
+            Case(f'StockFrame.loc_dates[{n_rows}]', lambda _, f=frame, a=start, b=end: f.loc[a:b], rows=n_rows // 2),
+            Case(f'StockFrame.iloc_tail[{n_rows}]', lambda _, f=frame: f.iloc[-250:], rows=250),
+        ]
+        ticks = trades(n_rows)
+        cases += [
+            Case(f'bars.time_bars[{n_rows}]', lambda _, t=ticks: trades_to_bars(t, 'time', '1min'), rows=n_rows),
+            Case(f'bars.volume_bars[{n_rows}]', lambda _, t=ticks: trades_to_bars(t, 'volume', 100_000), rows=n_rows),
+        ]
+    return cases
+
+
+def panel_suite(ticker_counts, n_rows=2520):
+    cases = []
+    for n_tickers in ticker_counts:
+        frames = {t: bf.StockFrame(d, stock_token=t) for t, d in universe(n_tickers, n_rows).items()}
+        panel = bf.StockPanel.from_frames(frames)
+        rows = n_tickers * n_rows
+        cases += [
+            Case(f'StockPanel.from_frames[{n_tickers}x{n_rows}]', lambda _, f=frames: bf.StockPanel.from_frames(f),
+                 rows=rows),
+            Case(f'StockPanel.get_rsi[{n_tickers}x{n_rows}]', lambda _, p=panel: p.get_rsi(), rows=rows),
+            Case(f'StockPanel.get_atr[{n_tickers}x{n_rows}]', lambda _, p=panel: p.get_atr(), rows=rows),
+            Case(f'StockPanel.compute_indicators[{n_tickers}x{n_rows}]',
+                 lambda _, p=panel: p.compute_indicators(FUSED_SPEC), rows=rows),
+            Case(f'covariance.rolling_corr[{n_tickers}x{n_rows}]', lambda _, p=panel: rolling_corr(p, 63),
+                 rows=rows),
+            Case(f'covariance.ewm_cov[{n_tickers}x{n_rows}]', lambda _, p=panel: ewm_cov(p, span=63), rows=rows),
+        ]
+    return cases
+
+
+def persistence_suite(ticker_counts, n_rows=2520, root=None):
+    cases = []
+    root = root or tempfile.mkdtemp(prefix='bayao_bench_')
+    for n_tickers in ticker_counts:
+        data = universe(n_tickers, n_rows)
+        tickers = list(data)
+        rows = n_tickers * n_rows
+        for storage in _available_storages():
+            manipulator = bf.StockManipulator(source=_UniverseProvider(data), storage=storage)
+            # read cases use data written here, outside the timed cases, so they run on
+            # their own (e.g. with --filter read)
+            folder = os.path.join(root, f'{storage}_{n_tickers}')
+            write_folder = os.path.join(root, f'{storage}_{n_tickers}_write')
+            for i in (folder, write_folder):
+                os.makedirs(i, exist_ok=True)
+            with _working_dir(folder):
+                manipulator.download_data(tickers, save_data=True, end='2020-12-31')
+
+            def write(_, m=manipulator, f=write_folder, t=tickers):
+                with _working_dir(f):
+                    m.download_data(t, save_data=True, end='2020-12-31')
+
+            def read(_, m=manipulator, f=folder):
+                with _working_dir(f):
+                    m.read_data('2020-12-31')
+
+            def read_last_year(_, m=manipulator, f=folder, t=tickers[:10]):
+                with _working_dir(f):
+                    data = m.read_data('2020-12-31', tickers=t, start='2020-01-01', lazy=True)
+                    [data[i] for i in t]
+
+            def availability(_, m=manipulator, f=folder):
+                with _working_dir(f):
+                    m.availability('2020-12-31', start='2020-01-01', end='2020-12-31')
+
+            name = f'{storage}[{n_tickers}x{n_rows}]'
+            cases += [
+                Case(f'persistence.write.{name}', write, rows=rows),
+                Case(f'persistence.read.{name}', read, rows=rows),
+                Case(f'persistence.read_lazy_10_last_year.{name}', read_last_year),
+                Case(f'persistence.availability.{name}', availability, rows=n_tickers),
+            ]
+    return cases
+
+
+# statements timed in a fresh interpreter and the modules they must not load
+STARTUP = {
+    'import bayao_finance': ['bayao_finance.stockframe', 'bayao_finance.persistence', 'numba'],
+    'from bayao_finance import StockFrame': ['bayao_finance.persistence', 'bayao_finance.providers', 'numba',
+                                             'yfinance'],
+    'from bayao_finance import indicators': ['bayao_finance.stockframe', 'bayao_finance.persistence', 'numba',
+                                             'yfinance'],
+    'from bayao_finance import StockManipulator': ['numba', 'yfinance'],
+}
+
+
+def _start(statement, unexpected):
+    code = (f'import sys\n{statement}\n'
+            f'loaded = [m for m in {unexpected!r} if m in sys.modules]\n'
+            f'assert not loaded, "loaded " + ", ".join(loaded)')
+    process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+
+def startup_suite():
+    # includes the interpreter start, compare with python -c pass
+    cases = [Case('startup[python]', lambda _: subprocess.run([sys.executable, '-c', 'pass'], check=True))]
+    for statement, unexpected in STARTUP.items():
+        cases.append(Case(f'startup[{statement}]', lambda _, s=statement, u=unexpected: _start(s, u)))
+    return cases
+
+
+def cleanup(root):
+    shutil.rmtree(root, ignore_errors=True)
+
+
+SUITES = {
+    'indicators': indicator_suite,
+    'construction': construction_suite,
+    'panel': panel_suite,
+    'persistence': persistence_suite,
+    'startup': startup_suite,
+}
+
+# suites taking row sizes, the others take ticker counts except startup
+ROW_SUITES = ['indicators', 'construction']
+
+PROFILES = {
+    'quick': {'rows': [1_000, 100_000], 'tickers': [1, 100]},
+    'default': {'rows': [1_000, 100_000, 1_000_000], 'tickers': [1, 100, 1_000]},
+    'full': {'rows': [1_000, 100_000, 1_000_000, 10_000_000], 'tickers': [1, 100, 1_000, 5_000]},
+}
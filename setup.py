@@ -8,4 +8,5 @@ setup(
    author_email='rgbayao@gmail.com',
    packages=['bayao_finance'],
    install_requires=['pandas', 'numpy', 'yfinance', 'datetime'],
+   extras_require={'parquet': ['pyarrow'], 'numba': ['numba']},
 )
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bayao_finance.backtest import backtest, crossover, sweep_crossover
+
+# bar returns: 0, +10%, -10%, 0, +20%
+CLOSE = pd.Series([100.0, 110.0, 99.0, 99.0, 118.8], index=pd.date_range('2020-01-01', periods=5), name='X')
+
+
+def _returns(signal, **kwargs):
+    return backtest(CLOSE, pd.Series(signal, index=CLOSE.index), **kwargs).returns.to_numpy()
+
+
+def test_signal_is_filled_at_the_next_close():
+    # long decided at the close of bar 0, filled at the close of bar 1, earns bar 2
+    np.testing.assert_allclose(_returns([1, 0, 0, 0, 0]), [0, 0, -0.1, 0, 0])
+    np.testing.assert_allclose(_returns([0, 0, 0, 1, 1]), [0, 0, 0, 0, 0])
+    np.testing.assert_allclose(_returns([0, 0, 1, 1, 1]), [0, 0, 0, 0, 0.2])
+
+
+def test_lag_zero_fills_at_the_signal_close():
+    np.testing.assert_allclose(_returns([1, 0, 0, 0, 0], lag=0), [0, 0.1, 0, 0, 0])
+
+
+def test_costs_are_paid_on_the_fill_bar():
+    result = backtest(CLOSE, pd.Series([1, 0, 0, 0, 0], index=CLOSE.index), cost=0.01)
+    np.testing.assert_allclose(result.returns, [0, -0.01, -0.11, 0, 0])
+    np.testing.assert_allclose(result.positions['X'], [0, 0, 1, 0, 0])
+    assert result.stats['trades'] == 2
+
+
+def test_sweep_crossover_matches_backtest():
+    rng = np.random.default_rng(0)
+    close = pd.DataFrame(100 * np.exp(rng.normal(0, 0.01, (300, 2)).cumsum(axis=0)), columns=['a', 'b'],
+                         index=pd.date_range('2020-01-01', periods=300))
+    stats, returns = sweep_crossover(close, [5, 10], [20], ma='sma', cost=0.001)
+    for n_short in (5, 10):
+        signal = crossover(close.rolling(n_short).mean(), close.rolling(20).mean())
+        expected = backtest(close, signal, cost=0.001)
+        np.testing.assert_allclose(returns[(n_short, 20)], expected.returns, atol=1e-12)
+        assert stats.loc[(n_short, 20), 'trades'] == expected.stats['trades']
+        assert stats.loc[(n_short, 20), 'total_return'] == pytest.approx(expected.stats['total_return'])
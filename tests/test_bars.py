@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.tseries.frequencies import to_offset
+from bayao_finance.bars import trades_to_bars, BAR_COLUMNS
+
+
+def _trades(start, periods, freq, tz=None, seed=0):
+    rng = np.random.default_rng(seed)
+    # irregular times: a regular grid with random gaps left out
+    times = pd.date_range(start, periods=periods, freq=freq, tz=tz)
+    times = times[np.sort(rng.choice(periods, periods // 2, replace=False))]
+    price = 100 + rng.normal(0, 0.1, len(times)).cumsum()
+    size = rng.integers(1, 100, len(times)).astype(np.float64)
+    return pd.DataFrame({'time': times, 'price': price, 'size': size})
+
+
+def _resampled(trades, size):
+    trades = trades.set_index('time')
+    # daily resample counts calendar days and ignores origin
+    origin = {} if isinstance(to_offset(size), pd.offsets.Day) else {'origin': 'epoch'}
+    grouped = trades.resample(size, **origin)
+    expected = pd.DataFrame({
+        'open': grouped['price'].first(), 'high': grouped['price'].max(), 'low': grouped['price'].min(),
+        'close': grouped['price'].last(), 'volume': grouped['size'].sum(),
+        'vwap': (trades['price'] * trades['size']).resample(size, **origin).sum() / grouped['size'].sum(),
+        'trades': grouped['price'].count(),
+    })
+    return expected[expected['trades'] > 0]
+
+
+CASES = [
+    ('2021-01-04 09:15', '7min', None, '1h'),
+    ('2021-01-04 09:15', '7min', 'UTC', '15min'),
+    ('2021-01-04 09:15', '7min', 'Asia/Kolkata', '1h'),
+    ('2021-01-04 09:15', '7min', 'Asia/Kolkata', '90min'),
+    ('2021-03-12', '23min', 'America/New_York', '6h'),
+    ('2018-11-01', '41min', 'America/Sao_Paulo', '1h'),
+    ('2018-11-01', '41min', 'America/Sao_Paulo', '1D'),
+    ('2021-01-04 09:15', '3h', 'Asia/Kolkata', '1D'),
+]
+
+
+@pytest.mark.parametrize('start, freq, tz, size', CASES)
+def test_time_bars_match_resample(start, freq, tz, size):
+    trades = _trades(start, 400, freq, tz)
+    bars = trades_to_bars(trades, size=size)
+    expected = _resampled(trades, size)
+    assert list(bars.index) == list(expected.index)
+    np.testing.assert_allclose(bars[BAR_COLUMNS].to_numpy(), expected[BAR_COLUMNS].to_numpy(), rtol=1e-12)
+
+
+def test_kolkata_hours_start_on_the_local_hour():
+    trades = _trades('2021-01-04 12:40', 100, '1min', 'Asia/Kolkata')
+    bars = trades_to_bars(trades, size='1h')
+    assert bars.index[0] == pd.Timestamp('2021-01-04 12:00', tz='Asia/Kolkata')
+    assert (bars.index.minute == 0).all()
+
+
+@pytest.mark.parametrize('kind, size', [('time', '1h'), ('time', '1D'), ('tick', 7), ('volume', 500),
+                                        ('dollar', 40_000)])
+@pytest.mark.parametrize('tz', [None, 'Asia/Kolkata'])
+def test_bars_do_not_depend_on_chunks(kind, size, tz):
+    trades = _trades('2021-01-04 09:15', 600, '13min', tz)
+    whole = trades_to_bars(trades, kind=kind, size=size, chunk_rows=len(trades))
+    for chunk_rows in (1, 7, 100):
+        bars = trades_to_bars(trades, kind=kind, size=size, chunk_rows=chunk_rows)
+        pd.testing.assert_frame_equal(bars, whole, rtol=1e-12)
@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from bayao_finance.catalog import Catalog
+from bayao_finance.incremental import IncrementalStore
+from bayao_finance.storage import get_storage
+
+
+def _frame(start, periods):
+    index = pd.date_range(start, periods=periods, freq='B')
+    return pd.DataFrame({'close': np.arange(periods, dtype=np.float64) + 1}, index=index)
+
+
+def _store(root):
+    return IncrementalStore(str(root), get_storage('csv'))
+
+
+def test_stores_keep_each_other_entries(tmp_path):
+    first, second = _store(tmp_path), _store(tmp_path)
+    first.append('AAA', _frame('2020-01-01', 5))
+    second.append('BBB', _frame('2020-01-01', 5))
+    first.append('AAA', _frame('2020-01-07', 5))
+    assert _store(tmp_path).tickers() == ['AAA', 'BBB']
+    assert first.tickers() == ['AAA', 'BBB']
+    assert len(_store(tmp_path).read('AAA')) == 9
+    assert Catalog(str(tmp_path)).verify() == []
+
+
+def test_compaction_is_not_undone_by_another_store(tmp_path):
+    first = _store(tmp_path)
+    first.append('AAA', _frame('2020-01-01', 5))
+    first.append('AAA', _frame('2020-01-07', 5))
+    second = _store(tmp_path)
+    first.compact('AAA')
+    second.append('BBB', _frame('2020-01-01', 5))
+    catalog = Catalog(str(tmp_path))
+    assert catalog.verify() == []
+    assert len(catalog.entries('AAA')) == 1
+    assert catalog.tickers() == ['AAA', 'BBB']
+
+
+def test_parts_of_another_store_are_not_overwritten(tmp_path):
+    first, second = _store(tmp_path), _store(tmp_path)
+    first.append('AAA', _frame('2020-01-01', 5))
+    second.append('AAA', _frame('2020-01-01', 5))
+    assert len(os.listdir(tmp_path / 'AAA')) == 2
+    assert Catalog(str(tmp_path)).verify() == []
+
+
+def test_rebuild_replaces_the_saved_catalog(tmp_path):
+    store = _store(tmp_path)
+    store.append('AAA', _frame('2020-01-01', 5))
+    store.append('BBB', _frame('2020-01-01', 5))
+    for file in os.listdir(tmp_path / 'BBB'):
+        os.remove(tmp_path / 'BBB' / file)
+    store.rebuild_catalog()
+    assert Catalog(str(tmp_path)).tickers() == ['AAA']
+
+
+def test_save_waits_for_the_lock(tmp_path, monkeypatch):
+    from bayao_finance import catalog as catalog_module
+
+    monkeypatch.setattr(catalog_module, 'LOCK_TIMEOUT', 0)
+    catalog = Catalog(str(tmp_path))
+    open(f'{catalog.path}.lock', 'w').close()
+    with pytest.raises(TimeoutError):
+        catalog.save()
+    assert not os.path.exists(catalog.path)
+
+
+@pytest.fixture
+def read_only(monkeypatch):
+    def save(self):
+        raise PermissionError(f'Read only folder: {self.folder}')
+
+    monkeypatch.setattr(Catalog, 'save', save)
+
+
+def test_legacy_snapshot_reads_without_writing(tmp_path, monkeypatch, read_only):
+    from bayao_finance import StockManipulator
+
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / 'data' / '2020-12-31'
+    folder.mkdir(parents=True)
+    storage = get_storage('csv')
+    for ticker in ['AAA', 'BBB']:
+        storage.write(_frame('2020-12-01', 10), str(folder / f'2020-12-31_{ticker}.csv'))
+
+    manipulator = StockManipulator(source='fake')
+    assert sorted(manipulator.read_data('2020-12-31')) == ['AAA', 'BBB']
+    assert list(manipulator.availability('2020-12-31')['rows']) == [10, 10]
+    assert sorted(os.listdir(folder)) == ['2020-12-31_AAA.csv', '2020-12-31_BBB.csv']
+
+
+def test_legacy_store_reads_without_writing(tmp_path, read_only):
+    storage = get_storage('csv')
+    (tmp_path / 'AAA').mkdir()
+    storage.write(_frame('2020-01-01', 5), str(tmp_path / 'AAA' / '000000_20200101000000_20200107000000.csv'))
+    store = _store(tmp_path)
+    assert store.tickers() == ['AAA']
+    assert len(store.read('AAA')) == 5
+    assert not os.path.exists(tmp_path / 'catalog.json')
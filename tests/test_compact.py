@@ -0,0 +1,66 @@
+import importlib.util
+import numpy as np
+import pandas as pd
+import pytest
+from bayao_finance import StockFrame
+from bayao_finance.compact import PRECISION, compact_ohlcv, volume_dtype
+from bayao_finance.storage import get_storage
+from benchmarks.precision import INDICATORS, check_precision
+
+
+@pytest.fixture(scope='module')
+def precision():
+    return check_precision(n_tickers=5)
+
+
+def test_precision_table_covers_every_indicator():
+    assert set(INDICATORS) == set(PRECISION)
+
+
+@pytest.mark.parametrize('name', sorted(PRECISION))
+def test_float32_indicators_within_documented_tolerance(precision, name):
+    row = precision.loc[name]
+    assert row['dtype'] == 'float32'
+    assert row['error'] <= PRECISION[name][1]
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([0, 255], np.uint8),
+    ([0, 70_000], np.uint32),
+    ([-5, 200], np.int16),
+    ([0.0, 4_000_000_000.0], np.uint32),
+    ([1.0, np.nan, 300.0], np.float32),
+    ([1.0, np.nan, 2.0 ** 24], np.float32),
+    ([1.0, np.nan, 2.0 ** 24 + 1], np.float64),
+    ([1.0, np.nan, 123_456_789.0], np.float64),
+    ([1.5, 2.0], np.float64),
+    ([], np.uint8),
+])
+def test_volume_dtype(values, expected):
+    assert volume_dtype(np.array(values, dtype=np.float64)) == expected
+
+
+STORAGES = ['csv'] + (['parquet', 'feather'] if importlib.util.find_spec('pyarrow') else [])
+
+VOLUMES = {
+    'integer': [123_456_789.0, 1.0, 4_000_000_000.0, 0.0],
+    'missing': [123_456_789.0, np.nan, 987_654_321.0, 5.0],
+    'missing_small': [100.0, np.nan, 2.0 ** 24, 5.0],
+    'fractions': [0.123456789, 1234.56789, np.nan, 2.5],
+}
+
+
+@pytest.mark.parametrize('kind', sorted(VOLUMES))
+def test_volume_round_trip_is_exact(tmp_path, kind):
+    volume = np.array(VOLUMES[kind])
+    frame = StockFrame(pd.DataFrame({'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': volume},
+                                    index=pd.date_range('2020-01-01', periods=len(volume), name='date')))
+    compact = compact_ohlcv(frame)
+    assert compact['close'].dtype == np.float32
+    np.testing.assert_array_equal(compact['volume'].to_numpy(dtype=np.float64), volume)
+
+    for name in STORAGES:
+        storage = get_storage(name)
+        path = str(tmp_path / f'{kind}{storage.extension}')
+        storage.write(compact, path)
+        np.testing.assert_array_equal(storage.read(path)['volume'].to_numpy(dtype=np.float64), volume)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bayao_finance import StockFrame
+from bayao_finance.covariance import rolling_cov, rolling_corr, ewm_cov, ewm_corr
+
+RTOL = 1e-8
+
+
+@pytest.fixture(params=['clean', 'nan'])
+def returns(request):
+    rng = np.random.default_rng(2)
+    x = rng.normal(0, 0.01, (300, 4))
+    if request.param == 'nan':
+        x[:15, 0] = np.nan
+        x[100:140, 1] = np.nan
+        x[rng.integers(0, 300, 30), 3] = np.nan
+    return pd.DataFrame(x, columns=list('abcd'), index=pd.date_range('2020-01-01', periods=300))
+
+
+def _full(result):
+    return result.to_numpy()
+
+
+@pytest.mark.parametrize('corr', [False, True])
+@pytest.mark.parametrize('max_bytes', [1, 2 ** 12, 2 ** 28])
+def test_rolling_matches_pandas(returns, corr, max_bytes):
+    window = returns.rolling(30, min_periods=20)
+    expected = window.corr() if corr else window.cov()
+    result = rolling_cov(returns, 30, min_periods=20, corr=corr, output='full', prices=False, max_bytes=max_bytes)
+    np.testing.assert_allclose(_full(result), expected.to_numpy(), rtol=RTOL, atol=1e-14, equal_nan=True)
+    latest = rolling_cov(returns, 30, min_periods=20, corr=corr, prices=False)
+    np.testing.assert_allclose(latest.to_numpy(), expected.loc[returns.index[-1]].to_numpy(), rtol=RTOL,
+                               atol=1e-14, equal_nan=True)
+
+
+@pytest.mark.parametrize('corr', [False, True])
+@pytest.mark.parametrize('max_bytes', [1, 2 ** 28])
+def test_ewm_matches_pandas(returns, corr, max_bytes):
+    window = returns.ewm(span=20, min_periods=5)
+    expected = window.corr() if corr else window.cov()
+    result = ewm_cov(returns, span=20, min_periods=5, corr=corr, output='full', prices=False, max_bytes=max_bytes)
+    np.testing.assert_allclose(_full(result), expected.to_numpy(), rtol=RTOL, atol=1e-14, equal_nan=True)
+
+
+def test_every_keeps_dates_ending_at_the_last_row(returns):
+    full = rolling_corr(returns, 30, output='triu', prices=False)
+    monthly = rolling_corr(returns, 30, output='triu', every=21, prices=False, max_bytes=2 ** 12)
+    assert monthly.index[-1] == returns.index[-1]
+    pd.testing.assert_frame_equal(monthly, full.loc[monthly.index], rtol=RTOL)
+    assert ('a', 'a') not in monthly.columns
+
+
+def test_prices_use_their_returns():
+    rng = np.random.default_rng(3)
+    close = pd.DataFrame(100 * np.exp(rng.normal(0, 0.01, (200, 3)).cumsum(axis=0)), columns=list('xyz'),
+                         index=pd.date_range('2020-01-01', periods=200))
+    frames = {t: StockFrame(close[[t]].rename(columns={t: 'close'}), stock_token=t) for t in close}
+    expected = close.pct_change().iloc[1:].ewm(span=30).corr().loc[close.index[-1]]
+    np.testing.assert_allclose(ewm_corr(frames, span=30).to_numpy(), expected.to_numpy(), rtol=RTOL)
+
+
+def test_carried_sums_resync(returns, monkeypatch):
+    from bayao_finance import kernels
+    expected = rolling_cov(returns, 30, output='full', prices=False)
+    monkeypatch.setattr(kernels, 'CHUNK_ROWS', 7)
+    result = rolling_cov(returns, 30, output='full', prices=False, max_bytes=1)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=RTOL, atol=1e-14, equal_nan=True)
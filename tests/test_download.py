@@ -0,0 +1,96 @@
+import os
+import threading
+import pytest
+from bayao_finance import download
+from bayao_finance.download import DownloadScheduler
+from bayao_finance.providers import FakeProvider
+
+TICKERS = [f'T{i:02d}' for i in range(20)]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(download.time, 'sleep', calls.append)
+    return calls
+
+
+def test_retries_with_exponential_backoff(sleeps):
+    provider = FakeProvider(n_rows=10, transient_failures=2)
+    scheduler = DownloadScheduler(provider, batch_size=1, max_workers=1, retries=3, backoff=0.5)
+    data, report = scheduler.run(['AAA'])
+    assert list(data) == ['AAA']
+    assert report['AAA'].success and report['AAA'].attempts == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_gives_up_after_retries(sleeps):
+    provider = FakeProvider(n_rows=10, transient_failures=100)
+    scheduler = DownloadScheduler(provider, batch_size=1, max_workers=1, retries=2, backoff=1)
+    data, report = scheduler.run(['AAA'])
+    assert data == {}
+    assert report.failed == ['AAA']
+    assert report['AAA'].attempts == 3
+    assert 'Simulated provider failure' in report['AAA'].error
+    assert provider.calls == 3
+    assert sleeps == [1, 2]
+
+
+def test_missing_tickers_do_not_affect_the_batch(sleeps):
+    provider = FakeProvider(n_rows=10, missing=['T03', 'T11'])
+    scheduler = DownloadScheduler(provider, batch_size=8, max_workers=2, retries=2, backoff=0)
+    data, report = scheduler.run(TICKERS)
+    assert report.failed == ['T03', 'T11']
+    assert list(data) == [t for t in TICKERS if t not in ('T03', 'T11')]
+    assert report['T03'].attempts == 3 and report['T03'].error == 'no data returned'
+    assert all(report[t].attempts == 1 for t in data)
+
+
+def test_invalid_ticker_is_isolated_from_its_batch(sleeps):
+    provider = FakeProvider(n_rows=10, invalid=['T05'])
+    scheduler = DownloadScheduler(provider, batch_size=10, max_workers=1, retries=1, backoff=0)
+    data, report = scheduler.run(TICKERS)
+    assert report.failed == ['T05']
+    assert 'Invalid symbols' in report['T05'].error
+    assert list(data) == [t for t in TICKERS if t != 'T05']
+    assert all(len(data[t]) == 10 for t in data)
+    # bisection: a handful of calls, not one per ticker
+    assert provider.calls < len(TICKERS)
+
+
+def test_transient_failure_of_a_batch_is_recovered(sleeps):
+    provider = FakeProvider(n_rows=10, transient_failures=2)
+    scheduler = DownloadScheduler(provider, batch_size=10, max_workers=1, retries=2, backoff=0)
+    data, report = scheduler.run(TICKERS)
+    assert report.failed == []
+    assert list(data) == TICKERS
+
+
+def test_on_ticker_runs_in_the_calling_thread(sleeps):
+    provider = FakeProvider(n_rows=10, missing=['T01'])
+    scheduler = DownloadScheduler(provider, batch_size=3, max_workers=4, retries=0)
+    received = {}
+    thread = threading.get_ident()
+
+    def on_ticker(ticker, data):
+        assert threading.get_ident() == thread
+        received[ticker] = len(data)
+
+    data, report = scheduler.run(TICKERS, on_ticker=on_ticker)
+    assert set(received) == set(data) == set(TICKERS) - {'T01'}
+    assert all(rows == 10 for rows in received.values())
+
+
+def test_downloaded_tickers_are_persisted(tmp_path, monkeypatch, sleeps):
+    from bayao_finance import StockManipulator
+
+    monkeypatch.chdir(tmp_path)
+    manipulator = StockManipulator(source=FakeProvider(n_rows=30, missing=['CCC']), batch_size=2)
+    manipulator.download_data(['AAA', 'BBB', 'CCC'], save_data=True, end='2020-12-31')
+    assert manipulator.download_report.failed == ['CCC']
+
+    folder = os.path.join('data', '2020-12-31')
+    assert sorted(os.listdir(folder)) == ['2020-12-31_AAA.csv', '2020-12-31_BBB.csv', 'catalog.json']
+    stored = StockManipulator(source='fake').read_data('2020-12-31')
+    assert sorted(stored) == ['AAA', 'BBB']
+    assert len(stored['AAA']) == len(manipulator.data_dict['AAA'])
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bayao_finance import kernels
+
+N_ROWS = 600
+
+
+def _data(kind, dtype=np.float64, n_columns=3):
+    rng = np.random.default_rng(0)
+    x = 100 + rng.normal(size=(N_ROWS, n_columns)).cumsum(axis=0)
+    if kind in ('nan', 'inf'):
+        x[:7, 0] = np.nan
+        x[50:80, 1] = np.nan
+        x[rng.integers(0, N_ROWS, 40), 2] = np.nan
+    if kind == 'inf':
+        x[100, 0] = np.inf
+        x[300, 1] = -np.inf
+        x[400:402, 2] = [np.inf, -np.inf]
+    return x.astype(dtype)
+
+
+def _reference(x):
+    # pandas computes float32 windows in float64
+    return pd.DataFrame(x.astype(np.float64))
+
+
+def _tolerance(dtype):
+    if dtype == np.float32:
+        return {'rtol': 1e-5, 'atol': 1e-4}
+    return {'rtol': kernels.RTOL, 'atol': kernels.ATOL}
+
+
+CASES = [(kind, dtype) for kind in ('clean', 'nan', 'inf') for dtype in (np.float64, np.float32)]
+
+
+@pytest.fixture(params=[True, False], ids=['numba', 'no_numba'])
+def numba_mode(request, monkeypatch):
+    if request.param and not kernels.HAS_NUMBA:
+        pytest.skip('numba is not installed')
+    monkeypatch.setattr(kernels, 'HAS_NUMBA', request.param)
+    return request.param
+
+
+def _check(result, expected, x):
+    assert result.shape == x.shape
+    assert result.dtype == x.dtype
+    np.testing.assert_allclose(result, np.asarray(expected), equal_nan=True, **_tolerance(x.dtype))
+
+
+@pytest.mark.parametrize('kind, dtype', CASES)
+@pytest.mark.parametrize('n, min_periods', [(20, None), (20, 5), (1, None)])
+def test_rolling_mean(kind, dtype, n, min_periods):
+    x = _data(kind, dtype)
+    expected = _reference(x).rolling(n, min_periods=min_periods or n).mean()
+    _check(kernels.rolling_mean(x, n, min_periods), expected, x)
+
+
+@pytest.mark.parametrize('kind, dtype', CASES)
+@pytest.mark.parametrize('n, min_periods', [(20, None), (20, 5)])
+def test_rolling_mean_std(numba_mode, kind, dtype, n, min_periods):
+    x = _data(kind, dtype)
+    window = _reference(x).rolling(n, min_periods=min_periods or n)
+    mean, std = kernels.rolling_mean_std(x, n, min_periods)
+    _check(mean, window.mean(), x)
+    _check(std, window.std(), x)
+
+
+@pytest.mark.parametrize('kind, dtype', CASES)
+@pytest.mark.parametrize('adjust', [True, False])
+def test_ewm_mean(numba_mode, kind, dtype, adjust):
+    x = _data(kind, dtype)
+    expected = _reference(x).ewm(alpha=2 / 21, min_periods=20, adjust=adjust).mean()
+    _check(kernels.ewm_mean(x, 2 / 21, 20, adjust=adjust), expected, x)
+
+
+def test_ewm_mean_alpha_per_column(numba_mode):
+    x = _data('nan')
+    alpha = np.array([0.5, 0.1, 1 / 14])
+    expected = [_reference(x)[i].ewm(alpha=a).mean() for i, a in enumerate(alpha)]
+    np.testing.assert_allclose(kernels.ewm_mean(x, alpha), np.column_stack(expected), equal_nan=True,
+                               rtol=kernels.RTOL, atol=kernels.ATOL)
+
+
+@pytest.mark.parametrize('kind, dtype', CASES)
+def test_rsi(numba_mode, kind, dtype):
+    x = _data(kind, dtype)
+    delta = _reference(x).diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / 14, min_periods=14).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / 14, min_periods=14).mean()
+    _check(kernels.rsi(x, 14), 100 - 100 / (1 + gain / loss), x)
+
+
+@pytest.mark.parametrize('kind, dtype', CASES)
+@pytest.mark.parametrize('wilder', [False, True])
+def test_atr(numba_mode, kind, dtype, wilder):
+    close = _data(kind, dtype)
+    high, low = close + dtype(1), close - dtype(2)
+    frame = {i: _reference(v) for i, v in [('high', high), ('low', low), ('close', close)]}
+    previous = frame['close'].shift()
+    true_range = pd.concat([frame['high'] - frame['low'], (frame['high'] - previous).abs(),
+                            (frame['low'] - previous).abs()], keys=range(3)).groupby(level=1).max()
+    _check(kernels.true_range(high, low, close), true_range, close)
+    if wilder:
+        expected = true_range.ewm(alpha=1 / 14, min_periods=14).mean()
+    else:
+        expected = true_range.rolling(14).mean()
+    _check(kernels.atr(high, low, close, 14, wilder=wilder), expected, close)
+
+
+def test_one_dimensional_input(numba_mode):
+    x = _data('inf')[:, 0]
+    series = pd.Series(x)
+    np.testing.assert_allclose(kernels.rolling_mean(x, 20), series.rolling(20).mean(), equal_nan=True,
+                               rtol=kernels.RTOL)
+    mean, std = kernels.rolling_mean_std(x, 20)
+    assert mean.shape == std.shape == x.shape
+    np.testing.assert_allclose(std, series.rolling(20).std(), equal_nan=True, rtol=kernels.RTOL)
+    np.testing.assert_allclose(kernels.ewm_mean(x, 0.1), series.ewm(alpha=0.1).mean(), equal_nan=True,
+                               rtol=kernels.RTOL)
+
+
+def test_inf_does_not_spread():
+    x = np.arange(300.)
+    x[100] = np.inf
+    result = kernels.rolling_mean(x, 20)
+    expected = pd.Series(x).rolling(20).mean()
+    assert np.isnan(result).sum() == expected.isna().sum()
+    assert np.isfinite(result[150:]).all()
+    # the input is not modified
+    assert np.isinf(x[100])
+
+
+def test_integer_input():
+    x = np.arange(100)
+    np.testing.assert_allclose(kernels.rolling_mean(x, 10), pd.Series(x).rolling(10).mean(), equal_nan=True)
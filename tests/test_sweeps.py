@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bayao_finance import kernels
+from bayao_finance.sweeps import sweep_sma, sweep_ema, sweep_bollinger
+
+WINDOWS = [1, 5, 20, 63]
+
+
+@pytest.fixture(params=['clean', 'nan', 'inf'])
+def frame(request):
+    rng = np.random.default_rng(1)
+    x = 100 + rng.normal(size=(500, 2)).cumsum(axis=0)
+    if request.param != 'clean':
+        x[:10, 0] = np.nan
+        x[200:230, 1] = np.nan
+    if request.param == 'inf':
+        x[100, 0] = np.inf
+        x[300, 1] = -np.inf
+    return pd.DataFrame(x, columns=['a', 'b'])
+
+
+def _close(result, expected):
+    np.testing.assert_allclose(result, expected, equal_nan=True, rtol=kernels.RTOL, atol=kernels.ATOL)
+
+
+def test_sweep_sma(frame):
+    result = sweep_sma(frame, WINDOWS)
+    for i, n in enumerate(WINDOWS):
+        _close(result[:, :, i], frame.rolling(n).mean())
+
+
+def test_sweep_ema(frame):
+    result = sweep_ema(frame, WINDOWS)
+    for i, n in enumerate(WINDOWS):
+        _close(result[:, :, i], frame.ewm(span=n, min_periods=n).mean())
+
+
+def test_sweep_bollinger(frame):
+    result = sweep_bollinger(frame, WINDOWS[1:], ks=[1, 2])
+    for i, (n, k) in enumerate((n, k) for n in WINDOWS[1:] for k in (1, 2)):
+        window = frame.rolling(n)
+        _close(result[:, :, i, 0], window.mean() - k * window.std())
+        _close(result[:, :, i, 1], window.mean())
+        _close(result[:, :, i, 2], window.mean() + k * window.std())